@@ -1,42 +1,138 @@
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Flask, Response, request, jsonify
 from flask_cors import CORS
 import sqlite3
 import os
+import base64
+import json
 import re
+from datetime import datetime
 from cv_routes import cv_bp
-from email_services import sign_up
-from email_services import forgot_password
-from werkzeug.utils import secure_filename
+from email_services import sign_up_message
+from email_services import forgot_password_message, generate_password
+from werkzeug.security import safe_join
 from email_services import event_reminder
-from email_services import event_creation
-from upload_services import save_file
-
+from email_services import event_creation_message
+import email_outbox
+import metrics
+import reminder_scheduler
+from upload_services import HASHED_PICTURE, save_file, save_profile_picture, send_picture, send_upload
+from db_pool import DB_PATH, PoolTimeout, get_pool, pool_stats
+from db_config import execute_write, run_write
+from migrations import migrate
+from passwords import PasswordBusy, hash_password, verify_password
+import auth
+from auth import current_user, owner_only, query_token
+from user_directory import directory_stats, get_user_directory
+from response_cache import bump_user, cache_stats, cached_per_user
+from cv_cache import get_cv_cache
+from log_config import configure_logging
+from blob_store import BlobNotFound
+from image_variants import PROFILE_SIZES, best_variant, make_variants_quietly, remove_variants
+from upload_stream import (
+    EVENT_FILE_LIMIT, IMAGE_TYPES, MAX_UPLOAD, PICTURE_LIMIT, UploadRequest, sniffed_type_of, too_large, upload_limit,
+)
+
+
+# levels and key=value / JSON fields instead of print(), see log_config.py
+configure_logging()
 
 app = Flask(__name__)
+# uploaded files are hashed / spooled to disk while they arrive, see upload_stream.py
+app.request_class = UploadRequest
+app.config["MAX_CONTENT_LENGTH"] = MAX_UPLOAD
+# per-route latency histograms + GET /metrics (metrics.py), registered first so
+# the timing includes the other before_request hooks
+metrics.init_app(app)
+metrics.REGISTRY.add_stats("hereiam_db_pool", pool_stats, label="db", help="db_pool.pool_stats()")
+metrics.REGISTRY.add_stats("hereiam_response_cache", cache_stats, help="response_cache.cache_stats()")
+metrics.REGISTRY.add_stats("hereiam_user_directory", directory_stats, help="user_directory.directory_stats()")
+metrics.REGISTRY.add_stats("hereiam_cv_cache", lambda: get_cv_cache().stats, help="cv_cache.CVCache.stats")
+# signed session token -> g.user_id, checked once per request (auth.py)
+app.before_request(auth.load_identity)
 
 # Folder where profile pictures are stored
 PICTURES_FOLDER = os.path.join(os.path.dirname(__file__), "Pictures")
 os.makedirs(PICTURES_FOLDER, exist_ok=True)  # create if not exists
 ALLOWED_EXTENSIONS = {"png", "jpg", "jpeg"}
+# the profile page shows a 130px circle, see image_variants.PROFILE_SIZES
+PROFILE_PICTURE_SIZE = 256
 
 
 def allowed_file(filename):
     return "." in filename and filename.rsplit(".", 1)[1].lower() in ALLOWED_EXTENSIONS
 
 
+@app.errorhandler(413)
+def request_too_large(e):
+    return too_large()
+
+
+@app.errorhandler(PasswordBusy)
+def password_pool_busy(e):
+    # login burst, the KDF pool is full (see passwords.py)
+    return jsonify({"success": False, "error": "Too many logins right now, try again"}), 503, {"Retry-After": "1"}
+
+
+@app.errorhandler(PoolTimeout)
+def db_pool_busy(e):
+    # every pooled connection stayed checked out for HEREIAM_DB_POOL_TIMEOUT (see db_pool.py)
+    return jsonify({"success": False, "error": "Server busy, try again"}), 503, {"Retry-After": "1"}
+
+
+# The password routes never hold a pooled connection while scrypt runs (that
+# can be the KDF queue wait plus the hash): they read the row, give the
+# connection back, hash / verify, and take one again only for the write.
+
+def find_user(credential):
+    """The user whose username or email is `credential`, as stored right now, or None."""
+    conn = get_db_connection()
+    try:
+        # both columns are UNIQUE, so this is two index lookups
+        return conn.execute(
+            "SELECT id, username, email, password FROM users WHERE username = ? OR email = ?",
+            (credential, credential)
+        ).fetchone()
+    finally:
+        conn.close()
+
+
+def upgrade_password(user_id, stored, new_hash):
+    """Store the rehashed password, unless it was changed in the meantime."""
+    if not new_hash:
+        return
+    conn = get_db_connection()
+    try:
+        execute_write(conn, "UPDATE users SET password = ? WHERE id = ? AND password = ?",
+                      (new_hash, user_id, stored))
+    finally:
+        conn.close()
+
+
 # allow rewuests from Rreact frontend
 CORS(app)
 
-# path to database
-DB_PATH = os.path.join(os.path.dirname(__file__), "db", "database.db")
+# The CV render processes (cv_batch.py, spawned) import the main module again as
+# __mp_main__, which is this file under `python app.py`. They only render, so
+# none of the startup below happens there.
+if __name__ != "__mp_main__":
+    # bring the database up to the latest schema (see migrations.py) before serving
+    migrate(DB_PATH)
+
+    # emails are sent in the background from the email_outbox table
+    if os.environ.get("HEREIAM_OUTBOX_WORKER", "1") != "0":
+        email_outbox.start_worker(DB_PATH)
+
+    # "starts in 30 minutes" emails (event_reminder), see reminder_scheduler.py
+    if os.environ.get("HEREIAM_REMINDER_WORKER", "1") != "0":
+        reminder_scheduler.start_scheduler(DB_PATH)
 
 # function to connect
+# connections come from the shared pool in db_pool.py (DB_PATH is the absolute path
+# to db/database.db), conn.close() just gives the connection back to the pool
 
 
 def get_db_connection():
-    conn = sqlite3.connect("./db/database.db")
-    conn.row_factory = sqlite3.Row
-    return conn
+    return get_pool(DB_PATH).connection()
 
 # Login function - accept username OR email
 
@@ -50,22 +146,20 @@ def login():
     if not credential or not password:
         return jsonify({"success": False, "error": "Missing credential or password"}), 400
 
-    conn = get_db_connection()
-    # Try to find user by username first, then by email
-    user = conn.execute(
-        "SELECT id, username, email, password FROM users WHERE username = ? OR email = ?", (
-            credential, credential)
-    ).fetchone()
-    conn.close()
+    # username or email, the row as stored right now
+    user = find_user(credential)
 
     if not user:
         return jsonify({"success": False, "error": "User not found"}), 404
 
-    if user["password"] != password:
+    ok, new_hash = verify_password(user["password"], password)
+    if not ok:
         return jsonify({"success": False, "error": "Incorrect Password"}), 401
+    upgrade_password(user["id"], user["password"], new_hash)
 
     # return user_id, username, and email from frontend to store
-    return jsonify({"success": True, "user_id": user["id"], "username": user["username"], "email": user["email"]})
+    return jsonify({"success": True, "user_id": user["id"], "username": user["username"], "email": user["email"],
+                    "token": auth.issue_token(user["id"])})
 
 
 @app.route("/register", methods=["POST"])
@@ -80,24 +174,39 @@ def register():
     if not all([name, surname, username, email, password]):
         return jsonify({"message": "All fields required"}), 400
 
+    directory = get_user_directory()
     conn = get_db_connection()
     try:
-        existing = conn.execute(
-            "SELECT id FROM users WHERE username = ? OR email = ?",
-            (username, email)
-        ).fetchone()
-        if existing:
-            return jsonify({"message": "Username or email already in use"}), 409
+        taken = directory.taken(conn, username, email)
+    finally:
+        conn.close()
+    if taken:
+        return jsonify({"message": "Username or email already in use"}), 409
 
-        # hashed = generate_password_hash(password)
-        conn.execute(
+    # hashed with no connection held, it takes a while
+    hashed = hash_password(password)
+
+    def insert_user(c):
+        cur = c.execute(
             "INSERT INTO users (name, surname, username, email, password) VALUES (?, ?, ?, ?, ?)",
-            (name, surname, username, email, password)
+            (name, surname, username, email, hashed)
         )
-        sign_up(email)
-        conn.commit()
+        # welcome email goes out from the outbox once this commits
+        email_outbox.enqueue(c, sign_up_message(email), kind="sign_up")
+        return cur.lastrowid
+
+    conn = get_db_connection()
+    try:
+        user_id = run_write(conn, insert_user)
+    except sqlite3.IntegrityError:
+        # registered by someone else while the password was being hashed
+        # (close() rolls the failed insert back)
+        return jsonify({"message": "Username or email already in use"}), 409
     finally:
         conn.close()
+    # registering the same username or email again is a 409 without a query
+    directory.put({"id": user_id, "username": username, "email": email})
+    email_outbox.wake()
 
     return jsonify({"message": "Registered"}), 201
 
@@ -114,34 +223,34 @@ def reset_password():
     conn = get_db_connection()
     try:
         user = conn.execute("SELECT id FROM users WHERE email = ?", (email,)).fetchone()
-        # If user exists, generate and send new password and update DB
-        if user:
-            new_password = forgot_password(email)
-            conn.execute("UPDATE users SET password = ? WHERE email = ?", (new_password, email))
-            conn.commit()
     finally:
         conn.close()
 
+    # If user exists, generate a new password, store it and only then send it
+    if user:
+        new_password = generate_password()
+        # hashed before anything is sent: if the KDF pool is busy (503) the old password still works
+        hashed = hash_password(new_password)
+
+        def store_and_queue(c):
+            c.execute("UPDATE users SET password = ? WHERE email = ?", (hashed, email))
+            # goes out from the outbox only if the new password was committed
+            email_outbox.enqueue(c, forgot_password_message(email, new_password), kind="forgot_password")
+
+        conn = get_db_connection()
+        try:
+            run_write(conn, store_and_queue)
+        finally:
+            conn.close()
+        email_outbox.wake()
+
     # Always return a generic success message when format is valid
     return jsonify({"success": True, "message": "If the email is correct, a new password was sent to your email."})
 
 # Get user info by id
 @app.route("/users/<int:user_id>", methods=["GET"])
+@owner_only
 def get_user(user_id):
-    # Verify authenticated user can only access their own data
-    authenticated_user_id = request.args.get("authenticated_user_id")
-    
-    if not authenticated_user_id:
-        return jsonify({"error": "Unauthorized"}), 401
-    
-    try:
-        authenticated_user_id = int(authenticated_user_id)
-    except (TypeError, ValueError):
-        return jsonify({"error": "Invalid authentication"}), 401
-    
-    if authenticated_user_id != user_id:
-        return jsonify({"error": "Forbidden - Access denied"}), 403
-
     conn = get_db_connection()
     try:
         user = conn.execute("SELECT * FROM users WHERE id = ?", (user_id,)).fetchone()
@@ -158,7 +267,7 @@ def get_user(user_id):
         # If profile_picture has a filename, convert to full URL
         if user_dict.get("profile_picture"):
             filename = user_dict["profile_picture"]
-            user_dict["profile_picture"] = f"http://localhost:3001/pictures/{filename}"
+            user_dict["profile_picture"] = f"http://localhost:3001/pictures/{filename}?size={PROFILE_PICTURE_SIZE}"
 
         return jsonify(user_dict)
     finally:
@@ -167,23 +276,10 @@ def get_user(user_id):
 
 # Update user info
 @app.route("/users/<int:user_id>", methods=["PUT"])
+@owner_only
 def update_user(user_id):
     data = request.get_json()
-    
-    # Verify authenticated user can only update their own data
-    authenticated_user_id = data.get("authenticated_user_id")
-    
-    if not authenticated_user_id:
-        return jsonify({"error": "Unauthorized"}), 401
-    
-    try:
-        authenticated_user_id = int(authenticated_user_id)
-    except (TypeError, ValueError):
-        return jsonify({"error": "Invalid authentication"}), 401
-    
-    if authenticated_user_id != user_id:
-        return jsonify({"error": "Forbidden - Access denied"}), 403
-    
+
     fields = ["name", "surname", "email", "profile_picture"]
 
     updates = [f"{field} = ?" for field in fields if field in data]
@@ -194,10 +290,11 @@ def update_user(user_id):
 
     conn = get_db_connection()
     try:
-        conn.execute(
-            f"UPDATE users SET {', '.join(updates)} WHERE id = ?", (*values, user_id)
+        execute_write(
+            conn, f"UPDATE users SET {', '.join(updates)} WHERE id = ?", (*values, user_id)
         )
-        conn.commit()
+        # the email may have changed
+        get_user_directory().invalidate(user_id)
         return jsonify({"message": "User updated successfully"})
     finally:
         conn.close()
@@ -205,62 +302,43 @@ def update_user(user_id):
 
 # Check password
 @app.route("/users/<int:user_id>/check-password", methods=["POST"])
+@owner_only
 def check_password(user_id):
     data = request.get_json()
     password = data.get("password")
-    authenticated_user_id = data.get("authenticated_user_id")
-    
-    if not authenticated_user_id:
-        return jsonify({"error": "Unauthorized"}), 401
-    
-    try:
-        authenticated_user_id = int(authenticated_user_id)
-    except (TypeError, ValueError):
-        return jsonify({"error": "Invalid authentication"}), 401
-    
-    if authenticated_user_id != user_id:
-        return jsonify({"error": "Forbidden - Access denied"}), 403
 
     conn = get_db_connection()
     try:
         user = conn.execute(
             "SELECT password FROM users WHERE id = ?", (user_id,)
         ).fetchone()
-        
-        if user and user["password"] == password:
-            return jsonify({"valid": True})
-        return jsonify({"valid": False})
     finally:
         conn.close()
 
+    ok, new_hash = verify_password(user["password"], password) if user else (False, None)
+    if ok:
+        upgrade_password(user_id, user["password"], new_hash)
+        return jsonify({"valid": True})
+    return jsonify({"valid": False})
+
 
 # Update password
 @app.route("/users/<int:user_id>/update-password", methods=["PUT"])
+@owner_only
 def update_password(user_id):
     data = request.get_json()
     new_password = data.get("newPassword")
-    authenticated_user_id = data.get("authenticated_user_id")
-    
-    if not authenticated_user_id:
-        return jsonify({"error": "Unauthorized"}), 401
-    
-    try:
-        authenticated_user_id = int(authenticated_user_id)
-    except (TypeError, ValueError):
-        return jsonify({"error": "Invalid authentication"}), 401
-    
-    if authenticated_user_id != user_id:
-        return jsonify({"error": "Forbidden - Access denied"}), 403
 
     if not new_password:
         return jsonify({"error": "Missing new password"}), 400
 
+    hashed = hash_password(new_password)
     conn = get_db_connection()
     try:
-        conn.execute("UPDATE users SET password = ? WHERE id = ?",
-                     (new_password, user_id))
-        conn.commit()
-        changes = conn.total_changes
+        cur = execute_write(conn, "UPDATE users SET password = ? WHERE id = ?",
+                            (hashed, user_id))
+        # rowcount and not conn.total_changes, pooled connections are reused
+        changes = cur.rowcount
         
         if changes == 0:
             return jsonify({"success": False}), 404
@@ -277,26 +355,23 @@ app.register_blueprint(cv_bp)
 
 @app.route("/pictures/<filename>")
 def get_picture(filename):
-    return send_from_directory(PICTURES_FOLDER, filename)
+    path = safe_join(PICTURES_FOLDER, filename)
+    if path is None or not os.path.isfile(path):
+        return jsonify({"error": "Picture not found"}), 404
+
+    # ?size=N -> the smallest stored variant with a shorter side of at least N pixels
+    size = request.args.get("size", type=int)
+    if size:
+        path = best_variant(path, size)
+    # content-hashed names never change, old user_<id>.<ext> ones get revalidated
+    return send_picture(path, immutable=bool(HASHED_PICTURE.match(filename)))
 # fore the pictrures
 
 
 @app.route("/users/<int:user_id>/profile-picture", methods=["POST"])
+@upload_limit(PICTURE_LIMIT)
+@owner_only
 def upload_profile_picture(user_id):
-    # Verify authenticated user can only upload their own profile picture
-    authenticated_user_id = request.form.get("authenticated_user_id")
-    
-    if not authenticated_user_id:
-        return jsonify({"error": "Unauthorized"}), 401
-    
-    try:
-        authenticated_user_id = int(authenticated_user_id)
-    except (TypeError, ValueError):
-        return jsonify({"error": "Invalid authentication"}), 401
-    
-    if authenticated_user_id != user_id:
-        return jsonify({"error": "Forbidden - Access denied"}), 403
-    
     if "profile_picture" not in request.files:
         return jsonify({"error": "No file part"}), 400
 
@@ -308,40 +383,150 @@ def upload_profile_picture(user_id):
     if not allowed_file(file.filename):
         return jsonify({"error": "Invalid file type. Only .jpg, .jpeg, .png allowed."}), 400
 
+    # the extension is whatever the client says, the first bytes aren't
+    if sniffed_type_of(file) not in IMAGE_TYPES:
+        return jsonify({"error": "Invalid file type. Only .jpg, .jpeg, .png allowed."}), 400
+
     ext = file.filename.rsplit(".", 1)[1].lower()
-    filename = secure_filename(f"user_{user_id}.{ext}")
+    # user_<id>-<content hash>.<ext>, a new picture always gets a new URL
+    filename = save_profile_picture(file, PICTURES_FOLDER, user_id, ext)
     save_path = os.path.join(PICTURES_FOLDER, filename)
-    file.save(save_path)
+    make_variants_quietly(save_path, PROFILE_SIZES)
 
     # Save filename in DB
     conn = get_db_connection()
     try:
-        conn.execute(
+        old = conn.execute("SELECT profile_picture FROM users WHERE id = ?", (user_id,)).fetchone()
+        execute_write(
+            conn,
             "UPDATE users SET profile_picture = ? WHERE id = ?",
             (filename, user_id)
         )
-        conn.commit()
-        url = f"http://localhost:3001/pictures/{filename}"
-        return jsonify({"profile_picture": url}), 200
     finally:
         conn.close()
 
+    # the previous picture isn't linked from anywhere any more
+    old_name = old["profile_picture"] if old else None
+    old_path = safe_join(PICTURES_FOLDER, old_name) if old_name and old_name != filename else None
+    if old_path and os.path.isfile(old_path):
+        os.remove(old_path)
+        remove_variants(old_path)
+
+    url = f"http://localhost:3001/pictures/{filename}?size={PROFILE_PICTURE_SIZE}"
+    return jsonify({"profile_picture": url}), 200
+
+
+HISTORY_MAX_LIMIT = 500
+
+
+def encode_cursor(start_time_utc, event_id):
+    raw = json.dumps([start_time_utc, event_id]).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii")
+
+
+def decode_cursor(cursor):
+    """Returns (start_time_utc, id) of the last event the client has, or None if it's garbage."""
+    try:
+        start_time_utc, event_id = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    except (ValueError, TypeError, UnicodeError):
+        return None
+    if not isinstance(start_time_utc, str) or not isinstance(event_id, int):
+        return None
+    return start_time_utc, event_id
+
+
+def history_rows(conn, user_id, columns, after=None, limit=None):
+    """
+    A user's events in (start_time_utc, id) order, starting after `after`.
+    The row-value comparison seeks straight into idx_events_user_start,
+    so page 100 costs the same as page 1.
+    """
+    sql = f"SELECT e.start_time_utc AS _start, e.id AS _id, {columns} FROM events e WHERE e.user_id = ?"
+    params = [user_id]
+    if after:
+        sql += " AND (e.start_time_utc, e.id) > (?, ?)"
+        params += list(after)
+    sql += " ORDER BY e.start_time_utc, e.id"
+    if limit:
+        sql += " LIMIT ?"
+        params.append(limit)
+    return conn.execute(sql, params)
+
+
+def strip_cursor_columns(row):
+    event = dict(row)
+    del event["_start"], event["_id"]
+    return event
+
 
 @app.route("/history", methods=["GET"])
+@cached_per_user
 def get_events():
+    """
+    All of a user's events, oldest first.
+      /history?user_id=1                          -> [{...}, ...] (everything, like before)
+      /history?user_id=1&limit=50[&cursor=...]    -> {"events": [...], "next_cursor": "..." or null}
+      /history?user_id=1&format=ndjson            -> one JSON event per line, streamed
+    fields=id,title,... picks the columns (see EVENT_FIELDS) in every mode.
+    """
+    user_id, denied = current_user()
+    if denied:
+        return denied
+
+    columns, error = event_columns(request.args.get("fields"))
+    if error:
+        return jsonify({"error": error}), 400
+
+    after = None
+    cursor = request.args.get("cursor")
+    if cursor:
+        after = decode_cursor(cursor)
+        if after is None:
+            return jsonify({"error": "invalid cursor"}), 400
+
+    limit = request.args.get("limit")
+    if limit is not None:
+        try:
+            limit = int(limit)
+        except ValueError:
+            limit = 0
+        if not 1 <= limit <= HISTORY_MAX_LIMIT:
+            return jsonify({"error": f"limit must be between 1 and {HISTORY_MAX_LIMIT}"}), 400
+
+    ndjson = (request.args.get("format") == "ndjson"
+              or request.accept_mimetypes.best == "application/x-ndjson")
+    if ndjson:
+        def generate():
+            # rows are written as they come off the cursor, the list is never built
+            conn = get_db_connection()
+            try:
+                for row in history_rows(conn, user_id, columns, after, limit):
+                    yield json.dumps(strip_cursor_columns(row)) + "\n"
+            finally:
+                conn.close()
+        return Response(generate(), mimetype="application/x-ndjson")
+
     conn = get_db_connection()
     try:
-        user_id = request.args.get("user_id")
-        rows = conn.execute(
-            "SELECT * FROM events WHERE user_id = ?", (user_id,)).fetchall()
+        # one extra row tells us whether there is a next page
+        rows = history_rows(conn, user_id, columns, after, limit + 1 if limit else None).fetchall()
     finally:
         conn.close()
-    return jsonify([dict(r) for r in rows])
+
+    if limit is None and cursor is None:
+        return jsonify([strip_cursor_columns(r) for r in rows])
+
+    page = rows[:limit]
+    next_cursor = None
+    if limit and len(rows) > limit:
+        next_cursor = encode_cursor(page[-1]["_start"], page[-1]["_id"])
+    return jsonify({"events": [strip_cursor_columns(r) for r in page], "next_cursor": next_cursor})
 
 
 ######################################## for eventlist #######################################
 
 @app.route("/events", methods=["POST"])
+@upload_limit(EVENT_FILE_LIMIT)
 def create_event():
 
     # data = request.get_json(silent=True) or {}
@@ -352,28 +537,22 @@ def create_event():
     else:
         data = request.get_json(silent=True) or {}
 
-    print("Incoming /events POST:", data)
+    app.logger.debug("incoming /events POST: %s", data)
 
     title = (data.get("title") or "").strip()
     description = (data.get("description") or "").strip()
     date = (data.get("date") or "").strip()       # "YYYY-MM-DD"
     time = (data.get("time") or "").strip()       # "HH:MM" or ""
     importance = data.get("importance", 0)
-    user_id = data.get("user_id")
 
     # validation
-    if not user_id:
-        print("Missing user_id")
-        return jsonify({"error": "User must be logged in"}), 401
-
-    try:
-        user_id = int(user_id)
-    except (TypeError, ValueError):
-        print("Invalid user_id:", user_id)
-        return jsonify({"error": "Invalid user_id"}), 400
+    user_id, denied = current_user()
+    if denied:
+        app.logger.debug("POST /events without a logged in user")
+        return denied
 
     if not title or not date:
-        print("Missing title or date")
+        app.logger.debug("POST /events without title or date")
         return jsonify({"error": "title and date are required"}), 400
 
     #  datetime strings
@@ -386,10 +565,9 @@ def create_event():
     # Insert into DB with error logging
 
     conn = get_db_connection()
-    cur = conn.cursor()
 
-    try:
-        cur.execute(
+    def insert_event(c):
+        cur = c.execute(
             """
             INSERT INTO events (user_id, event_id, title, description,
                                 start_time_utc, end_time_utc, importance)
@@ -405,40 +583,38 @@ def create_event():
                 importance,
             ),
         )
-        conn.commit()
-        # next week add the functionality of the email verification and upload file feature to the form
+
+        user_row = c.execute("SELECT email FROM users WHERE id = ?", (user_id,)).fetchone()
+        user_email = user_row["email"] if user_row else None
+
+        # the email is queued in the same transaction and sent by the outbox worker,
+        # so the response doesn't wait for SMTP
+        if user_email:
+            email_outbox.enqueue(c, event_creation_message(
+                email=user_email,
+                title=title,
+                description=description,
+                start_time_utc=start_dt,
+                importance=str(importance),
+            ), kind="event_creation")
 
         event_id = cur.lastrowid
+        due_at = reminder_scheduler.schedule_reminder(c, event_id, user_id, start_dt)
+        return event_id, due_at
+
+    try:
+        event_id, reminder_due_at = run_write(conn, insert_event)
+        reminder_scheduler.notify(event_id, reminder_due_at)
+        bump_user(user_id)
 
         # calling the save_file function kikos made
         file = request.files.get("file")
         if file and file.filename:
             save_file(file, user_id, event_id)
-
-        cur.execute("SELECT email FROM users WHERE id = ?", (user_id,))
-        user_row = cur.fetchone()
-        user_email = user_row["email"] if user_row else None
-
-        # event_creation(user_email, title, description,
-        #                start_dt, str(importance))
-
-        if user_email:
-            try:
-                event_creation(
-                    email=user_email,
-                    title=title,
-                    description=description,
-                    start_time_utc=start_dt,
-                    importance=str(importance),
-                )
-            except Exception as e:
-                # You probably don't want email failure to break the API
-                print("Error sending event creation email:", repr(e))
-
-        # event_creation(email,title,description,start_time_utc,importance)
     except Exception as e:
         conn.rollback()
-        print(" DB error on INSERT into events:", repr(e))
+        conn.close()
+        app.logger.exception("DB error on INSERT into events")
         return jsonify({"error": "database error", "details": str(e)}), 500
 
     # event_id = cur.lastrowid
@@ -447,21 +623,23 @@ def create_event():
         (event_id,)
     ).fetchone()
     conn.close()
+    email_outbox.wake()
 
-    print("Event inserted with id:", event_id)
+    app.logger.info("event inserted", extra={"event_id": event_id, "user_id": user_id})
     return jsonify(dict(row)), 201
 
 
 @app.route("/events", methods=["GET"])
+@cached_per_user
 def list_events_for_day():
 
     date = request.args.get("date")
-    user_id = request.args.get("user_id")
     if not date:
         return jsonify({"error": "missing date parameter"}), 400
 
-    if not user_id:
-        return jsonify({"error": "missing user_id parameter"}), 401
+    user_id, denied = current_user()
+    if denied:
+        return denied
 
     start_dt = f"{date}T00:00:00"
     end_dt = f"{date}T23:59:59"
@@ -479,23 +657,126 @@ def list_events_for_day():
         AND user_id = ?
         ORDER BY start_time_utc
     """, (start_dt, end_dt, user_id)).fetchall()
+    conn.close()
 
     return jsonify([dict(r) for r in rows])
 
+
+# columns a client can ask for with ?fields=a,b,c (name -> SQL, events table is "e")
+EVENT_FIELDS = {
+    "id": "e.id",
+    "user_id": "e.user_id",
+    "event_id": "e.event_id",
+    "title": "e.title",
+    "description": "e.description",
+    "start_time_utc": "e.start_time_utc",
+    "end_time_utc": "e.end_time_utc",
+    "importance": "e.importance",
+    "scheduled_to_send": "e.scheduled_to_send",
+    "has_file": "EXISTS (SELECT 1 FROM uploads u WHERE u.event_id = e.id)",
+}
+
+MAX_RANGE_DAYS = 92
+
+
+def event_columns(fields):
+    """
+    Turn a ?fields= value into a SELECT list. Returns (sql, error).
+    No fields -> every column plus has_file, like /events?date= returns.
+    """
+    names = [f.strip() for f in fields.split(",") if f.strip()] if fields else list(EVENT_FIELDS)
+    unknown = [name for name in names if name not in EVENT_FIELDS]
+    if unknown or not names:
+        return None, f"unknown field(s): {', '.join(unknown)}" if unknown else "no fields requested"
+    return ", ".join(f"{EVENT_FIELDS[name]} AS {name}" for name in names), None
+
+
+def parse_day(value):
+    try:
+        return datetime.strptime(value or "", "%Y-%m-%d").date()
+    except ValueError:
+        return None
+
+
+@app.route("/events/range", methods=["GET"])
+@cached_per_user
+def list_events_in_range():
+    """
+    Events from `from` to `to` (both YYYY-MM-DD, inclusive) in one query, grouped by day:
+      /events/range?user_id=1&from=2025-01-01&to=2025-01-31[&fields=id,title]
+      -> {"from": ..., "to": ..., "days": {"2025-01-03": [{...}, ...], ...}}
+    With mode=counts only the number of events per day is returned (month view badges):
+      -> {"from": ..., "to": ..., "counts": {"2025-01-03": 2, ...}}
+    Days without events are left out.
+    """
+    user_id, denied = current_user()
+    if denied:
+        return denied
+
+    first_day = parse_day(request.args.get("from"))
+    last_day = parse_day(request.args.get("to"))
+    if not first_day or not last_day:
+        return jsonify({"error": "from and to must be dates (YYYY-MM-DD)"}), 400
+    if last_day < first_day:
+        return jsonify({"error": "to is before from"}), 400
+    if (last_day - first_day).days >= MAX_RANGE_DAYS:
+        return jsonify({"error": f"range is limited to {MAX_RANGE_DAYS} days"}), 400
+
+    start_dt = f"{first_day.isoformat()}T00:00:00"
+    end_dt = f"{last_day.isoformat()}T23:59:59"
+    result = {"from": first_day.isoformat(), "to": last_day.isoformat()}
+
+    mode = request.args.get("mode", "events")
+    if mode == "counts":
+        conn = get_db_connection()
+        try:
+            # answered from idx_events_user_start alone
+            rows = conn.execute("""
+                SELECT substr(start_time_utc, 1, 10) AS day, COUNT(*) AS count
+                FROM events
+                WHERE user_id = ? AND start_time_utc BETWEEN ? AND ?
+                GROUP BY day
+                ORDER BY day
+            """, (user_id, start_dt, end_dt)).fetchall()
+        finally:
+            conn.close()
+        result["counts"] = {r["day"]: r["count"] for r in rows}
+        return jsonify(result)
+
+    if mode != "events":
+        return jsonify({"error": "mode must be events or counts"}), 400
+
+    columns, error = event_columns(request.args.get("fields"))
+    if error:
+        return jsonify({"error": error}), 400
+
+    conn = get_db_connection()
+    try:
+        rows = conn.execute(f"""
+            SELECT substr(e.start_time_utc, 1, 10) AS _day, {columns}
+            FROM events e
+            WHERE e.user_id = ? AND e.start_time_utc BETWEEN ? AND ?
+            ORDER BY e.start_time_utc
+        """, (user_id, start_dt, end_dt)).fetchall()
+    finally:
+        conn.close()
+
+    days = {}
+    for r in rows:
+        event = dict(r)
+        days.setdefault(event.pop("_day"), []).append(event)
+    result["days"] = days
+    return jsonify(result)
+
     ######################################## delete event#######################################
 
 
 @app.route("/events/<int:event_id>", methods=["DELETE"])
 def delete_event(event_id):
 
-    user_id = request.args.get("user_id")
-    if not user_id:
-        return jsonify({"error": "missing user_id parameter"}), 400
-
-    try:
-        user_id_int = int(user_id)
-    except (TypeError, ValueError):
-        return jsonify({"error": "invalid user_id"}), 400
+    user_id, denied = current_user()
+    if denied:
+        return denied
 
     conn = get_db_connection()
     cur = conn.cursor()
@@ -510,54 +791,80 @@ def delete_event(event_id):
         conn.close()
         return jsonify({"error": "event not found"}), 404
 
-    if row["user_id"] != user_id_int:
+    if row["user_id"] != user_id:
         conn.close()
         return jsonify({"error": "forbidden: event does not belong to this user"}), 403
 
-    try:
+    def delete_rows(c):
         # 2️⃣ Delete associated uploads first (because of FK)
-        cur.execute("DELETE FROM uploads WHERE event_id = ?", (event_id,))
+        c.execute("DELETE FROM uploads WHERE event_id = ?", (event_id,))
 
-        # 3️⃣ Then delete the event
-        cur.execute("DELETE FROM events WHERE id = ?", (event_id,))
+        # 3️⃣ Then delete the event (and its pending reminder)
+        reminder_scheduler.cancel_reminder(c, event_id)
+        c.execute("DELETE FROM events WHERE id = ?", (event_id,))
 
-        conn.commit()
+    try:
+        run_write(conn, delete_rows)
     except Exception as e:
         conn.rollback()
         conn.close()
-        print("DB error on DELETE event:", repr(e))
+        app.logger.exception("DB error on DELETE event", extra={"event_id": event_id})
         return jsonify({"error": "database error", "details": str(e)}), 500
 
     conn.close()
+    bump_user(user_id)
     return jsonify({"status": "ok", "deleted_id": event_id}), 200
 
 ######################################## delete event #######################################
 
 
-######################################## for eventlist #######################################
+######################################## event attachment #######################################
 
-# had to manualy import the file in the app.py
-def save_file(file_storage, user_id, event_id):
-    """
-    file_storage = request.files["file"]
-    """
-    filename = file_storage.filename
-    file_data = file_storage.read()
-
-    # Save to database
-    conn = sqlite3.connect("./db/database.db")
-    cursor = conn.cursor()
-    cursor.execute(
-        "INSERT INTO uploads (filename, filedata, user_id, event_id) VALUES (?, ?, ?, ?)",
-        (filename, file_data, user_id, event_id)
-    )
-    conn.commit()
-    conn.close()
+@app.route("/events/<int:event_id>/file", methods=["GET"])
+@query_token
+def download_event_file(event_id):
+
+    user_id, denied = current_user()
+    if denied:
+        return denied
+
+    conn = get_db_connection()
+    try:
+        row = conn.execute(
+            "SELECT user_id FROM events WHERE id = ?",
+            (event_id,)
+        ).fetchone()
+
+        if not row:
+            return jsonify({"error": "event not found"}), 404
+
+        if row["user_id"] != user_id:
+            return jsonify({"error": "forbidden: event does not belong to this user"}), 403
 
-    print(f"File saved successfully: {filename}")
-    return filename
+        # only metadata here, the bytes are streamed by send_upload
+        upload = conn.execute(
+            """
+            SELECT id, filename, sha256, size, content_type
+            FROM uploads
+            WHERE event_id = ? AND (sha256 IS NOT NULL OR filedata IS NOT NULL)
+            ORDER BY id DESC
+            LIMIT 1
+            """,
+            (event_id,)
+        ).fetchone()
+    finally:
+        conn.close()
+
+    if not upload:
+        return jsonify({"error": "event has no file"}), 404
+
+    try:
+        return send_upload(upload)
+    except BlobNotFound:
+        app.logger.warning("upload missing from blob store", extra={"sha256": upload["sha256"]})
+        return jsonify({"error": "file is missing"}), 404
 
 
-# Run Flask
+# Run Flask (dev server with the debugger; in production run python serve.py)
 if __name__ == "__main__":
     app.run(debug=True, host="0.0.0.0", port=3001)
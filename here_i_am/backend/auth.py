@@ -0,0 +1,152 @@
+"""
+Who is making the request.
+
+/login hands out a signed token (itsdangerous, HMAC-SHA256 over the user id
+and a timestamp). The client sends it back as "Authorization: Bearer <token>".
+Plain links (attachment downloads) can't set headers, so views marked with
+@query_token also take it as ?token=...; nowhere else, a token in the URL
+ends up in access logs and browser history. load_identity runs before every
+request and only checks the signature and the age, so there is no database
+lookup; handlers get the result from current_user().
+
+HEREIAM_LEGACY_AUTH=1 lets clients from before the tokens in: the id they
+name (authenticated_user_id / user_id) is believed, like before. It is off
+unless set, anyone can put any id in a request.
+
+The signing key is HEREIAM_SECRET_KEY, or a random one kept in
+SECRET_KEY_FILE (next to the database) so all workers and restarts share it.
+"""
+import hashlib
+import os
+import secrets
+from functools import wraps
+
+from flask import current_app, g, jsonify, request
+from itsdangerous import BadSignature, SignatureExpired, URLSafeTimedSerializer
+
+from db_pool import DB_PATH
+
+TOKEN_MAX_AGE = int(os.environ.get("HEREIAM_TOKEN_MAX_AGE", str(7 * 24 * 3600)))
+LEGACY_AUTH = os.environ.get("HEREIAM_LEGACY_AUTH", "0") == "1"
+SECRET_KEY_FILE = os.environ.get("HEREIAM_SECRET_KEY_FILE") or os.path.join(
+    os.path.dirname(os.path.abspath(DB_PATH)), "secret_key"
+)
+
+
+def load_secret_key(path=SECRET_KEY_FILE):
+    key = os.environ.get("HEREIAM_SECRET_KEY")
+    if key:
+        return key
+    try:
+        # O_EXCL: if two workers start at once only one key is written
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    except FileExistsError:
+        with open(path) as f:
+            return f.read().strip()
+    key = secrets.token_hex(32)
+    with os.fdopen(fd, "w") as f:
+        f.write(key)
+    return key
+
+
+_serializer = None
+
+
+def get_serializer():
+    global _serializer
+    if _serializer is None:
+        _serializer = URLSafeTimedSerializer(
+            load_secret_key(), salt="hereiam-auth", signer_kwargs={"digest_method": hashlib.sha256}
+        )
+    return _serializer
+
+
+def issue_token(user_id):
+    return get_serializer().dumps({"uid": user_id})
+
+
+def read_token(token, max_age=None):
+    """User id in `token`. Raises itsdangerous.BadSignature (or SignatureExpired)."""
+    return get_serializer().loads(token, max_age=TOKEN_MAX_AGE if max_age is None else max_age)["uid"]
+
+
+def query_token(view):
+    """Mark a view that may get its token as ?token= (it is opened as a plain link)."""
+    view.accepts_query_token = True
+    return view
+
+
+def _accepts_query_token():
+    view = current_app.view_functions.get(request.endpoint)
+    return getattr(view, "accepts_query_token", False)
+
+
+def load_identity():
+    """before_request hook: g.user_id from the token, g.auth_error if the token is bad."""
+    g.user_id = None
+    g.auth_error = None
+
+    token = None
+    header = request.headers.get("Authorization", "")
+    if header.startswith("Bearer "):
+        token = header[len("Bearer "):].strip()
+    elif "token" in request.args and _accepts_query_token():
+        token = request.args["token"]
+    if not token:
+        return
+
+    try:
+        g.user_id = read_token(token)
+    except SignatureExpired:
+        g.auth_error = "Session expired, please log in again"
+    except (BadSignature, KeyError, TypeError):
+        g.auth_error = "Invalid authentication"
+
+
+def _claimed(field):
+    """The user id the client names in the query, form or JSON body."""
+    value = request.values.get(field)
+    if value is None and request.is_json:
+        value = (request.get_json(silent=True) or {}).get(field)
+    return value
+
+
+def current_user(field="user_id"):
+    """
+    (user_id, None) for whoever makes the request, or (None, error response).
+    `field` is where old clients put their id; with a token it may still be
+    sent, but has to be the token's user.
+    """
+    if g.get("auth_error"):
+        return None, (jsonify({"error": g.auth_error}), 401)
+
+    claimed = _claimed(field)
+    if claimed is not None and claimed != "":
+        try:
+            claimed = int(claimed)
+        except (TypeError, ValueError):
+            return None, (jsonify({"error": "Invalid authentication"}), 401)
+    else:
+        claimed = None
+
+    if g.get("user_id") is not None:
+        if claimed is not None and claimed != g.user_id:
+            return None, (jsonify({"error": "Forbidden - Access denied"}), 403)
+        return g.user_id, None
+
+    if LEGACY_AUTH and claimed is not None:
+        return claimed, None
+    return None, (jsonify({"error": "Unauthorized"}), 401)
+
+
+def owner_only(view):
+    """For /users/<user_id>/... routes: only that user gets through."""
+    @wraps(view)
+    def wrapper(user_id, *args, **kwargs):
+        identity, error = current_user("authenticated_user_id")
+        if error:
+            return error
+        if identity != user_id:
+            return jsonify({"error": "Forbidden - Access denied"}), 403
+        return view(user_id, *args, **kwargs)
+    return wrapper
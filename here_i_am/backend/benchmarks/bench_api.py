@@ -0,0 +1,403 @@
+"""
+Load test for the API: seeds a throwaway database with synthetic users, events
+and uploads, then drives the main routes with --clients threads and reports
+requests/s and p50/p95/p99 per scenario.
+
+    python benchmarks/bench_api.py --users 50 --events 200 --uploads 100 --seconds 5
+    python benchmarks/bench_api.py --server wsgi --out before.json
+    python benchmarks/bench_api.py --out after.json --compare before.json
+
+--server flask goes through app.test_client() (no sockets, measures the app),
+--server wsgi through a local threaded Werkzeug server over HTTP.
+Emails are sent by the outbox worker to an SMTP stub on 127.0.0.1, never to Gmail.
+--out writes the numbers (plus commit and settings) as JSON; --compare exits
+with 1 when a scenario's p95 or requests/s got worse than --max-regression.
+"""
+import argparse
+import json
+import logging
+import math
+import os
+import platform
+import random
+import socket
+import sqlite3
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from datetime import date, timedelta
+from io import BytesIO
+
+from aiosmtpd.controller import Controller
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+PASSWORD = "bench-password"
+FIRST_DAY = date(2025, 1, 1)
+
+
+class CountingHandler:
+    """aiosmtpd handler standing in for Gmail: accepts every message and counts it."""
+
+    def __init__(self):
+        self.messages = 0
+
+    async def handle_DATA(self, server, session, envelope):
+        self.messages += 1
+        return "250 Message accepted for delivery"
+
+
+def start_smtp_stub(host="127.0.0.1"):
+    """Local SMTP server (aiosmtpd, like the outbox tests) -> (handler, controller)."""
+    with socket.socket() as s:
+        s.bind((host, 0))
+        port = s.getsockname()[1]
+    handler = CountingHandler()
+    controller = Controller(handler, hostname=host, port=port)
+    controller.start()
+    return handler, controller
+
+
+def seed(db_path, users=20, events=100, uploads=50, upload_size=16 * 1024, seed=1):
+    """
+    Fill an (already migrated) database: `users` users with `events` events each
+    spread over a year, and `uploads` attachments spread over those events.
+    Returns [(user_id, username, [day, ...]), ...].
+    """
+    from blob_store import get_blob_store
+    from passwords import hash_password
+
+    rnd = random.Random(seed)
+    # one hash for everyone, seeding thousands of scrypt hashes would take minutes
+    password = hash_password(PASSWORD)
+    store = get_blob_store()
+
+    conn = sqlite3.connect(db_path)
+    seeded = []
+    event_ids = []
+    try:
+        for n in range(users):
+            cur = conn.execute(
+                "INSERT INTO users (name, surname, username, email, password) VALUES (?, ?, ?, ?, ?)",
+                ("Bench", "User", f"bench{n}", f"bench{n}@example.com", password),
+            )
+            user_id = cur.lastrowid
+            days = sorted(str(FIRST_DAY + timedelta(days=rnd.randrange(365))) for _ in range(events))
+            for i, day in enumerate(days):
+                start = f"{day}T{rnd.randrange(24):02d}:00:00"
+                cur = conn.execute(
+                    "INSERT INTO events (user_id, title, description, start_time_utc, end_time_utc, importance) "
+                    "VALUES (?, ?, 'seeded by bench_api', ?, ?, ?)",
+                    (user_id, f"event {i}", start, start, rnd.randrange(4)),
+                )
+                event_ids.append((user_id, cur.lastrowid))
+            seeded.append((user_id, f"bench{n}", sorted(set(days))))
+
+        for i in range(min(uploads, len(event_ids))):
+            user_id, event_id = rnd.choice(event_ids)
+            sha256, size = store.put(BytesIO(rnd.randbytes(upload_size)))
+            conn.execute(
+                "INSERT INTO uploads (filename, user_id, event_id, sha256, size, content_type) "
+                "VALUES (?, ?, ?, ?, ?, 'application/octet-stream')",
+                (f"upload{i}.bin", user_id, event_id, sha256, size),
+            )
+        conn.commit()
+    finally:
+        conn.close()
+    return seeded
+
+
+def flask_sender(app):
+    """send(method, path, json, headers) -> (status, body), through the Flask test client."""
+    client = app.test_client()
+
+    def send(method, path, json=None, headers=None):
+        res = client.open(path, method=method, json=json, headers=headers)
+        return res.status_code, res.get_data()
+    return send
+
+
+def http_sender(base_url):
+    """send(...) for a server at base_url, over plain HTTP (urllib)."""
+
+    def send(method, path, payload=None, headers=None):
+        headers = dict(headers or {})
+        body = None
+        if payload is not None:
+            body = json.dumps(payload).encode("utf-8")
+            headers["Content-Type"] = "application/json"
+        req = urllib.request.Request(base_url + path, data=body, method=method, headers=headers)
+        try:
+            with urllib.request.urlopen(req) as res:
+                return res.status, res.read()
+        except urllib.error.HTTPError as e:
+            return e.code, e.read()
+    return send
+
+
+def start_wsgi_server(app):
+    """The app on a threaded Werkzeug server on a free port, returns (server, base_url)."""
+    from werkzeug.serving import make_server
+
+    # one access log line per request would be part of what gets measured
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)
+    server = make_server("127.0.0.1", 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, name="bench-wsgi", daemon=True).start()
+    return server, f"http://127.0.0.1:{server.port}"
+
+
+class VirtualUser:
+    """One seeded user, logged in once before its scenario starts."""
+
+    def __init__(self, send, user, rnd):
+        self.send = send
+        self.user_id, self.username, self.days = user
+        self.rnd = rnd
+        self.headers = {}
+        self.created = 0
+
+    def login(self):
+        status, body = self.send("POST", "/login", {"credential": self.username, "password": PASSWORD})
+        if status == 200:
+            self.headers = {"Authorization": f"Bearer {json.loads(body)['token']}"}
+        return status
+
+
+def login(user):
+    return user.login(), 200
+
+
+def events_day(user):
+    day = user.rnd.choice(user.days)
+    return user.send("GET", f"/events?date={day}", headers=user.headers)[0], 200
+
+
+def history(user):
+    return user.send("GET", "/history?limit=50", headers=user.headers)[0], 200
+
+
+def create_event(user):
+    user.created += 1
+    status, _ = user.send("POST", "/events", {
+        "title": f"load test {user.created}",
+        "description": "posted by bench_api",
+        "date": str(FIRST_DAY + timedelta(days=user.rnd.randrange(365))),
+        "time": "10:00",
+        "importance": 1,
+    }, headers=user.headers)
+    return status, 201
+
+
+def generate_cv(user):
+    user.created += 1
+    status, _ = user.send("POST", "/generate-cv", {
+        "name": "Bench", "surname": "User", "birthdate": "25/12/1990",
+        # a new degree every time, otherwise the CV cache answers after the first one
+        "degree": f"BSc Computer Science {user.created}",
+        "job_count": "3", "phone": "+35799123456", "email": f"{user.username}@example.com",
+        "skill_count": "5", "portfolio": "https://example.com", "english_level": "B2",
+        "job_history": "Five years of load testing", "skill_history": "Python, Flask, SQLite",
+    }, headers=user.headers)
+    return status, 200
+
+
+SCENARIOS = {
+    "login": login,
+    "events_day": events_day,
+    "history": history,
+    "create_event": create_event,
+    "generate_cv": generate_cv,
+}
+
+
+def percentile(sorted_times, p):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_times:
+        return 0.0
+    rank = max(1, math.ceil(p / 100 * len(sorted_times)))
+    return sorted_times[rank - 1]
+
+
+def summarize(times, errors, elapsed):
+    times = sorted(times)
+    return {
+        "requests": len(times),
+        "errors": errors,
+        "rps": round(len(times) / elapsed, 1) if elapsed else 0.0,
+        "mean_ms": round(sum(times) / len(times) * 1000, 3) if times else 0.0,
+        "p50_ms": round(percentile(times, 50) * 1000, 3),
+        "p95_ms": round(percentile(times, 95) * 1000, 3),
+        "p99_ms": round(percentile(times, 99) * 1000, 3),
+    }
+
+
+def run_scenario(scenario, make_send, users, clients=4, seconds=None, requests=None, seed=1):
+    """
+    Run one scenario with `clients` threads, each as one of `users` (round robin),
+    for `seconds` or `requests` calls per client. Returns summarize(...).
+    """
+    times = []
+    errors = [0]
+    lock = threading.Lock()
+    rnd = random.Random(seed)
+    virtual = [VirtualUser(make_send(), users[i % len(users)], random.Random(rnd.random())) for i in range(clients)]
+    for user in virtual:
+        if scenario is not login and user.login() != 200:
+            raise RuntimeError(f"could not log in as {user.username}")
+
+    stop_at = None
+    barrier = threading.Barrier(clients + 1)
+
+    def client(user):
+        mine = []
+        failed = 0
+        barrier.wait()
+        done = 0
+        while (requests is None or done < requests) and (stop_at is None or time.perf_counter() < stop_at):
+            started = time.perf_counter()
+            status, expected = scenario(user)
+            mine.append(time.perf_counter() - started)
+            failed += status != expected
+            done += 1
+        with lock:
+            times.extend(mine)
+            errors[0] += failed
+
+    threads = [threading.Thread(target=client, args=(user,)) for user in virtual]
+    for t in threads:
+        t.start()
+    if seconds is not None:
+        stop_at = time.perf_counter() + seconds
+    started = time.perf_counter()
+    barrier.wait()
+    for t in threads:
+        t.join()
+    return summarize(times, errors[0], time.perf_counter() - started)
+
+
+def compare(baseline, results, max_regression=0.2):
+    """Lines describing each scenario against the baseline, and whether any regressed."""
+    lines = []
+    regressed = False
+    for name, new in results["scenarios"].items():
+        old = baseline.get("scenarios", {}).get(name)
+        if not old:
+            lines.append(f"{name:<14} (not in baseline)")
+            continue
+        p95 = new["p95_ms"] / old["p95_ms"] - 1 if old["p95_ms"] else 0.0
+        rps = new["rps"] / old["rps"] - 1 if old["rps"] else 0.0
+        worse = p95 > max_regression or rps < -max_regression
+        regressed |= worse
+        lines.append(f"{name:<14} p95 {old['p95_ms']:>9.2f} -> {new['p95_ms']:>9.2f}ms ({p95:+.0%})   "
+                     f"req/s {old['rps']:>8.1f} -> {new['rps']:>8.1f} ({rps:+.0%}){'   REGRESSED' if worse else ''}")
+    return lines, regressed
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def wait_for_outbox(app_module, timeout=10):
+    """Let the outbox worker send what the run queued (to the stub)."""
+    from db_pool import get_db_connection
+
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        app_module.email_outbox.wake()
+        conn = get_db_connection()
+        try:
+            pending = conn.execute("SELECT COUNT(*) FROM email_outbox WHERE status = 'pending'").fetchone()[0]
+        finally:
+            conn.close()
+        if not pending:
+            return 0
+        time.sleep(0.1)
+    return pending
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--events", type=int, default=100, help="events per user")
+    parser.add_argument("--uploads", type=int, default=50)
+    parser.add_argument("--upload-kb", type=int, default=16)
+    parser.add_argument("--clients", type=int, default=4)
+    parser.add_argument("--seconds", type=float, default=3, help="per scenario")
+    parser.add_argument("--scenarios", nargs="+", choices=list(SCENARIOS), default=list(SCENARIOS))
+    parser.add_argument("--server", choices=["flask", "wsgi"], default="flask")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--out", help="write the results to this JSON file")
+    parser.add_argument("--compare", help="results JSON of an earlier run")
+    parser.add_argument("--max-regression", type=float, default=0.2)
+    args = parser.parse_args()
+
+    smtp, smtp_server = start_smtp_stub()
+    os.environ["HEREIAM_SMTP_HOST"] = smtp_server.hostname
+    os.environ["HEREIAM_SMTP_PORT"] = str(smtp_server.port)
+    os.environ["HEREIAM_OUTBOX_WORKER"] = "1"
+
+    from common import create_schema, load_app, scratch_db_path
+
+    db_path = scratch_db_path()
+    create_schema(db_path)
+    started = time.perf_counter()
+    users = seed(db_path, args.users, args.events, args.uploads, args.upload_kb * 1024, args.seed)
+    print(f"seeded {args.users} users x {args.events} events, {args.uploads} uploads "
+          f"in {time.perf_counter() - started:.1f}s ({db_path})")
+
+    app_module = load_app()
+    server = None
+    if args.server == "wsgi":
+        server, base_url = start_wsgi_server(app_module.app)
+        make_send = lambda: http_sender(base_url)  # noqa: E731
+    else:
+        make_send = lambda: flask_sender(app_module.app)  # noqa: E731
+
+    results = {
+        "commit": git_commit(),
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "settings": {k: v for k, v in vars(args).items() if k not in ("out", "compare")},
+        "scenarios": {},
+    }
+    print(f"{'scenario':<14} {'req/s':>8} {'p50':>9} {'p95':>9} {'p99':>9} {'errors':>7}")
+    for name in args.scenarios:
+        stats = run_scenario(SCENARIOS[name], make_send, users, args.clients, seconds=args.seconds, seed=args.seed)
+        results["scenarios"][name] = stats
+        print(f"{name:<14} {stats['rps']:>8.1f} {stats['p50_ms']:>7.2f}ms {stats['p95_ms']:>7.2f}ms "
+              f"{stats['p99_ms']:>7.2f}ms {stats['errors']:>7}")
+
+    unsent = wait_for_outbox(app_module)
+    results["emails"] = {"delivered_to_stub": smtp.messages, "still_pending": unsent}
+    print(f"emails delivered to the SMTP stub: {smtp.messages} ({unsent} still pending)")
+
+    if server is not None:
+        server.shutdown()
+    smtp_server.stop()
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"results written to {args.out}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        print(f"\nagainst {args.compare} (commit {baseline.get('commit')}):")
+        if baseline.get("settings") != results["settings"]:
+            print(f"note: different settings, {baseline.get('settings')}")
+        lines, regressed = compare(baseline, results, args.max_regression)
+        print("\n".join(lines))
+        if regressed:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+"""
+Read throughput of GET /events while attachments are being uploaded.
+
+Runs the same workload once per journal mode (rollback journal vs WAL):
+  1. readers only
+  2. readers + writers posting events with a file attached
+
+    python benchmarks/bench_events_wal.py --seconds 5 --readers 4 --writers 2
+"""
+import argparse
+import contextlib
+import io
+import sqlite3
+import threading
+import time
+
+from common import create_schema, load_app, remove_db, scratch_db_path
+
+DB_PATH = scratch_db_path()
+
+import auth  # noqa: E402
+import db_config  # noqa: E402
+from db_pool import get_pool  # noqa: E402
+
+app_module = load_app()
+DAY = "2025-01-01"
+
+
+def bench_client():
+    """Test client logged in as the seeded user (id 1)."""
+    client = app_module.app.test_client()
+    client.environ_base["HTTP_AUTHORIZATION"] = f"Bearer {auth.issue_token(1)}"
+    return client
+
+
+def seed(path, events=200):
+    create_schema(path)
+    conn = sqlite3.connect(path)
+    conn.execute(
+        "INSERT INTO users (name, surname, username, email, password) "
+        "VALUES ('Bench', 'User', 'bench', 'bench@example.com', 'pw')"
+    )
+    conn.executemany(
+        "INSERT INTO events (user_id, title, description, start_time_utc, end_time_utc, importance) "
+        "VALUES (1, ?, 'seeded', ?, ?, 1)",
+        [(f"event {i}", f"{DAY}T{i % 24:02d}:00:00", f"{DAY}T{i % 24:02d}:00:00") for i in range(events)],
+    )
+    conn.commit()
+    conn.close()
+
+
+def run_phase(seconds, readers, writers, upload_size, write_interval=0.0):
+    stop = threading.Event()
+    counts = {"reads": 0, "writes": 0, "errors": 0}
+    read_times = []
+    lock = threading.Lock()
+    payload = b"x" * upload_size
+
+    def reader():
+        client = bench_client()
+        while not stop.is_set():
+            t0 = time.perf_counter()
+            res = client.get(f"/events?date={DAY}")
+            took = time.perf_counter() - t0
+            with lock:
+                counts["reads" if res.status_code == 200 else "errors"] += 1
+                read_times.append(took)
+
+    def writer():
+        client = bench_client()
+        while not stop.is_set():
+            res = client.post("/events", data={
+                "title": "upload",
+                "date": "2025-02-01",
+                "time": "10:00",
+                "file": (io.BytesIO(payload), "attachment.bin"),
+            }, content_type="multipart/form-data")
+            with lock:
+                counts["writes" if res.status_code == 201 else "errors"] += 1
+            # fixed upload rate, so both journal modes get the same write load
+            stop.wait(write_interval)
+
+    threads = [threading.Thread(target=reader) for _ in range(readers)]
+    threads += [threading.Thread(target=writer) for _ in range(writers)]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    time.sleep(seconds)
+    stop.set()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+
+    read_times.sort()
+    p95 = read_times[int(len(read_times) * 0.95)] if read_times else 0
+    return {
+        "read_p95_ms": p95 * 1000,
+        "reads_per_sec": counts["reads"] / elapsed,
+        "writes_per_sec": counts["writes"] / elapsed,
+        "errors": counts["errors"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--seconds", type=float, default=3)
+    parser.add_argument("--readers", type=int, default=4)
+    parser.add_argument("--writers", type=int, default=2)
+    parser.add_argument("--upload-kb", type=int, default=64)
+    parser.add_argument("--write-interval", type=float, default=0.05)
+    args = parser.parse_args()
+
+    for mode in ("DELETE", "WAL"):
+        pool = get_pool(DB_PATH)
+        pool.close_all()
+        remove_db(DB_PATH)
+        db_config.PRAGMAS["journal_mode"] = mode
+        seed(DB_PATH)
+
+        # the routes print on every request, keep the report readable
+        with contextlib.redirect_stdout(io.StringIO()):
+            idle = run_phase(args.seconds, args.readers, 0, 0)
+            busy = run_phase(args.seconds, args.readers, args.writers,
+                             args.upload_kb * 1024, args.write_interval)
+
+        kept = busy["reads_per_sec"] / idle["reads_per_sec"] if idle["reads_per_sec"] else 0
+        print(f"journal_mode={mode}")
+        print(f"  reads only        : {idle['reads_per_sec']:8.1f} reads/s, "
+              f"p95 {idle['read_p95_ms']:.1f}ms")
+        print(f"  reads + uploads   : {busy['reads_per_sec']:8.1f} reads/s "
+              f"({kept:.0%} of idle), p95 {busy['read_p95_ms']:.1f}ms, "
+              f"{busy['writes_per_sec']:.1f} uploads/s")
+        print(f"  failed requests   : {busy['errors']}")
+        print(f"  pool              : {pool.stats()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+Logins/sec for a few scrypt costs, going through passwords.KdfPool the way
+/login does: --clients threads verify a password at the same time, the pool
+runs at most --workers hashes at once.
+
+    python benchmarks/bench_passwords.py --costs 12 13 14 15 --clients 32 --seconds 3
+"""
+import argparse
+import os
+import statistics
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from werkzeug.security import check_password_hash, generate_password_hash  # noqa: E402
+
+from passwords import KDF_WORKERS, KdfPool, PasswordBusy  # noqa: E402
+
+PASSWORD = "JessieJamesMeowth"
+
+
+def run(cost, workers, clients, seconds):
+    stored = generate_password_hash(PASSWORD, f"scrypt:{2 ** cost}:8:1")
+    pool = KdfPool(workers=workers, max_waiting=clients, queue_timeout=seconds)
+    latencies = []
+    refused = 0
+    lock = threading.Lock()
+    stop_at = time.perf_counter() + seconds
+
+    def client():
+        nonlocal refused
+        while time.perf_counter() < stop_at:
+            start = time.perf_counter()
+            try:
+                assert pool.run(check_password_hash, stored, PASSWORD)
+            except PasswordBusy:
+                with lock:
+                    refused += 1
+                continue
+            with lock:
+                latencies.append(time.perf_counter() - start)
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=client) for _ in range(clients)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+    pool.shutdown()
+
+    latencies.sort()
+    p95 = latencies[int(len(latencies) * 0.95)] if latencies else 0
+    return len(latencies) / elapsed, statistics.median(latencies or [0]), p95, refused
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--costs", type=int, nargs="+", default=[12, 13, 14, 15, 16],
+                        help="log2 of the scrypt cost (HEREIAM_SCRYPT_COST)")
+    parser.add_argument("--workers", type=int, default=KDF_WORKERS)
+    parser.add_argument("--clients", type=int, default=32)
+    parser.add_argument("--seconds", type=float, default=3)
+    args = parser.parse_args()
+
+    print(f"{args.clients} clients, {args.workers} KDF workers")
+    print(f"{'cost':>6} {'logins/s':>10} {'p50':>9} {'p95':>9} {'refused':>8}")
+    for cost in args.costs:
+        rate, p50, p95, refused = run(cost, args.workers, args.clients, args.seconds)
+        print(f"{'2^' + str(cost):>6} {rate:>10.1f} {p50 * 1000:>7.1f}ms {p95 * 1000:>7.1f}ms {refused:>8}")
+
+
+if __name__ == "__main__":
+    main()
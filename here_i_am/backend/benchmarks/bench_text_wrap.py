@@ -0,0 +1,130 @@
+"""
+text_layout.wrap_text_by_width vs the canvas-based wrapper generate_cv used to
+have (copied below as canvas_wrap_text_by_width), on long job/skill histories.
+
+    python benchmarks/bench_text_wrap.py --chars 10000 --repeat 5
+"""
+import argparse
+import os
+import random
+import string
+import sys
+import time
+from io import BytesIO
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from reportlab.lib.pagesizes import A4  # noqa: E402
+from reportlab.pdfgen import canvas  # noqa: E402
+
+from text_layout import wrap_text_by_width  # noqa: E402
+
+# left column width in render_cv
+MAX_WIDTH = (A4[0] * 0.62 - 20 - 50) * 0.95
+
+
+def canvas_wrap_text_by_width(c, text, font_name, font_size, max_width):
+    """The old nested helper from generate_cv, unchanged apart from taking the canvas."""
+    if not text or not str(text).strip():
+        return ""
+
+    if max_width <= 0:
+        return str(text)
+
+    text = str(text)
+
+    try:
+        c.setFont(font_name, font_size)
+    except:  # noqa: E722
+        c.setFont("Helvetica", font_size)
+
+    paragraphs = text.split('\n')
+    all_lines = []
+
+    for para in paragraphs:
+        if not para.strip():
+            all_lines.append("")
+            continue
+
+        words = para.split()
+        lines = []
+        current_line = ""
+
+        for word in words:
+            word_width = c.stringWidth(word)
+            if word_width > max_width:
+                if current_line:
+                    lines.append(current_line.strip())
+                    current_line = ""
+                chars = list(word)
+                chunk = ""
+                for char in chars:
+                    test_chunk = chunk + char
+                    if c.stringWidth(test_chunk) <= max_width:
+                        chunk = test_chunk
+                    else:
+                        if chunk:
+                            lines.append(chunk)
+                        chunk = char
+                if chunk:
+                    current_line = chunk + " "
+                continue
+
+            test_line = current_line + word + " " if current_line else word + " "
+            test_width = c.stringWidth(test_line)
+
+            if test_width <= max_width:
+                current_line = test_line
+            else:
+                if current_line:
+                    lines.append(current_line.strip())
+                current_line = word + " "
+
+        if current_line:
+            lines.append(current_line.strip())
+
+        all_lines.extend(lines)
+
+    return "\n".join(all_lines) if all_lines else text
+
+
+def make_inputs(chars, seed=1):
+    rnd = random.Random(seed)
+    words = []
+    while sum(len(w) + 1 for w in words) < chars:
+        words.append("".join(rnd.choice(string.ascii_letters) for _ in range(rnd.randint(2, 12))))
+    prose = " ".join(words)[:chars]
+    return {
+        "prose": prose,
+        "prose with newlines": "\n".join(prose[i:i + 300] for i in range(0, chars, 300)),
+        "one long word": "x" * chars,
+        "unicode": ("Καλημέρα κόσμε ✓ " * (chars // 17 + 1))[:chars],
+    }
+
+
+def timed(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--chars", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    c = canvas.Canvas(BytesIO())
+    print(f"{'input':<20} {'canvas':>10} {'text_layout':>12} {'speedup':>8}")
+    for name, text in make_inputs(args.chars).items():
+        old_time, old = timed(lambda: canvas_wrap_text_by_width(c, text, "Helvetica", 10, MAX_WIDTH), args.repeat)
+        new_time, new = timed(lambda: wrap_text_by_width(text, "Helvetica", 10, MAX_WIDTH), args.repeat)
+        assert new == old, f"different line breaks for {name}"
+        print(f"{name:<20} {old_time * 1000:>8.1f}ms {new_time * 1000:>10.1f}ms {old_time / new_time:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
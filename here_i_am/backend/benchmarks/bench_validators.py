@@ -0,0 +1,218 @@
+"""
+cvprogram.validate_many vs running the validators cvprogram used to have
+(copied below as LEGACY_VALIDATORS) field by field, on generated CV records.
+
+    python benchmarks/bench_validators.py --records 20000 --repeat 3
+"""
+import argparse
+import os
+import random
+import re
+import sys
+import time
+from datetime import date, datetime
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from cvprogram import VALIDATORS, validate_many  # noqa: E402
+
+
+# --- the old cvprogram.py, unchanged ---
+
+def legacy_validate_name(name):
+    if not name:
+        return "error your name can't be empty"
+    if not all(char.isalpha() or char.isspace() for char in name):
+        return "error: name can only contain letters and spaces"
+    if len(name) < 2:
+        return "error: name too short"
+    return name.strip()
+
+
+def legacy_validate_birthdate(birthdate):
+    birthdate = birthdate.strip()
+    if not birthdate:
+        return "error: birthdate can't be empty"
+    try:
+        birth_date_obj = datetime.strptime(birthdate, "%d/%m/%Y").date()
+    except ValueError:
+        return "error: invalid date format"
+
+    today = date.today()
+    if birth_date_obj > today:
+        return "error: birthday cannot be in the future"
+    return birthdate
+
+
+def legacy_validate_phone(phone):
+    phone = phone.strip()
+    if not phone:
+        return "error: phone number can't be empty"
+    if phone.startswith("+"):
+        digits = phone[1:]
+    else:
+        digits = phone
+    if not digits.isdigit():
+        return "error: phone number must contain only digits (except leading +)"
+    if len(digits) < 8 or len(digits) > 19:
+        return "error: phone number length is invalid"
+    return phone
+
+
+def legacy_validate_nonempty(value):
+    stripped_value = value.strip()
+    if not stripped_value:
+        return "error: this field cannot be empty"
+    return stripped_value
+
+
+def legacy_validate_job_count(value):
+    stripped_value = value.strip()
+    if not stripped_value.isdigit():
+        return "error: this field must be a number"
+    n = int(stripped_value)
+    if n < 0 or n > 10:
+        return "error: this field must be between 0 and 10"
+    return stripped_value
+
+
+def legacy_validate_skill_count(value):
+    stripped_value = value.strip()
+    if not stripped_value.isdigit():
+        return "error: this field must be a number"
+    n = int(stripped_value)
+    if n < 0 or n > 20:
+        return "error: this field must be between 0 and 20"
+    return stripped_value
+
+
+def legacy_validate_email(email):
+    regex = r'^[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Za-z]{2,}$'
+    email = email.strip()
+    if not email:
+        return "error: email can't be empty"
+    if re.fullmatch(regex, email):
+        return email
+    else:
+        return "error: Invalid Email"
+
+
+def legacy_validate_portfolio(url):
+    url = url.strip()
+    if not url:
+        return ""
+    pattern = r"^https?://.+"
+    if not re.match(pattern, url):
+        return "error: portfolio must be a valid URL starting with http:// or https://"
+    return url
+
+
+def legacy_validate_english_level(level):
+    level = level.strip()
+    if not level:
+        return ""
+    cefr = {"A1", "A2", "B1", "B2", "C1", "C2"}
+    words = {
+        "beginner",
+        "elementary",
+        "intermediate",
+        "upper-intermediate",
+        "advanced",
+        "fluent",
+        "native",
+    }
+    if level.upper() in cefr or level.lower() in words:
+        return level
+    return "error: enter a CEFR level (A1-C2) or level like Intermediate/Advanced"
+
+
+def legacy_validate_optional_text(value):
+    value = value.strip()
+    if not value:
+        return ""
+    if len(value) < 5:
+        return "error: text is too short"
+    return value
+
+
+LEGACY_VALIDATORS = {
+    "name": legacy_validate_name,
+    "surname": legacy_validate_name,
+    "birthdate": legacy_validate_birthdate,
+    "degree": legacy_validate_nonempty,
+    "job_count": legacy_validate_job_count,
+    "phone": legacy_validate_phone,
+    "email": legacy_validate_email,
+    "skill_count": legacy_validate_skill_count,
+    "portfolio": legacy_validate_portfolio,
+    "english_level": legacy_validate_english_level,
+    "job_history": legacy_validate_optional_text,
+    "skill_history": legacy_validate_optional_text,
+}
+
+
+def legacy_validate_many(records):
+    """What cv_routes did per CV before validate_many: every validator, one field at a time."""
+    for record in records:
+        clean = {}
+        errors = {}
+        for field, validator in LEGACY_VALIDATORS.items():
+            value = record.get(field)
+            result = validator("" if value is None else str(value))
+            if result.startswith("error"):
+                errors[field] = result
+            else:
+                clean[field] = result
+        yield clean, errors
+
+
+# a few good and a few bad values per field, mixed at random
+CHOICES = {
+    "name": ["George", "Mary Ann", "Ελένη", "R2D2", "", "J"],
+    "surname": ["Jordan", "Papadopoulos", "O'Neil", " "],
+    "birthdate": ["25/12/1990", "1/2/2000", "31/04/1999", "29/02/2001", "2000-01-01", "01/01/2999", ""],
+    "degree": ["BSc Computer Science", "  MSc  ", ""],
+    "job_count": ["3", "0", "11", "three", ""],
+    "phone": ["+35799123456", "99123456", "12ab", "+1234"],
+    "email": ["george.jordan@example.com", "a@b.co", "not-an-email", ""],
+    "skill_count": ["5", "20", "21", "-1"],
+    "portfolio": ["https://github.com/georgejordan", "", "github.com/x"],
+    "english_level": ["B2", "c1", "Upper-Intermediate", "", "pretty good"],
+    "job_history": ["", "Five years at Team Rocket HQ", "dev"],
+    "skill_history": ["", "Python, Flask, React", "ok"],
+}
+
+
+def make_records(count, seed=1):
+    rnd = random.Random(seed)
+    return [{field: rnd.choice(values) for field, values in CHOICES.items()} for _ in range(count)]
+
+
+def timed(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--records", type=int, default=20000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    assert set(LEGACY_VALIDATORS) == set(VALIDATORS)
+    records = make_records(args.records)
+    old_time, old = timed(lambda: list(legacy_validate_many(records)), args.repeat)
+    new_time, new = timed(lambda: list(validate_many(records)), args.repeat)
+    assert new == old, "validate_many gave different results"
+
+    print(f"{'':<14} {'records/s':>12}")
+    print(f"{'legacy':<14} {args.records / old_time:>12,.0f}")
+    print(f"{'validate_many':<14} {args.records / new_time:>12,.0f}   ({old_time / new_time:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
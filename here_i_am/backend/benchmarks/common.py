@@ -0,0 +1,40 @@
+"""Shared helpers for the scripts in benchmarks/ (not collected by pytest)."""
+import os
+import sys
+import tempfile
+
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.append(BACKEND_DIR)
+
+
+def scratch_db_path(name="bench.db"):
+    """Point the app at a throwaway database + blob dir. Must run before importing app."""
+    scratch = tempfile.mkdtemp(prefix="hereiam-bench-")
+    path = os.path.join(scratch, name)
+    os.environ["HEREIAM_DB_PATH"] = path
+    os.environ["HEREIAM_BLOB_DIR"] = os.path.join(scratch, "blobs")
+    os.environ.setdefault("HEREIAM_OUTBOX_WORKER", "0")
+    os.environ.setdefault("HEREIAM_REMINDER_WORKER", "0")
+    # the routes log every event / upload at INFO, that would drown the report
+    os.environ.setdefault("HEREIAM_LOG_LEVEL", "WARNING")
+    return path
+
+
+def create_schema(path):
+    from migrations import migrate
+
+    migrate(path)
+
+
+def remove_db(path):
+    for suffix in ("", "-wal", "-shm", "-journal"):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+
+
+def load_app():
+    """Import the Flask app with outgoing email switched off (emails stay in the outbox)."""
+    import app as app_module
+
+    app_module.forgot_password = lambda *a, **kw: "benchmark"
+    return app_module
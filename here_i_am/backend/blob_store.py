@@ -0,0 +1,171 @@
+import hashlib
+import os
+import tempfile
+
+
+# Where uploaded files are kept (content addressed, see FileBlobStore)
+BLOB_DIR = os.environ.get("HEREIAM_BLOB_DIR") or os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "blobs"
+)
+BLOB_BACKEND = os.environ.get("HEREIAM_BLOB_BACKEND", "file")
+
+# Uploads are copied in pieces of this size, never read into memory in one go
+CHUNK_SIZE = 64 * 1024
+
+
+class BlobNotFound(Exception):
+    pass
+
+
+class BlobStore:
+    """
+    Interface for upload storage. Blobs are identified by the sha256 of their
+    content, so saving the same file twice only stores it once.
+    """
+
+    def put(self, stream):
+        """Store everything read from `stream`, return (sha256, size)."""
+        raise NotImplementedError
+
+    def put_file(self, path, sha256, size):
+        """
+        Store a finished temp file whose hash is already known (upload_stream
+        computes it while the upload arrives). The file is moved or deleted.
+        """
+        try:
+            with open(path, "rb") as f:
+                return self.put(f)
+        finally:
+            os.remove(path)
+
+    def open(self, sha256):
+        """Return a binary file object for the blob (caller closes it)."""
+        raise NotImplementedError
+
+    def exists(self, sha256):
+        raise NotImplementedError
+
+    def delete(self, sha256):
+        raise NotImplementedError
+
+    def stored_at(self, sha256):
+        """
+        Unix time the blob was last stored (put() of content that is already
+        there counts too). gc-blobs leaves recent blobs alone.
+        """
+        raise NotImplementedError
+
+    def hashes(self):
+        """Every sha256 currently in the store."""
+        raise NotImplementedError
+
+
+class FileBlobStore(BlobStore):
+    """
+    Keeps blobs as plain files: <root>/ab/cd/abcdef0123...
+    New uploads are written to <root>/tmp first and renamed into place once the
+    hash is known, so a half written file is never visible under its hash.
+    """
+
+    def __init__(self, root=BLOB_DIR, chunk_size=CHUNK_SIZE):
+        self.root = os.path.abspath(root)
+        self.chunk_size = chunk_size
+        self.tmp_dir = os.path.join(self.root, "tmp")
+        os.makedirs(self.tmp_dir, exist_ok=True)
+
+    def path(self, sha256):
+        if len(sha256) != 64 or not all(ch in "0123456789abcdef" for ch in sha256):
+            raise BlobNotFound(sha256)
+        return os.path.join(self.root, sha256[:2], sha256[2:4], sha256)
+
+    def put(self, stream):
+        digest = hashlib.sha256()
+        size = 0
+        fd, tmp_path = tempfile.mkstemp(dir=self.tmp_dir)
+        try:
+            with os.fdopen(fd, "wb") as tmp:
+                while True:
+                    chunk = stream.read(self.chunk_size)
+                    if not chunk:
+                        break
+                    digest.update(chunk)
+                    tmp.write(chunk)
+                    size += len(chunk)
+
+            sha256 = digest.hexdigest()
+            final_path = self.path(sha256)
+            if os.path.exists(final_path):
+                # same content already stored -> only mark it as just stored
+                os.remove(tmp_path)
+                os.utime(final_path)
+            else:
+                os.makedirs(os.path.dirname(final_path), exist_ok=True)
+                os.replace(tmp_path, final_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+        return sha256, size
+
+    def put_file(self, path, sha256, size):
+        final_path = self.path(sha256)
+        if os.path.exists(final_path):
+            os.remove(path)
+            os.utime(final_path)
+            return sha256, size
+        os.makedirs(os.path.dirname(final_path), exist_ok=True)
+        try:
+            # spooled next to tmp_dir -> a rename, no second copy of the bytes
+            os.replace(path, final_path)
+        except OSError:
+            # different file system
+            return super().put_file(path, sha256, size)
+        return sha256, size
+
+    def open(self, sha256):
+        try:
+            return open(self.path(sha256), "rb")
+        except FileNotFoundError:
+            raise BlobNotFound(sha256)
+
+    def exists(self, sha256):
+        try:
+            return os.path.exists(self.path(sha256))
+        except BlobNotFound:
+            return False
+
+    def delete(self, sha256):
+        try:
+            os.remove(self.path(sha256))
+        except (FileNotFoundError, BlobNotFound):
+            pass
+
+    def stored_at(self, sha256):
+        try:
+            return os.path.getmtime(self.path(sha256))
+        except FileNotFoundError:
+            raise BlobNotFound(sha256)
+
+    def hashes(self):
+        for dirpath, dirnames, filenames in os.walk(self.root):
+            if dirpath == self.tmp_dir:
+                continue
+            for name in filenames:
+                if len(name) == 64:
+                    yield name
+
+
+BLOB_BACKENDS = {
+    "file": FileBlobStore,
+}
+
+_store = None
+
+
+def get_blob_store():
+    """The store configured by HEREIAM_BLOB_BACKEND (created on first use)."""
+    global _store
+    if _store is None:
+        _store = BLOB_BACKENDS[BLOB_BACKEND]()
+    return _store
@@ -0,0 +1,295 @@
+"""
+Rendering many CVs at once (POST /generate-cv/batch in cv_routes.py).
+
+ReportLab is pure Python, so rendering in the Flask thread holds the GIL and
+a cohort of CVs blocks every other request. Batches are rendered in a
+process pool instead; the request thread only waits for the PDFs and writes
+them into the ZIP as they come back.
+
+The pool uses "spawn" processes: app.py has background threads (email
+outbox, reminders, pooled db connections) that a forked child would inherit
+in whatever state they were in. A spawned process imports the main module
+of its parent again as __mp_main__ (app.py under `python app.py`), so app.py
+only migrates and starts its workers when it isn't loaded that way; the
+render processes themselves run cv_render.
+
+?mode=job batches are written to a ZIP file in JOB_DIR, with the job's state
+next to it as JSON. Every serve.py worker reads them from there, so the
+client may poll and download through any of them. Jobs are deleted
+JOB_TTL seconds after their last change, and the oldest ZIPs go first when
+the directory holds more than JOB_DIR_BYTES. A process renders at most
+MAX_RUNNING_JOBS jobs at a time, past that start_job raises JobsBusy.
+"""
+import json
+import logging
+import multiprocessing
+import os
+import re
+import threading
+import time
+import uuid
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from werkzeug.utils import secure_filename
+
+import cv_render
+from metrics import CV_RENDERS
+
+CV_WORKERS = int(os.environ.get("HEREIAM_CV_WORKERS", "0")) or os.cpu_count() or 2
+MAX_BATCH_SIZE = int(os.environ.get("HEREIAM_CV_BATCH_LIMIT", "200"))
+JOB_DIR = os.environ.get("HEREIAM_CV_JOB_DIR") or os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "cv_jobs"
+)
+JOB_DIR_BYTES = int(os.environ.get("HEREIAM_CV_JOB_BYTES", str(512 * 1024 * 1024)))
+MAX_RUNNING_JOBS = int(os.environ.get("HEREIAM_CV_MAX_JOBS", "4"))
+# jobs are kept this long (seconds) after they last changed, for the client to download
+JOB_TTL = 3600
+
+JOB_ID = re.compile(r"[0-9a-f]{32}")
+
+log = logging.getLogger(__name__)
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_render_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(
+                max_workers=CV_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=cv_render.init_worker,
+            )
+        return _pool
+
+
+def shutdown_render_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=True, cancel_futures=True)
+            _pool = None
+
+
+def pdf_name(index, data):
+    person = secure_filename(f"{data.get('name', '')}_{data.get('surname', '')}".strip("_"))
+    return f"{index + 1:03d}-{person or 'cv'}.pdf"
+
+
+def render_all(items, render, cache=None, key_func=None):
+    """
+    Yield (index, pdf_bytes) for every CV payload in `items`, in the order they
+    finish. Cached PDFs come back first; the rest are rendered in the pool.
+    `render` must be a module-level function so it can be sent to the workers.
+    """
+    futures = {}
+    keys = {}
+    for index, data in enumerate(items):
+        if cache is not None:
+            keys[index] = key_func(data)
+            pdf = cache.get(keys[index])
+            if pdf is not None:
+                yield index, pdf
+                continue
+        futures[get_render_pool().submit(render, data)] = index
+
+    try:
+        for future in as_completed(futures):
+            index = futures[future]
+            pdf = future.result()
+            CV_RENDERS.inc(mode="batch")
+            if cache is not None:
+                cache.put(keys[index], pdf)
+            yield index, pdf
+    finally:
+        # client went away or a render failed, don't keep the workers busy
+        for future in futures:
+            future.cancel()
+
+
+class _ZipStream:
+    """File-like sink for ZipFile; whatever was written so far is handed out by take()."""
+
+    def __init__(self):
+        self._chunks = []
+        self._pos = 0
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._pos += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._pos
+
+    def flush(self):
+        pass
+
+    def take(self):
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def stream_zip(files):
+    """
+    Yield a ZIP archive of (name, bytes) pairs piece by piece, so the first PDF
+    goes out while the others are still rendering. PDFs are already
+    compressed, so they are stored as they are.
+    """
+    sink = _ZipStream()
+    with zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_STORED) as zf:
+        for name, data in files:
+            zf.writestr(name, data)
+            yield sink.take()
+    yield sink.take()
+
+
+class JobsBusy(Exception):
+    """MAX_RUNNING_JOBS batch jobs are already rendering in this process."""
+
+
+class BatchJob:
+
+    def __init__(self, items, job_dir=None):
+        self.id = uuid.uuid4().hex
+        self.items = items
+        self.total = len(items)
+        self.done = 0
+        self.status = "running"
+        self.error = None
+        self.job_dir = job_dir or JOB_DIR
+
+    @classmethod
+    def load(cls, job_dir, job_id):
+        """The job as its state file describes it (without the items), or None."""
+        try:
+            with open(os.path.join(job_dir, f"{job_id}.json"), encoding="utf-8") as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return None
+        job = cls([], job_dir)
+        job.id = job_id
+        job.total, job.done = state["total"], state["done"]
+        job.status, job.error = state["status"], state["error"]
+        return job
+
+    @property
+    def zip_path(self):
+        return os.path.join(self.job_dir, f"{self.id}.zip")
+
+    def to_dict(self):
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "total": self.total,
+            "done": self.done,
+            "error": self.error,
+        }
+
+    def save(self):
+        """Write the state file, replaced in one step so readers never see half of it."""
+        path = os.path.join(self.job_dir, f"{self.id}.json")
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f)
+        os.replace(tmp, path)
+
+    def run(self, render, cache=None, key_func=None):
+        """Render into <id>.zip.part and rename it to <id>.zip once every PDF is in."""
+        partial = self.zip_path + ".part"
+        try:
+            with zipfile.ZipFile(partial, "w", compression=zipfile.ZIP_STORED) as zf:
+                for index, pdf in render_all(self.items, render, cache, key_func):
+                    zf.writestr(pdf_name(index, self.items[index]), pdf)
+                    self.done += 1
+                    self.save()
+            os.replace(partial, self.zip_path)
+            self.status = "done"
+        except Exception as e:
+            log.exception("CV batch job failed", extra={"job_id": self.id})
+            self.status = "failed"
+            self.error = str(e)
+            _remove(partial)
+        self.save()
+
+
+_running = 0
+_running_lock = threading.Lock()
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def prune_jobs(job_dir=None, now=None):
+    """Delete jobs that haven't changed for JOB_TTL, then the oldest ZIPs past JOB_DIR_BYTES."""
+    job_dir = job_dir or JOB_DIR
+    now = now or time.time()
+    zips = []
+    for entry in os.scandir(job_dir):
+        job_id, _, suffix = entry.name.partition(".")
+        try:
+            st = entry.stat()
+        except FileNotFoundError:
+            continue
+        if suffix == "json" and now - st.st_mtime > JOB_TTL:
+            # finished long ago, or its process died while rendering
+            for name in (f"{job_id}.zip", f"{job_id}.zip.part", entry.name):
+                _remove(os.path.join(job_dir, name))
+        elif suffix == "zip":
+            zips.append((st.st_mtime, st.st_size, job_id))
+
+    total = sum(size for _, size, _ in zips)
+    for _, size, job_id in sorted(zips):
+        if total <= JOB_DIR_BYTES:
+            break
+        log.info("deleting CV batch job to stay under the size limit", extra={"job_id": job_id})
+        for name in (f"{job_id}.zip", f"{job_id}.json"):
+            _remove(os.path.join(job_dir, name))
+        total -= size
+
+
+def start_job(items, render, cache=None, key_func=None, job_dir=None):
+    """Render in the background, the client polls get_job(job.id)."""
+    global _running
+    job_dir = job_dir or JOB_DIR
+    with _running_lock:
+        if _running >= MAX_RUNNING_JOBS:
+            raise JobsBusy()
+        _running += 1
+
+    try:
+        os.makedirs(job_dir, exist_ok=True)
+        prune_jobs(job_dir)
+        job = BatchJob(items, job_dir)
+        job.save()
+    except Exception:
+        with _running_lock:
+            _running -= 1
+        raise
+
+    def run():
+        global _running
+        try:
+            job.run(render, cache, key_func)
+        finally:
+            with _running_lock:
+                _running -= 1
+
+    threading.Thread(target=run, name=f"cv-batch-{job.id[:8]}", daemon=True).start()
+    return job
+
+
+def get_job(job_id, job_dir=None):
+    """The job with this id, started by any worker process, or None."""
+    job_dir = job_dir or JOB_DIR
+    if not JOB_ID.fullmatch(job_id) or not os.path.isdir(job_dir):
+        return None
+    prune_jobs(job_dir)
+    return BatchJob.load(job_dir, job_id)
@@ -0,0 +1,180 @@
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+
+# Rendered CVs kept in memory, evicting the least recently used past this size
+CV_CACHE_BYTES = int(os.environ.get("HEREIAM_CV_CACHE_BYTES", str(32 * 1024 * 1024)))
+# Optional second level on disk (survives restarts, shared by worker processes).
+# Off unless a directory is given.
+CV_CACHE_DIR = os.environ.get("HEREIAM_CV_CACHE_DIR") or None
+CV_CACHE_DISK_BYTES = int(os.environ.get("HEREIAM_CV_CACHE_DISK_BYTES", str(256 * 1024 * 1024)))
+
+# Bump when what cv_render.render_cv draws changes so old PDFs aren't served
+# (2: layout from the cv_layout template, avatar drawn from its downscaled variant)
+RENDER_VERSION = 2
+
+# Everything render_cv reads from the request, nothing else goes into the key
+CV_FIELDS = (
+    "name", "surname", "birthdate", "degree", "job_count", "job_history",
+    "skill_count", "skill_history", "phone", "email", "portfolio", "english_level",
+)
+# render_cv strips these before drawing, so "  BSc " and "BSc" give the same PDF
+STRIPPED_FIELDS = {"degree", "job_history", "skill_history"}
+
+log = logging.getLogger(__name__)
+
+
+def picture_fingerprint(picture_path):
+    """mtime + size of the avatar, so re-uploading a picture under the same name misses."""
+    if not picture_path:
+        return None
+    try:
+        st = os.stat(picture_path)
+    except (OSError, TypeError, ValueError):
+        return None
+    return [str(picture_path), st.st_mtime_ns, st.st_size]
+
+
+def cv_cache_key(data):
+    """sha256 of the normalized form content. Also used as the ETag."""
+    canonical = {"version": RENDER_VERSION}
+    for field in CV_FIELDS:
+        value = data.get(field)
+        if value is None:
+            continue
+        if field in STRIPPED_FIELDS and isinstance(value, str):
+            value = value.strip()
+        canonical[field] = value
+    canonical["picture"] = picture_fingerprint(data.get("picture_path"))
+
+    raw = json.dumps(canonical, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class CVCache:
+    """
+    LRU of rendered PDFs by cv_cache_key, bounded by total bytes.
+    With disk_dir set, entries are also written there and read back on a
+    memory miss; the directory is trimmed (oldest first) past disk_max_bytes.
+    """
+
+    def __init__(self, max_bytes=CV_CACHE_BYTES, disk_dir=CV_CACHE_DIR, disk_max_bytes=CV_CACHE_DISK_BYTES):
+        self.max_bytes = max_bytes
+        self.disk_dir = disk_dir
+        self.disk_max_bytes = disk_max_bytes
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "disk_hits": 0, "misses": 0, "evictions": 0}
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+
+    def get(self, key):
+        with self._lock:
+            pdf = self._entries.get(key)
+            if pdf is not None:
+                self._entries.move_to_end(key)
+                self.stats["hits"] += 1
+                return pdf
+
+        pdf = self._read_disk(key)
+        with self._lock:
+            if pdf is None:
+                self.stats["misses"] += 1
+                return None
+            self.stats["disk_hits"] += 1
+            self._remember(key, pdf)
+        return pdf
+
+    def put(self, key, pdf):
+        with self._lock:
+            self._remember(key, pdf)
+        self._write_disk(key, pdf)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def size(self):
+        return self._size
+
+    def _remember(self, key, pdf):
+        """Call with _lock held."""
+        if len(pdf) > self.max_bytes:
+            return
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self._size -= len(old)
+        self._entries[key] = pdf
+        self._size += len(pdf)
+        while self._size > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self._size -= len(evicted)
+            self.stats["evictions"] += 1
+
+    def _disk_path(self, key):
+        return os.path.join(self.disk_dir, key + ".pdf")
+
+    def _read_disk(self, key):
+        if not self.disk_dir:
+            return None
+        path = self._disk_path(key)
+        try:
+            with open(path, "rb") as f:
+                pdf = f.read()
+            os.utime(path)   # keeps recently used files when trimming
+            return pdf
+        except OSError:
+            return None
+
+    def _write_disk(self, key, pdf):
+        if not self.disk_dir:
+            return
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=self.disk_dir, suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                f.write(pdf)
+            os.replace(tmp_path, self._disk_path(key))
+            self._trim_disk()
+        except OSError as e:
+            # the disk level is only an optimization
+            log.warning("CV cache write failed: %r", e)
+
+    def _trim_disk(self):
+        files = []
+        total = 0
+        for entry in os.scandir(self.disk_dir):
+            if entry.name.endswith(".pdf"):
+                st = entry.stat()
+                files.append((st.st_mtime, entry.path, st.st_size))
+                total += st.st_size
+        files.sort()
+        for _, path, size in files:
+            if total <= self.disk_max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total -= size
+
+
+_cache = None
+
+
+def get_cv_cache():
+    """The process-wide cache (created on first use)."""
+    global _cache
+    if _cache is None:
+        _cache = CVCache()
+    return _cache
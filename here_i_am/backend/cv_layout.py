@@ -0,0 +1,364 @@
+"""
+CV layout described as data instead of coordinates spread through render_cv.
+
+A template lists the page, the columns and the blocks drawn in each column,
+top to bottom. compile_template() turns it into a LayoutPlan once: column
+positions, wrap widths, colours and fonts are all worked out up front, so a
+render only has to fill in the text and move the y cursor down.
+
+Block types (all sizes in points):
+  title    wrapped text ("text" is a format string over the form fields)
+  text     wrapped text, skipped when "if" names an empty field
+           ("wrap": False draws it as is, "height" fixes how far down it moves)
+  line     one unwrapped line, then "height" down
+  heading  section heading, then "height" down
+  labeled  bold label on its own line, then the wrapped field (skipped if empty)
+  space    just moves the cursor down by "height"
+  avatar   circular picture (picture_path) or initials
+  contact  "label: value" rows, each row wrapped on its own
+
+Numbers between 0 and 1 in column "x"/"right" are fractions of the page width.
+"""
+import logging
+import os
+import threading
+
+from reportlab.lib import colors
+from reportlab.lib import pagesizes
+from reportlab.lib.utils import ImageReader
+
+from image_variants import best_variant
+from text_layout import wrap_text_by_width
+
+log = logging.getLogger(__name__)
+
+GREY_HEADING = (0.267, 0.267, 0.267)  # #444
+
+DEFAULT_TEMPLATE = {
+    "page_size": "A4",
+    "top_margin": 80,
+    # text is wrapped to 95% of the column so it never touches the edge
+    "fit": 0.95,
+    # form fields that are stripped before drawing (the others are drawn as sent)
+    "strip": ["degree", "job_history", "skill_history"],
+    "separator": {"x": 0.62, "x_offset": -20, "bottom": 70, "top_margin": 70,
+                  "color": (0.902, 0.902, 0.902), "width": 1},  # #e6e6e6
+    "columns": {
+        "main": {
+            "x": 50, "right": 0.62, "right_offset": -20,
+            "blocks": [
+                {"type": "title", "text": "{name} {surname}", "default": "Your Name",
+                 "font": "Helvetica-Bold", "size": 24, "leading": 28},
+                {"type": "text", "text": "{degree}", "if": "degree",
+                 "font": "Helvetica", "size": 14, "leading": 18, "color": (0.2, 0.2, 0.2)},
+                {"type": "space", "height": 20},
+
+                {"type": "heading", "text": "EXPERIENCE", "height": 18},
+                {"type": "text", "text": "Previous job(s): {job_count}", "wrap": False, "height": 20},
+                {"type": "labeled", "field": "job_history", "label": "Job history:"},
+                {"type": "space", "height": 12},
+                {"type": "line", "text": "Number of skills entered: {skill_count}", "height": 18},
+                {"type": "labeled", "field": "skill_history", "label": "Skill history:"},
+                {"type": "space", "height": 10},
+
+                {"type": "heading", "text": "EDUCATION", "height": 18},
+                {"type": "text", "text": "Degree: {degree}", "if": "degree"},
+            ],
+        },
+        "side": {
+            "x": 0.62, "right": 1, "right_offset": -50,
+            "blocks": [
+                {"type": "avatar", "field": "picture_path", "dx": 80, "dy": -10, "radius": 40},
+                {"type": "space", "height": 80},
+                {"type": "contact", "leading": 15, "gap": 1, "rows": [
+                    # value_x: where the value starts after the label
+                    # inset: how much narrower than the column the value is wrapped
+                    {"field": "email", "label": "email: ", "value_x": 32, "inset": 35},
+                    {"field": "phone", "label": "phone: ", "value_x": 37, "inset": 40},
+                    {"field": "birthdate", "label": "Birthdate: ", "value_x": 50, "inset": 55},
+                    {"field": "portfolio", "label": "Portfolio: ", "value_x": 48, "inset": 52},
+                    {"field": "english_level", "label": "English: ", "value_x": 45, "inset": 48},
+                ]},
+            ],
+        },
+    },
+}
+
+# defaults for block keys the template leaves out
+BLOCK_DEFAULTS = {
+    "font": "Helvetica",
+    "size": 10,
+    "leading": 14,
+    "color": (0, 0, 0),
+    "label_font": "Helvetica-Bold",
+    "label_height": 14,
+    "heading_font": "Helvetica-Bold",
+    "heading_size": 13,
+    "heading_color": GREY_HEADING,
+}
+
+
+class _Fields(dict):
+    """Form data for str.format_map: missing fields and None come out as ""."""
+
+    def __missing__(self, key):
+        return ""
+
+
+def _page_x(value, page_width, offset=0):
+    return (value * page_width if 0 < value <= 1 else value) + offset
+
+
+class LayoutPlan:
+    """A compiled template. draw() is the only per-render work."""
+
+    def __init__(self, page_size, strip, separator, columns):
+        self.page_size = page_size
+        self.strip = strip
+        self.separator = separator
+        self.columns = columns
+
+    def fields(self, data):
+        fields = _Fields()
+        for key, value in data.items():
+            if value is None:
+                continue
+            if key in self.strip and isinstance(value, str):
+                value = value.strip()
+            fields[key] = value
+        return fields
+
+    def draw(self, c, data):
+        fields = self.fields(data)
+
+        if self.separator:
+            x, y0, y1, color, width = self.separator
+            c.setStrokeColorRGB(*color)
+            c.setLineWidth(width)
+            c.line(x, y0, x, y1)
+            c.setFillColor(colors.black)
+
+        for top, ops in self.columns:
+            y = top
+            for op in ops:
+                y = op(c, fields, y)
+
+
+def _draw_lines(c, x, y, lines, font, size, leading, color):
+    c.setFont(font, size)
+    c.setFillColorRGB(*color)
+    text = c.beginText()
+    text.setTextOrigin(x, y)
+    text.setLeading(leading)
+    text.textLines(lines)
+    c.drawText(text)
+
+
+def _compile_title(block, x, max_width):
+    font, size, leading, color = block["font"], block["size"], block["leading"], block["color"]
+    fmt, default = block["text"], block.get("default", "")
+
+    def op(c, fields, y):
+        text = fmt.format_map(fields).strip() or default
+        wrapped = wrap_text_by_width(text, font, size, max_width)
+        _draw_lines(c, x, y, wrapped, font, size, leading, color)
+        return y - leading * (wrapped.count("\n") + 1 if wrapped else 1)
+    return op
+
+
+def _compile_text(block, x, max_width):
+    font, size, leading, color = block["font"], block["size"], block["leading"], block["color"]
+    fmt, condition = block["text"], block.get("if")
+    wrap, height = block.get("wrap", True), block.get("height")
+
+    def op(c, fields, y):
+        if condition and not fields[condition]:
+            return y
+        text = fmt.format_map(fields)
+        if wrap:
+            text = wrap_text_by_width(text, font, size, max_width)
+        _draw_lines(c, x, y, text, font, size, leading, color)
+        if height is not None:
+            return y - height
+        return y - leading * (text.count("\n") + 1)
+    return op
+
+
+def _compile_line(block, x, max_width):
+    font, size, color, height, fmt = block["font"], block["size"], block["color"], block["height"], block["text"]
+
+    def op(c, fields, y):
+        c.setFont(font, size)
+        c.setFillColorRGB(*color)
+        c.drawString(x, y, fmt.format_map(fields))
+        return y - height
+    return op
+
+
+def _compile_heading(block, x, max_width):
+    font, size, color = block["heading_font"], block["heading_size"], block["heading_color"]
+    text, height = block["text"], block["height"]
+
+    def op(c, fields, y):
+        c.setFont(font, size)
+        c.setFillColorRGB(*color)
+        c.drawString(x, y, text)
+        c.setFillColor(colors.black)
+        return y - height
+    return op
+
+
+def _compile_labeled(block, x, max_width):
+    field, label = block["field"], block["label"]
+    label_font, label_height = block["label_font"], block["label_height"]
+    font, size, leading, color = block["font"], block["size"], block["leading"], block["color"]
+
+    def op(c, fields, y):
+        value = fields[field]
+        if not value:
+            return y
+        wrapped = wrap_text_by_width(value, font, size, max_width)
+        c.setFont(label_font, size)
+        c.setFillColorRGB(*color)
+        c.drawString(x, y, label)
+        y -= label_height
+        _draw_lines(c, x, y, wrapped, font, size, leading, color)
+        return y - leading * (wrapped.count("\n") + 1)
+    return op
+
+
+def _compile_space(block, x, max_width):
+    height = block["height"]
+    return lambda c, fields, y: y - height
+
+
+def _compile_avatar(block, x, max_width):
+    field, radius = block["field"], block["radius"]
+    dx, dy = block["dx"], block["dy"]
+    diameter = radius * 2
+    # smallest picture variant that is still sharp when printed (image_variants.CV_SIZES)
+    min_pixels = diameter * block.get("pixels_per_point", 2)
+
+    def op(c, fields, y):
+        cx, cy = x + dx, y + dy
+        picture_path = fields[field]
+        if picture_path and os.path.exists(picture_path):
+            picture_path = best_variant(picture_path, min_pixels)
+            c.saveState()
+            try:
+                p = c.beginPath()
+                p.circle(cx, cy, radius)
+                c.clipPath(p, stroke=0, fill=0)
+
+                img = ImageReader(picture_path)
+                img_w, img_h = img.getSize()
+                aspect = img_h / float(img_w)
+                if img_w < img_h:
+                    new_w, new_h = diameter, diameter * aspect
+                else:
+                    new_w, new_h = diameter / aspect, diameter
+                c.drawImage(picture_path, cx - new_w / 2, cy - new_h / 2,
+                            width=new_w, height=new_h, mask="auto")
+            except Exception as e:
+                log.warning("error drawing image: %r", e, extra={"picture_path": picture_path})
+            finally:
+                # drop the circular clip even if the image was broken
+                c.restoreState()
+        else:
+            initials = "".join(str(fields[k]).strip()[:1].upper() for k in ("name", "surname"))
+            c.setFillColorRGB(0.85, 0.85, 0.85)
+            c.circle(cx, cy, radius, stroke=0, fill=1)
+            if initials:
+                c.setFillColor(colors.white)
+                c.setFont("Helvetica-Bold", 24)
+                c.drawCentredString(cx, cy - 8, initials)
+
+        # ring around the picture / initials
+        c.setStrokeColorRGB(0.7, 0.7, 0.7)
+        c.setLineWidth(2)
+        c.circle(cx, cy, radius, stroke=1, fill=0)
+        c.setStrokeColor(colors.black)
+        return y
+    return op
+
+
+def _compile_contact(block, x, max_width):
+    font, size, leading, gap = block["font"], block["size"], block["leading"], block["gap"]
+    label_font, color = block["label_font"], block["color"]
+    # everything that depends on the row but not on the data, worked out once
+    rows = [(row["field"], row["label"], x + row["value_x"], max_width - row["inset"])
+            for row in block["rows"]]
+
+    def op(c, fields, y):
+        for field, label, value_x, value_width in rows:
+            value = fields[field]
+            if not value:
+                continue
+            wrapped = wrap_text_by_width(value, font, size, value_width)
+            c.setFont(label_font, size)
+            c.setFillColorRGB(*color)
+            c.drawString(x, y, label)
+            _draw_lines(c, value_x, y, wrapped, font, size, leading, color)
+            y -= leading * (wrapped.count("\n") + 1) + gap
+        return y
+    return op
+
+
+BLOCK_TYPES = {
+    "title": _compile_title,
+    "text": _compile_text,
+    "line": _compile_line,
+    "heading": _compile_heading,
+    "labeled": _compile_labeled,
+    "space": _compile_space,
+    "avatar": _compile_avatar,
+    "contact": _compile_contact,
+}
+
+
+def compile_template(template):
+    """Work out every position in `template` once. Raises ValueError for unknown blocks."""
+    page_size = getattr(pagesizes, template.get("page_size", "A4"))
+    width, height = page_size
+    top = height - template["top_margin"]
+    fit = template.get("fit", 1)
+
+    separator = None
+    sep = template.get("separator")
+    if sep:
+        sx = _page_x(sep["x"], width, sep.get("x_offset", 0))
+        separator = (sx, sep["bottom"], height - sep["top_margin"], sep["color"], sep["width"])
+
+    columns = []
+    for name, column in template["columns"].items():
+        x = _page_x(column["x"], width)
+        right = _page_x(column["right"], width, column.get("right_offset", 0))
+        max_width = (right - x) * fit
+        ops = []
+        for block in column["blocks"]:
+            compile_block = BLOCK_TYPES.get(block.get("type"))
+            if compile_block is None:
+                raise ValueError(f"unknown block type in column {name}: {block.get('type')}")
+            ops.append(compile_block({**BLOCK_DEFAULTS, **block}, x, max_width))
+        columns.append((top, ops))
+
+    return LayoutPlan(page_size, set(template.get("strip", ())), separator, columns)
+
+
+TEMPLATES = {
+    "default": DEFAULT_TEMPLATE,
+}
+
+_plans = {}
+_plans_lock = threading.Lock()
+
+
+def get_plan(name="default"):
+    """Compiled plan for a template in TEMPLATES (compiled on first use, then reused)."""
+    plan = _plans.get(name)
+    if plan is None:
+        with _plans_lock:
+            plan = _plans.get(name)
+            if plan is None:
+                plan = _plans[name] = compile_template(TEMPLATES[name])
+    return plan
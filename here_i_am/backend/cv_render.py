@@ -0,0 +1,33 @@
+"""
+The CV renderer, and what the CV render processes (cv_batch.py) run.
+
+Kept small on purpose: the render processes import this and ReportLab, and
+app.py skips its startup (migrations, background threads) when a spawned
+process loads it as __mp_main__.
+"""
+from io import BytesIO
+
+from reportlab.pdfgen import canvas
+
+from cv_layout import get_plan
+from log_config import configure_logging
+
+
+def init_worker():
+    """Initializer of every render process."""
+    configure_logging()
+    # compile the layout once per process, not in the first render
+    get_plan("default")
+
+
+def render_cv(data, template="default"):
+    """Draw the CV for the (already validated) form data, returns the PDF bytes.
+    The layout itself is in cv_layout.py (DEFAULT_TEMPLATE)."""
+    plan = get_plan(template)
+
+    buffer = BytesIO()
+    c = canvas.Canvas(buffer, pagesize=plan.page_size)
+    plan.draw(c, data)
+    c.showPage()
+    c.save()
+    return buffer.getvalue()
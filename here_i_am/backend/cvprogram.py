@@ -1,35 +1,61 @@
-from datetime import datetime, date
+from datetime import date
 import re
 
+# Everything the validators need is built once here, not on every call.
+# They give back exactly the strings they always did, benchmarks/bench_validators.py
+# checks that against the old versions.
+
+EMAIL_RE = re.compile(r'^[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Za-z]{2,}$')
+PORTFOLIO_RE = re.compile(r"^https?://.+")
+# what datetime.strptime(value, "%d/%m/%Y") accepts, without strptime's locale and cache work
+BIRTHDATE_RE = re.compile(r"(3[0-1]|[1-2]\d|0[1-9]|[1-9]| [1-9])/(1[0-2]|0[1-9]|[1-9])/(\d\d\d\d)")
+
+CEFR_LEVELS = frozenset({"A1", "A2", "B1", "B2", "C1", "C2"})
+LEVEL_WORDS = frozenset({
+    "beginner",
+    "elementary",
+    "intermediate",
+    "upper-intermediate",
+    "advanced",
+    "fluent",
+    "native",
+})
+
+
 def validate_name(name):
     if not name:
         return "error your name can't be empty"
-    if not all(char.isalpha() or char.isspace() for char in name):
+    # str.split() drops exactly the characters isspace() is true for
+    letters = "".join(name.split())
+    if letters and not letters.isalpha():
         return "error: name can only contain letters and spaces"
     if len(name) < 2:
         return "error: name too short"
     return name.strip()
 
-def validate_birthdate(birthdate):
+def validate_birthdate(birthdate, today=None):
     birthdate = birthdate.strip()
     if not birthdate:
         return "error: birthdate can't be empty"
+    match = BIRTHDATE_RE.fullmatch(birthdate)
+    if not match:
+        return "error: invalid date format"
+    day, month, year = match.groups()
     try:
-        birth_date_obj = datetime.strptime(birthdate, "%d/%m/%Y").date()
+        birth_date_obj = date(int(year), int(month), int(day))
     except ValueError:
         return "error: invalid date format"
 
-    today = date.today()
-    if birth_date_obj > today:
+    if birth_date_obj > (today or date.today()):
         return "error: birthday cannot be in the future"
     return birthdate
 
 def validate_phone(phone):
     phone = phone.strip()
-    
+
     if not phone:
         return "error: phone number can't be empty"
-    
+
     if phone.startswith("+"):
         digits = phone[1:]
     else:
@@ -69,21 +95,19 @@ def validate_skill_count(value):
     return stripped_value
 
 def validate_email(email):
-    regex = r'^[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Za-z]{2,}$'
     email = email.strip()
     if not email:
         return "error: email can't be empty"
-    if re.fullmatch(regex, email):
+    if EMAIL_RE.fullmatch(email):
         return email
     else:
         return "error: Invalid Email"
-    
+
 def validate_portfolio(url):
     url = url.strip()
     if not url:
         return ""
-    pattern = r"^https?://.+"
-    if not re.match(pattern, url):
+    if not PORTFOLIO_RE.match(url):
         return "error: portfolio must be a valid URL starting with http:// or https://"
     return url
 
@@ -91,20 +115,9 @@ def validate_portfolio(url):
 def validate_english_level(level):
     level = level.strip()
     if not level:
-      
         return ""
-    cefr = {"A1", "A2", "B1", "B2", "C1", "C2"}
-    words = {
-        "beginner",
-        "elementary",
-        "intermediate",
-        "upper-intermediate",
-        "advanced",
-        "fluent",
-        "native",
-    }
-
-    if level.upper() in cefr or level.lower() in words:
+
+    if level.upper() in CEFR_LEVELS or level.lower() in LEVEL_WORDS:
         return level
 
     return "error: enter a CEFR level (A1-C2) or level like Intermediate/Advanced"
@@ -113,8 +126,55 @@ def validate_english_level(level):
 def validate_optional_text(value):
     value = value.strip()
     if not value:
-        return ""   
+        return ""
     if len(value) < 5:
         return "error: text is too short"
     return value
 
+
+# CV form field -> validator
+VALIDATORS = {
+    "name": validate_name,
+    "surname": validate_name,
+    "birthdate": validate_birthdate,
+    "degree": validate_nonempty,
+    "job_count": validate_job_count,
+    "phone": validate_phone,
+    "email": validate_email,
+    "skill_count": validate_skill_count,
+    "portfolio": validate_portfolio,
+    "english_level": validate_english_level,
+    "job_history": validate_optional_text,
+    "skill_history": validate_optional_text,
+}
+
+
+def is_error(result):
+    return isinstance(result, str) and result.startswith("error")
+
+
+def validate_many(records, fields=None):
+    """
+    Validate a lot of CV records at once.
+    Yields (clean, errors) per record: clean has the validated value of every
+    field that passed, errors the message of every field that didn't.
+    Missing fields and None count as "".
+    """
+    table = [(field, VALIDATORS[field]) for field in (fields or VALIDATORS)]
+    today = date.today()
+    for record in records:
+        clean = {}
+        errors = {}
+        get = record.get
+        for field, validator in table:
+            value = get(field)
+            value = "" if value is None else str(value)
+            if validator is validate_birthdate:
+                result = validate_birthdate(value, today)
+            else:
+                result = validator(value)
+            if result.startswith("error"):
+                errors[field] = result
+            else:
+                clean[field] = result
+        yield clean, errors
@@ -0,0 +1,75 @@
+import logging
+import os
+import random
+import sqlite3
+import time
+
+
+# PRAGMAs applied to every new connection (see db_pool.ConnectionPool._connect).
+# WAL lets readers of /events and /history keep going while a write is in progress,
+# and synchronous=NORMAL is the usual pairing for WAL (still safe after an app crash).
+PRAGMAS = {
+    "journal_mode": os.environ.get("HEREIAM_DB_JOURNAL_MODE", "WAL"),
+    "synchronous": os.environ.get("HEREIAM_DB_SYNCHRONOUS", "NORMAL"),
+    "busy_timeout": int(os.environ.get("HEREIAM_DB_BUSY_TIMEOUT_MS", "5000")),
+    # negative cache_size means KiB instead of pages -> 16MB page cache per connection
+    "cache_size": int(os.environ.get("HEREIAM_DB_CACHE_SIZE", "-16000")),
+    "mmap_size": int(os.environ.get("HEREIAM_DB_MMAP_SIZE", str(128 * 1024 * 1024))),
+    "temp_store": "MEMORY",
+}
+
+# Retry policy for writes that still hit "database is locked" / "database is busy".
+# busy_timeout covers most waits, but SQLite skips the busy handler when a read
+# transaction tries to upgrade to a write, so those have to be retried from the top.
+WRITE_RETRIES = int(os.environ.get("HEREIAM_DB_WRITE_RETRIES", "5"))
+WRITE_BACKOFF = 0.05   # seconds, doubled on every attempt
+WRITE_BACKOFF_MAX = 1.0
+
+log = logging.getLogger(__name__)
+
+
+def configure_connection(conn):
+    """Apply PRAGMAS to a freshly opened connection."""
+    for name, value in PRAGMAS.items():
+        if value is None or value == "":
+            continue
+        conn.execute(f"PRAGMA {name} = {value}")
+    return conn
+
+
+def is_locked_error(error):
+    message = str(error).lower()
+    return isinstance(error, sqlite3.OperationalError) and (
+        "locked" in message or "busy" in message
+    )
+
+
+def backoff_delay(attempt):
+    """Exponential backoff with jitter, so retrying writers don't collide again."""
+    delay = min(WRITE_BACKOFF * (2 ** attempt), WRITE_BACKOFF_MAX)
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+def run_write(conn, work, attempts=None):
+    """
+    Run work(conn) and commit it. If the database is locked the transaction is
+    rolled back and the whole thing is tried again (at most `attempts` times).
+    Returns whatever work() returned.
+    """
+    attempts = attempts or WRITE_RETRIES
+    for attempt in range(attempts):
+        try:
+            result = work(conn)
+            conn.commit()
+            return result
+        except sqlite3.OperationalError as e:
+            conn.rollback()
+            if not is_locked_error(e) or attempt == attempts - 1:
+                raise
+            log.warning("database locked, retrying write", extra={"attempt": attempt + 1, "attempts": attempts})
+            time.sleep(backoff_delay(attempt))
+
+
+def execute_write(conn, sql, params=()):
+    """Single INSERT/UPDATE/DELETE with commit + retry. Returns the cursor."""
+    return run_write(conn, lambda c: c.execute(sql, params))
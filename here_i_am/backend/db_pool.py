@@ -0,0 +1,196 @@
+import os
+import sqlite3
+import threading
+import time
+
+from db_config import configure_connection
+from metrics import TimedConnection
+
+
+# Absolute path to the database, so it doesn't depend on where the server was started from.
+# HEREIAM_DB_PATH lets tests and benchmarks point the app at a scratch database.
+DB_PATH = os.environ.get("HEREIAM_DB_PATH") or os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "db", "database.db"
+)
+
+# Max number of connections open at the same time (per database file)
+POOL_SIZE = int(os.environ.get("HEREIAM_DB_POOL_SIZE", "8"))
+
+# How long a request waits for a free connection before giving up (seconds)
+POOL_TIMEOUT = float(os.environ.get("HEREIAM_DB_POOL_TIMEOUT", "10"))
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+class PooledConnection:
+    """
+    Wraps a sqlite3 connection that belongs to a pool.
+    Works like a normal connection (execute, cursor, commit...) but close()
+    gives the connection back to the pool instead of closing it.
+    """
+
+    def __init__(self, pool, conn):
+        self._pool = pool
+        self._conn = conn
+        self._closed = False
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        self._pool._release(self._conn)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self._conn.commit()
+        else:
+            self._conn.rollback()
+        self.close()
+        return False
+
+
+class ConnectionPool:
+    """
+    Keeps long lived sqlite connections for one database file.
+
+    A thread that asks for a connection while it already holds one gets the
+    same connection back (so create_event -> save_file only uses one).
+    Connections go back to the idle list when the thread is done with them,
+    so the Flask thread-per-request server reuses them across requests.
+    """
+
+    def __init__(self, path, max_size=POOL_SIZE, timeout=POOL_TIMEOUT):
+        self.path = os.path.abspath(path)
+        self.max_size = max_size
+        self.timeout = timeout
+        self._idle = []
+        self._open = 0
+        self._cond = threading.Condition()
+        self._local = threading.local()
+        self._stats = {
+            "checkouts": 0,
+            "reused_in_thread": 0,
+            "created": 0,
+            "waits": 0,
+            "wait_time": 0.0,
+            "timeouts": 0,
+        }
+
+    def _connect(self):
+        # TimedConnection: every statement is timed for /metrics, slow ones are logged
+        conn = sqlite3.connect(self.path, check_same_thread=False, factory=TimedConnection)
+        conn.row_factory = sqlite3.Row
+        configure_connection(conn)
+        return conn
+
+    def connection(self):
+        held = getattr(self._local, "conn", None)
+        if held is not None:
+            self._local.depth += 1
+            with self._cond:
+                self._stats["checkouts"] += 1
+                self._stats["reused_in_thread"] += 1
+            return PooledConnection(self, held)
+
+        conn = self._acquire()
+        self._local.conn = conn
+        self._local.depth = 1
+        return PooledConnection(self, conn)
+
+    def _acquire(self):
+        with self._cond:
+            self._stats["checkouts"] += 1
+            if not self._idle and self._open >= self.max_size:
+                self._stats["waits"] += 1
+                started = time.perf_counter()
+                got_one = self._cond.wait_for(
+                    lambda: self._idle or self._open < self.max_size, self.timeout
+                )
+                self._stats["wait_time"] += time.perf_counter() - started
+                if not got_one:
+                    self._stats["timeouts"] += 1
+                    raise PoolTimeout(
+                        f"no free database connection after {self.timeout}s")
+
+            if self._idle:
+                return self._idle.pop()
+
+            # reserve the slot before connecting so we never go over max_size
+            self._open += 1
+            self._stats["created"] += 1
+
+        try:
+            return self._connect()
+        except Exception:
+            with self._cond:
+                self._open -= 1
+                self._cond.notify()
+            raise
+
+    def _release(self, conn):
+        if getattr(self._local, "conn", None) is not conn:
+            return
+        self._local.depth -= 1
+        if self._local.depth > 0:
+            return
+        self._local.conn = None
+
+        # never hand out a connection with a half finished transaction
+        if conn.in_transaction:
+            conn.rollback()
+
+        with self._cond:
+            self._idle.append(conn)
+            self._cond.notify()
+
+    def close_all(self):
+        """Close the idle connections (used on shutdown and in tests)."""
+        with self._cond:
+            idle, self._idle = self._idle, []
+            self._open -= len(idle)
+            self._cond.notify_all()
+        for conn in idle:
+            conn.close()
+
+    def stats(self):
+        with self._cond:
+            data = dict(self._stats)
+            data["open"] = self._open
+            data["idle"] = len(self._idle)
+            data["in_use"] = self._open - len(self._idle)
+            data["max_size"] = self.max_size
+        return data
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(path=DB_PATH):
+    """Return the pool for a database file (one pool per absolute path)."""
+    key = os.path.abspath(path)
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = ConnectionPool(key)
+            _pools[key] = pool
+        return pool
+
+
+def get_db_connection(path=DB_PATH):
+    return get_pool(path).connection()
+
+
+def pool_stats():
+    """Checkout/wait counters for every pool, keyed by database path."""
+    with _pools_lock:
+        pools = list(_pools.values())
+    return {pool.path: pool.stats() for pool in pools}
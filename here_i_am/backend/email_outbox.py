@@ -0,0 +1,243 @@
+"""
+Outbox for emails.
+
+Routes don't talk to SMTP any more: they add a row to email_outbox in the same
+transaction as their own write (see enqueue) and return. A background worker
+picks up due rows in batches, sends each batch over one SMTP connection and
+retries failures with exponential backoff. After MAX_ATTEMPTS (or an error
+that retrying can't fix, like a refused address) a row is marked 'dead' and
+stays in the table so it can be looked at / requeued.
+
+Statuses: pending -> sending -> sent
+                            \\-> pending (retry later) -> ... -> dead
+"""
+import logging
+import os
+import smtplib
+import threading
+import time
+import uuid
+
+from db_pool import DB_PATH, get_db_connection
+from db_config import execute_write, run_write
+from email_services import SMTPSession
+from metrics import EMAILS
+
+BATCH_SIZE = int(os.environ.get("HEREIAM_OUTBOX_BATCH_SIZE", "20"))
+POLL_INTERVAL = float(os.environ.get("HEREIAM_OUTBOX_POLL_INTERVAL", "5"))
+MAX_ATTEMPTS = int(os.environ.get("HEREIAM_OUTBOX_MAX_ATTEMPTS", "6"))
+BACKOFF = 30          # seconds before the first retry, doubled after every failure
+BACKOFF_MAX = 3600
+# a worker that dies mid batch leaves rows in 'sending'; they're picked up again after this
+CLAIM_TIMEOUT = 300
+
+# errors where sending the same email again won't help
+PERMANENT_ERRORS = (smtplib.SMTPRecipientsRefused, ValueError)
+
+log = logging.getLogger(__name__)
+
+
+def enqueue(conn, message, kind=None, delay=0):
+    """
+    Queue an email built by one of the email_services *_message functions.
+    Runs on the caller's connection and does NOT commit, so the email only
+    exists if the caller's transaction commits.
+    """
+    cur = conn.execute(
+        """
+        INSERT INTO email_outbox (kind, to_email, subject, contents, next_attempt_at)
+        VALUES (?, ?, ?, ?, ?)
+        """,
+        (kind, message["to"], message["subject"], message["contents"], time.time() + delay)
+    )
+    return cur.lastrowid
+
+
+def retry_delay(attempts):
+    return min(BACKOFF * (2 ** (attempts - 1)), BACKOFF_MAX)
+
+
+class OutboxWorker:
+
+    def __init__(self, db_path=DB_PATH, session_factory=SMTPSession, batch_size=BATCH_SIZE,
+                 poll_interval=POLL_INTERVAL, max_attempts=MAX_ATTEMPTS):
+        self.db_path = db_path
+        self.session_factory = session_factory
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.stats = {"sent": 0, "failed": 0, "dead": 0, "batches": 0}
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def claim(self, now):
+        """Mark up to batch_size due emails as ours and return them."""
+        token = uuid.uuid4().hex
+        conn = get_db_connection(self.db_path)
+        try:
+            execute_write(
+                conn,
+                """
+                UPDATE email_outbox
+                SET status = 'sending', claim_token = ?, locked_until = ?
+                WHERE id IN (
+                    SELECT id FROM email_outbox
+                    WHERE (status = 'pending' AND next_attempt_at <= ?)
+                       OR (status = 'sending' AND locked_until < ?)
+                    ORDER BY next_attempt_at
+                    LIMIT ?
+                )
+                """,
+                (token, now + CLAIM_TIMEOUT, now, now, self.batch_size)
+            )
+            return conn.execute(
+                "SELECT * FROM email_outbox WHERE claim_token = ? AND status = 'sending' ORDER BY id",
+                (token,)
+            ).fetchall()
+        finally:
+            conn.close()
+
+    def run_once(self, now=None):
+        """Send one batch. Returns how many emails were claimed."""
+        now = time.time() if now is None else now
+        rows = self.claim(now)
+        if not rows:
+            return 0
+
+        results = {}
+        try:
+            with self.session_factory() as session:
+                for row in rows:
+                    try:
+                        session.send(row["to_email"], row["subject"], row["contents"])
+                        results[row["id"]] = None
+                    except Exception as e:
+                        results[row["id"]] = e
+        except Exception as e:
+            # couldn't connect / login: the whole batch failed
+            for row in rows:
+                results.setdefault(row["id"], e)
+
+        self._finish(rows, results, now)
+        self.stats["batches"] += 1
+        return len(rows)
+
+    def _finish(self, rows, results, now):
+        counts = {}
+
+        def update(conn):
+            counts.clear()
+            for row in rows:
+                error = results.get(row["id"])
+                if error is None:
+                    conn.execute(
+                        "UPDATE email_outbox SET status = 'sent', sent_at = CURRENT_TIMESTAMP, "
+                        "attempts = attempts + 1, claim_token = NULL, last_error = NULL WHERE id = ?",
+                        (row["id"],)
+                    )
+                    counts["sent"] = counts.get("sent", 0) + 1
+                    continue
+
+                attempts = row["attempts"] + 1
+                if attempts >= self.max_attempts or isinstance(error, PERMANENT_ERRORS):
+                    status, next_attempt = "dead", row["next_attempt_at"]
+                    counts["dead"] = counts.get("dead", 0) + 1
+                    log.error("email moved to dead letters: %r", error, extra={"email_id": row["id"], "attempts": attempts})
+                else:
+                    status, next_attempt = "pending", now + retry_delay(attempts)
+                    counts["failed"] = counts.get("failed", 0) + 1
+                    log.warning("email failed, retrying later: %r", error, extra={"email_id": row["id"], "attempts": attempts})
+                conn.execute(
+                    "UPDATE email_outbox SET status = ?, attempts = ?, next_attempt_at = ?, "
+                    "claim_token = NULL, last_error = ? WHERE id = ?",
+                    (status, attempts, next_attempt, repr(error), row["id"])
+                )
+
+        conn = get_db_connection(self.db_path)
+        try:
+            run_write(conn, update)
+        finally:
+            conn.close()
+        for key, value in counts.items():
+            self.stats[key] += value
+            EMAILS.inc(value, via="outbox", result=key)
+
+    def seconds_until_next(self, now=None):
+        now = time.time() if now is None else now
+        conn = get_db_connection(self.db_path)
+        try:
+            row = conn.execute(
+                "SELECT MIN(next_attempt_at) FROM email_outbox WHERE status = 'pending'"
+            ).fetchone()
+        finally:
+            conn.close()
+        if row[0] is None:
+            return self.poll_interval
+        return max(0.0, min(row[0] - now, self.poll_interval))
+
+    def run_forever(self):
+        while not self._stop.is_set():
+            self._wake.clear()
+            try:
+                claimed = self.run_once()
+                if claimed == self.batch_size:
+                    continue  # probably more waiting, don't sleep
+                wait = self.seconds_until_next()
+            except Exception:
+                log.exception("outbox worker error")
+                wait = self.poll_interval
+            self._wake.wait(wait)
+
+    def wake(self):
+        self._wake.set()
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self.run_forever, name="email-outbox", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self, timeout=10):
+        """Let the current batch finish, then stop the thread."""
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+
+_worker = None
+
+
+def start_worker(db_path=DB_PATH, **kwargs):
+    global _worker
+    if _worker is None:
+        _worker = OutboxWorker(db_path, **kwargs)
+    return _worker.start()
+
+
+def stop_worker(timeout=10):
+    global _worker
+    if _worker is not None:
+        _worker.stop(timeout)
+        _worker = None
+
+
+def wake():
+    """Tell the worker there's new mail (call after the commit)."""
+    if _worker is not None:
+        _worker.wake()
+
+
+def requeue_dead(conn):
+    """Give every dead email another round of attempts."""
+    cur = execute_write(
+        conn,
+        "UPDATE email_outbox SET status = 'pending', attempts = 0, next_attempt_at = ? "
+        "WHERE status = 'dead'",
+        (time.time(),)
+    )
+    wake()
+    return cur.rowcount
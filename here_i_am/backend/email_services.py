@@ -1,55 +1,131 @@
+import logging
+import os
 import yagmail
 import random
 import string
 
-yag = yagmail.SMTP("hereiamteam3@gmail.com", "egpt fuvt jyhm jmag")
+from metrics import EMAILS
 
+SENDER = "hereiamteam3@gmail.com"
 
-def forgot_password(to_email):
+# HEREIAM_SMTP_HOST/PORT point the app at a plain local SMTP server instead of
+# Gmail (tests, benchmarks, dev relays). No TLS and no login in that case.
+SMTP_HOST = os.environ.get("HEREIAM_SMTP_HOST")
+SMTP_PORT = int(os.environ.get("HEREIAM_SMTP_PORT", "25"))
+
+
+def make_smtp_client():
+    if SMTP_HOST:
+        return yagmail.SMTP(SENDER, host=SMTP_HOST, port=SMTP_PORT, smtp_ssl=False,
+                            smtp_starttls=False, smtp_skip_login=True)
+    return yagmail.SMTP(SENDER, "egpt fuvt jyhm jmag")
+
+
+yag = make_smtp_client()
+
+log = logging.getLogger(__name__)
+
+
+# The *_message functions only build the email (to / subject / contents), so the
+# same text can be sent right away or put in the outbox (email_outbox.py).
+
+def generate_password():
     #generate 10 character random password
     characters = string.ascii_letters + string.digits
-    new_password = ''.join(random.choice(characters) for _ in range(10))
+    return ''.join(random.choice(characters) for _ in range(10))
 
-    yag.send(
-        to=to_email,
-        subject="Here I Am: Forgot Password",
-        contents=("You have requested to reset your password.\n"
-                  "Your password has been automatically changed to: \n"
-                  +new_password+"\n"
-                  "You can change this password in the profile section after you sign in again."
-                  )
-    )
-    print("Email Sent!")
+
+def forgot_password_message(to_email, new_password):
+    return {
+        "to": to_email,
+        "subject": "Here I Am: Forgot Password",
+        "contents": ("You have requested to reset your password.\n"
+                     "Your password has been automatically changed to: \n"
+                     +new_password+"\n"
+                     "You can change this password in the profile section after you sign in again."
+                     ),
+    }
+
+
+def sign_up_message(to_email):
+    return {
+        "to": to_email,
+        "subject": "Here I Am: Sign Up",
+        "contents": ("You have successfully signed up to Here I Am!\n"
+                     "Welcome aboard!"),
+    }
+
+
+def event_creation_message(email, title, description, start_time_utc, importance):
+    return {
+        "to": email,
+        "subject": "Here I Am: Event " + title + "created successfully!",
+        "contents": ("Your event named " + title + " has been created successfully!\n"
+                     "Start time: " + start_time_utc + "\n"
+                     f"Importance level: " + importance + "\n"
+                     "Description: " +description),
+    }
+
+
+def event_reminder_message(email, title, description, start_time_utc, importance):
+    return {
+        "to": email,
+        "subject": "Here I Am: Event " + title + " is about to start!",
+        "contents": ("Your event named " + title + " starts in 30 minutes!\n"
+                     "Start time: " + start_time_utc + "\n"
+                     "Importance level: " + importance + "\n"
+                     "Description: " +description),
+    }
+
+
+def sent_directly(kind):
+    """Count an email sent with yag.send() (not through the outbox)."""
+    EMAILS.inc(via="direct", result="sent")
+    log.info("email sent", extra={"kind": kind})
+
+
+def forgot_password(to_email):
+    new_password = generate_password()
+    yag.send(**forgot_password_message(to_email, new_password))
+    sent_directly("forgot_password")
     return new_password
 
 def sign_up(to_email):
-    yag.send(
-        to=to_email,
-        subject="Here I Am: Sign Up",
-        contents=("You have successfully signed up to Here I Am!\n"
-                  "Welcome aboard!")
-    )
-    print("Email Sent!")
+    yag.send(**sign_up_message(to_email))
+    sent_directly("sign_up")
 
 def event_creation(email, title, description, start_time_utc, importance):
-    yag.send(
-        to=email,
-        subject="Here I Am: Event " + title + "created successfully!" ,
-        contents=("Your event named " + title + " has been created successfully!\n"
-                  "Start time: " + start_time_utc + "\n" 
-                  f"Importance level: " + importance + "\n" 
-                  "Description: " +description)
-    )
+    yag.send(**event_creation_message(email, title, description, start_time_utc, importance))
+    sent_directly("event_creation")
 
 def event_reminder(email, title, description, start_time_utc, importance):
-    yag.send(
-        to=email,
-        subject="Here I Am: Event " + title + " is about to start!" ,
-        contents=("Your event named " + title + " starts in 30 minutes!\n"
-                  "Start time: " + start_time_utc + "\n" 
-                  "Importance level: " + importance + "\n" 
-                  "Description: " +description)
-    )
+    yag.send(**event_reminder_message(email, title, description, start_time_utc, importance))
+    sent_directly("event_reminder")
+
+
+class SMTPSession:
+    """
+    One SMTP connection used for a whole batch of emails.
+    (yag.send() reconnects and logs in again for every single email.)
+    """
+
+    def __init__(self, client=None):
+        self.client = client or make_smtp_client()
+
+    def __enter__(self):
+        self.client.login()
+        return self
+
+    def send(self, to, subject, contents):
+        recipients, msg_string = self.client.prepare_send(to=to, subject=subject, contents=contents)
+        refused = self.client.smtp.sendmail(self.client.user, recipients, msg_string)
+        self.client.num_mail_sent += 1
+        return refused
+
+    def __exit__(self, exc_type, exc, tb):
+        self.client.close()
+        return False
+
 
 def test_connection():
     yag.send(
@@ -57,4 +133,4 @@ def test_connection():
         subject="Here I Am: Test from Yagmail",
         contents="If you see this, Yagmail works!"
     )
-    print("Email Sent!")
\ No newline at end of file
+    sent_directly("test")
@@ -0,0 +1,152 @@
+"""
+Downscaled copies of uploaded pictures.
+
+Pictures are only ever shown small (an 80pt circle on the CV, a 130px circle
+on the profile page), but uploads are often phone photos or wallpapers. When
+a picture is uploaded we write re-encoded variants whose shorter side is one
+of the sizes below, and readers ask best_variant() for the smallest one that
+is still big enough. The original is kept and used when no variant fits (or
+the picture couldn't be decoded).
+
+Variants live in VARIANT_DIR/<hash of the source path>/<size>.<jpg|png>, so
+pictures with the same name in uploads/ and Pictures/ don't collide.
+A variant older than its source (picture replaced under the same name) is
+ignored until it is regenerated.
+
+Pictures uploaded before this existed get their variants with:
+
+    python image_variants.py
+"""
+import hashlib
+import logging
+import os
+import tempfile
+
+from PIL import Image, ImageOps
+
+VARIANT_DIR = os.environ.get("HEREIAM_VARIANT_DIR") or os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "image_cache"
+)
+
+# shorter side in pixels
+CV_SIZES = (160,)          # 80pt avatar circle at 2x
+PROFILE_SIZES = (64, 256)  # navbar icon, 130px profile circle on hi-dpi screens
+JPEG_QUALITY = 85
+
+log = logging.getLogger(__name__)
+
+
+def variant_dir(source):
+    key = hashlib.sha1(os.path.abspath(source).encode("utf-8")).hexdigest()[:16]
+    return os.path.join(VARIANT_DIR, key)
+
+
+def _has_alpha(img):
+    return img.mode in ("RGBA", "LA") or (img.mode == "P" and "transparency" in img.info)
+
+
+def _save(img, path, fmt):
+    # write next to the final path and rename, readers never see half a file
+    directory = os.path.dirname(path)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            if fmt == "PNG":
+                img.save(f, "PNG", optimize=True)
+            else:
+                img.save(f, "JPEG", quality=JPEG_QUALITY, optimize=True)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+
+def make_variants(source, sizes):
+    """
+    Write the variants of `source` for each size (shorter side, never upscaled).
+    Returns {size: path}. Sizes the picture is already smaller than are skipped,
+    the original is the best there is for those.
+    """
+    directory = variant_dir(source)
+    os.makedirs(directory, exist_ok=True)
+    for name in os.listdir(directory):
+        # whatever was made for the previous picture with this name
+        os.remove(os.path.join(directory, name))
+
+    made = {}
+    with Image.open(source) as img:
+        # JPEG decoders can skip straight to a reduced scale
+        img.draft("RGB", (max(sizes) * 2, max(sizes) * 2))
+        img = ImageOps.exif_transpose(img)
+        alpha = _has_alpha(img)
+        img = img.convert("RGBA" if alpha else "RGB")
+        fmt, ext = ("PNG", "png") if alpha else ("JPEG", "jpg")
+
+        # biggest first, each smaller one is scaled from the previous
+        for size in sorted(sizes, reverse=True):
+            shorter = min(img.size)
+            if shorter <= size:
+                continue
+            scale = size / shorter
+            img = img.resize(
+                (max(1, round(img.width * scale)), max(1, round(img.height * scale))),
+                Image.LANCZOS,
+            )
+            path = os.path.join(directory, f"{size}.{ext}")
+            _save(img, path, fmt)
+            made[size] = path
+    return made
+
+
+def remove_variants(source):
+    directory = variant_dir(source)
+    if os.path.isdir(directory):
+        for name in os.listdir(directory):
+            os.remove(os.path.join(directory, name))
+        os.rmdir(directory)
+
+
+def make_variants_quietly(source, sizes):
+    """make_variants for upload handlers: a picture PIL can't read still uploads."""
+    try:
+        return make_variants(source, sizes)
+    except Exception as e:
+        log.warning("could not make picture variants: %r", e, extra={"source": source})
+        return {}
+
+
+def variants(source):
+    """{size: path} of the up-to-date variants of `source`."""
+    directory = variant_dir(source)
+    try:
+        source_mtime = os.stat(source).st_mtime_ns
+        entries = list(os.scandir(directory))
+    except OSError:
+        return {}
+
+    found = {}
+    for entry in entries:
+        size, _, ext = entry.name.partition(".")
+        if not size.isdigit() or ext not in ("jpg", "png"):
+            continue
+        if entry.stat().st_mtime_ns >= source_mtime:
+            found[int(size)] = entry.path
+    return found
+
+
+def best_variant(source, min_size):
+    """Smallest variant with a shorter side of at least `min_size`, else the original."""
+    found = variants(source)
+    fitting = [size for size in found if size >= min_size]
+    return found[min(fitting)] if fitting else source
+
+
+if __name__ == "__main__":
+    here = os.path.dirname(os.path.abspath(__file__))
+    folders = {os.path.join(here, "Pictures"): PROFILE_SIZES, os.path.join(here, "uploads"): CV_SIZES}
+    for folder, sizes in folders.items():
+        if not os.path.isdir(folder):
+            continue
+        for name in sorted(os.listdir(folder)):
+            made = make_variants_quietly(os.path.join(folder, name), sizes)
+            print(f"{name}: {sorted(made) or 'already small'}")
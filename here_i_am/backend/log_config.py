@@ -0,0 +1,67 @@
+"""
+Logging setup for the backend (replaces the print() calls the modules used to have).
+
+Modules log through logging.getLogger(__name__) (app.py through app.logger) and
+pass details as `extra={...}` instead of formatting them into the message, so
+they come out as separate fields:
+
+    HEREIAM_LOG_FORMAT=text  2025-01-01 10:00:00,123 WARNING db_pool: slow query duration_ms=412.3 sql='SELECT ...'
+    HEREIAM_LOG_FORMAT=json  {"time": "...", "level": "WARNING", "logger": "db_pool", "message": "slow query", "duration_ms": 412.3, ...}
+"""
+import json
+import logging
+import os
+
+LOG_LEVEL = os.environ.get("HEREIAM_LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.environ.get("HEREIAM_LOG_FORMAT", "text")
+
+# everything a LogRecord has by itself, the rest came in through extra=
+_RECORD_FIELDS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "taskName"}
+
+
+def record_fields(record):
+    """The extra={...} fields of a log record."""
+    return {k: v for k, v in vars(record).items() if k not in _RECORD_FIELDS and not k.startswith("_")}
+
+
+class StructuredFormatter(logging.Formatter):
+    """One line per record, the extra fields as key=value (text) or as keys of a JSON object (json)."""
+
+    def __init__(self, as_json=False):
+        super().__init__("%(asctime)s %(levelname)s %(name)s: %(message)s")
+        self.as_json = as_json
+
+    def format(self, record):
+        fields = record_fields(record)
+        if not self.as_json:
+            line = super().format(record)
+            extras = " ".join(f"{k}={v!r}" for k, v in fields.items())
+            if not extras:
+                return line
+            # keep the traceback (if any) below the fields
+            first, newline, rest = line.partition("\n")
+            return f"{first} {extras}{newline}{rest}"
+
+        data = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        data.update(fields)
+        if record.exc_info:
+            data["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(data, default=str)
+
+
+def configure_logging(level=None, fmt=None):
+    """Install the handler on the root logger (once; calling again only changes level/format)."""
+    root = logging.getLogger()
+    handler = next((h for h in root.handlers if getattr(h, "_hereiam", False)), None)
+    if handler is None:
+        handler = logging.StreamHandler()
+        handler._hereiam = True
+        root.addHandler(handler)
+    handler.setFormatter(StructuredFormatter(as_json=(fmt or LOG_FORMAT) == "json"))
+    root.setLevel(level or LOG_LEVEL)
+    return handler
@@ -0,0 +1,322 @@
+"""
+Counters and latency histograms for the app, served at GET /metrics in the
+Prometheus text format.
+
+  * every request: hereiam_http_request_duration_seconds{route, method, status},
+    timed from before_request to after_request (a streamed body, like the
+    ndjson history or the CV zip, only counts until its first byte)
+  * every sqlite statement on a pooled connection (TimedConnection):
+    hereiam_db_query_duration_seconds{statement}. Statements slower than
+    HEREIAM_SLOW_QUERY_MS are logged with their SQL (never the parameters) and
+    counted in hereiam_db_slow_queries_total. For a SELECT this is the time
+    to the first row, fetching the rest happens after execute() returns.
+  * hereiam_emails_total{via, result} and hereiam_cv_renders_total{mode},
+    counted where the emails are sent and the PDFs drawn
+  * the stats dicts the caches and pools already keep (pool_stats(),
+    cache_stats(), ...) as gauges, see add_stats()
+
+Numbers are per process. Under serve.py the workers share one socket, so
+GET /metrics there is answered by whichever worker accepts the connection
+and is only a sample. Each worker also serves its own numbers on a port of
+its own (start_metrics_server(), HEREIAM_METRICS_PORT + worker index); scrape
+every one of those as its own target and sum() / rate() across them.
+"""
+import bisect
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from flask import Response, g, request
+
+log = logging.getLogger(__name__)
+
+SLOW_QUERY_SECONDS = float(os.environ.get("HEREIAM_SLOW_QUERY_MS", "100")) / 1000
+SLOW_REQUEST_SECONDS = float(os.environ.get("HEREIAM_SLOW_REQUEST_MS", "1000")) / 1000
+
+# seconds; requests are mostly a few ms, CV renders and logins (scrypt) take longer
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra=()):
+    pairs = [*zip(names, values), *extra]
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _number(value):
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class Registry:
+    """The metrics (and stats functions) GET /metrics shows."""
+
+    def __init__(self):
+        self._metrics = []
+        self._stats = []
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    def add_stats(self, prefix, stats, label=None, help=""):
+        """
+        Export the numbers of a stats function as gauges named prefix_<key>.
+        With `label`, stats() returns {label value: {key: number}} (like db_pool.pool_stats()).
+        """
+        with self._lock:
+            self._stats.append((prefix, stats, label, help))
+
+    def render(self):
+        with self._lock:
+            metrics = list(self._metrics)
+            stats = list(self._stats)
+        lines = []
+        for metric in metrics:
+            metric.render(lines)
+        for prefix, func, label, help in stats:
+            try:
+                data = func()
+            except Exception:
+                log.exception("stats for /metrics failed", extra={"prefix": prefix})
+                continue
+            groups = data.items() if label else [(None, data)]
+            gauges = {}
+            for value_of_label, numbers in groups:
+                extra = [(label, value_of_label)] if label else []
+                for key, value in numbers.items():
+                    if isinstance(value, (int, float)):
+                        gauges.setdefault(key, []).append((extra, value))
+            for key, samples in gauges.items():
+                name = f"{prefix}_{re.sub(r'[^a-zA-Z0-9_]', '_', key)}"
+                lines.append(f"# HELP {name} {help or prefix} ({key})")
+                lines.append(f"# TYPE {name} gauge")
+                for extra, value in samples:
+                    lines.append(f"{name}{_labels((), (), extra)} {_number(value)}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+class Counter:
+    def __init__(self, name, help, labels=(), registry=REGISTRY):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+        if registry is not None:
+            registry.register(self)
+
+    def inc(self, amount=1, **labels):
+        key = tuple(str(labels[name]) for name in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        key = tuple(str(labels[name]) for name in self.labels)
+        with self._lock:
+            return self._values.get(key, 0)
+
+    def render(self, lines):
+        lines.append(f"# HELP {self.name} {self.help}")
+        lines.append(f"# TYPE {self.name} counter")
+        with self._lock:
+            values = sorted(self._values.items())
+        for key, value in values:
+            lines.append(f"{self.name}{_labels(self.labels, key)} {_number(value)}")
+
+
+class Histogram:
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS, registry=REGISTRY):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        # labels -> [count per bucket (+Inf last), sum]; counts are made cumulative in render()
+        self._series = {}
+        self._lock = threading.Lock()
+        if registry is not None:
+            registry.register(self)
+
+    def observe(self, seconds, **labels):
+        key = tuple(str(labels[name]) for name in self.labels)
+        index = bisect.bisect_left(self.buckets, seconds)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += seconds
+
+    def count(self, **labels):
+        key = tuple(str(labels[name]) for name in self.labels)
+        with self._lock:
+            series = self._series.get(key)
+            return sum(series[0]) if series else 0
+
+    def render(self, lines):
+        lines.append(f"# HELP {self.name} {self.help}")
+        lines.append(f"# TYPE {self.name} histogram")
+        with self._lock:
+            series = sorted((key, list(counts), total) for key, (counts, total) in self._series.items())
+        for key, counts, total in series:
+            running = 0
+            for bound, count in zip((*self.buckets, float("inf")), counts):
+                running += count
+                le = [("le", _number(float(bound)))]
+                lines.append(f"{self.name}_bucket{_labels(self.labels, key, le)} {running}")
+            lines.append(f"{self.name}_sum{_labels(self.labels, key)} {_number(total)}")
+            lines.append(f"{self.name}_count{_labels(self.labels, key)} {running}")
+
+
+REQUEST_LATENCY = Histogram(
+    "hereiam_http_request_duration_seconds", "Time to build the response, by route",
+    labels=("route", "method", "status"))
+QUERY_LATENCY = Histogram(
+    "hereiam_db_query_duration_seconds", "sqlite execute() time, by statement type",
+    labels=("statement",), buckets=QUERY_BUCKETS)
+SLOW_QUERIES = Counter(
+    "hereiam_db_slow_queries_total", "Statements slower than HEREIAM_SLOW_QUERY_MS",
+    labels=("statement",))
+EMAILS = Counter(
+    "hereiam_emails_total", "Emails handed to SMTP (outbox worker or sent directly)",
+    labels=("via", "result"))
+CV_RENDERS = Counter(
+    "hereiam_cv_renders_total", "CV PDFs drawn (cache hits not included)",
+    labels=("mode",))
+CV_RENDER_LATENCY = Histogram(
+    "hereiam_cv_render_duration_seconds", "render_cv time for /generate-cv")
+
+# the last few slow statements, for a quick look without grepping the logs
+RECENT_SLOW_QUERIES = deque(maxlen=20)
+
+
+def statement_type(sql):
+    head = sql.lstrip().split(None, 1)
+    return head[0].upper() if head else ""
+
+
+def record_query(sql, seconds):
+    statement = statement_type(sql)
+    QUERY_LATENCY.observe(seconds, statement=statement)
+    if seconds >= SLOW_QUERY_SECONDS:
+        SLOW_QUERIES.inc(statement=statement)
+        sql = " ".join(sql.split())
+        RECENT_SLOW_QUERIES.append((time.time(), round(seconds * 1000, 1), sql))
+        log.warning("slow query", extra={"duration_ms": round(seconds * 1000, 1), "sql": sql[:500]})
+
+
+class TimedCursor(sqlite3.Cursor):
+    def execute(self, sql, parameters=()):
+        started = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            record_query(sql, time.perf_counter() - started)
+
+    def executemany(self, sql, seq_of_parameters):
+        started = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            record_query(sql, time.perf_counter() - started)
+
+    def executescript(self, sql_script):
+        started = time.perf_counter()
+        try:
+            return super().executescript(sql_script)
+        finally:
+            record_query(sql_script, time.perf_counter() - started)
+
+
+class TimedConnection(sqlite3.Connection):
+    """sqlite3.connect(..., factory=TimedConnection): every statement goes through TimedCursor."""
+
+    def cursor(self, factory=TimedCursor):
+        return super().cursor(factory)
+
+    # Connection.execute() would run the statement in C, past TimedCursor
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def executescript(self, sql_script):
+        return self.cursor().executescript(sql_script)
+
+
+def _start_timer():
+    g.request_started = time.perf_counter()
+
+
+def _record_request(response):
+    started = g.pop("request_started", None)
+    if started is None:
+        return response
+    seconds = time.perf_counter() - started
+    # the rule ("/events/<int:event_id>"), not the path, or every id gets its own series
+    route = request.url_rule.rule if request.url_rule is not None else "unmatched"
+    REQUEST_LATENCY.observe(seconds, route=route, method=request.method, status=response.status_code)
+    if seconds >= SLOW_REQUEST_SECONDS:
+        log.warning("slow request", extra={
+            "route": route, "method": request.method,
+            "status": response.status_code, "duration_ms": round(seconds * 1000, 1),
+        })
+    return response
+
+
+def metrics_view():
+    return Response(REGISTRY.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+def init_app(app):
+    """Time every request and add GET /metrics. Call before the other before_request hooks."""
+    app.before_request(_start_timer)
+    app.after_request(_record_request)
+    app.add_url_rule("/metrics", "metrics", metrics_view, methods=["GET"])
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?", 1)[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = REGISTRY.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_metrics_server(host, port):
+    """
+    GET /metrics of this process on its own port, in a background thread
+    (for serve.py workers). Returns the server, shutdown() stops it.
+    """
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    return server
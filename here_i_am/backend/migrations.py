@@ -0,0 +1,294 @@
+"""
+Versioned schema changes for db/database.db.
+
+The version the database is at is kept in PRAGMA user_version, every entry in
+MIGRATIONS above it gets applied in order. The app runs this on startup, or by hand:
+
+    python migrations.py              # apply pending schema migrations
+    python migrations.py move-blobs   # move old uploads.filedata BLOBs to the blob store
+    python migrations.py gc-blobs     # delete stored files no upload row points to
+
+gc-blobs can run while the server is up: an upload stores its blob before its
+uploads row is committed, so blobs stored in the last BLOB_GC_GRACE seconds
+are never deleted.
+"""
+import argparse
+import logging
+import os
+import sqlite3
+import time
+
+from db_pool import DB_PATH
+from log_config import configure_logging
+
+log = logging.getLogger(__name__)
+
+# gc-blobs keeps blobs stored more recently than this (an upload in progress)
+BLOB_GC_GRACE = int(os.environ.get("HEREIAM_BLOB_GC_GRACE", "3600"))
+
+
+MIGRATIONS = [
+    (1, "base tables", [
+        """
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            surname TEXT NOT NULL,
+            username TEXT UNIQUE NOT NULL,
+            email TEXT UNIQUE NOT NULL,
+            password TEXT NOT NULL,
+            profile_picture TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS events (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER,
+            event_id INTEGER,
+            title TEXT NOT NULL,
+            description VARCHAR(256) NOT NULL,
+            start_time_utc DATETIME,
+            end_time_utc DATETIME,
+            importance INTEGER,
+            FOREIGN KEY(user_id) REFERENCES users(id)
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS uploads (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            filename TEXT,
+            filedata BLOB,
+            user_id INTEGER,
+            event_id INTEGER,
+            FOREIGN KEY(event_id) REFERENCES events(id),
+            FOREIGN KEY(user_id) REFERENCES users(id)
+        )
+        """,
+    ]),
+    # file bytes live in the blob store now, uploads only keeps metadata + hash
+    (2, "uploads metadata for the blob store", [
+        "ALTER TABLE uploads ADD COLUMN sha256 TEXT",
+        "ALTER TABLE uploads ADD COLUMN size INTEGER",
+        "ALTER TABLE uploads ADD COLUMN content_type TEXT",
+    ]),
+    # emails are sent by a background worker (email_outbox.py), not inside requests
+    (3, "email outbox", [
+        """
+        CREATE TABLE IF NOT EXISTS email_outbox (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            kind TEXT,
+            to_email TEXT NOT NULL,
+            subject TEXT NOT NULL,
+            contents TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'pending',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            next_attempt_at REAL NOT NULL,
+            locked_until REAL,
+            claim_token TEXT,
+            last_error TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            sent_at TIMESTAMP
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_email_outbox_due ON email_outbox (status, next_attempt_at)",
+    ]),
+    # pending "starts in 30 minutes" emails, fired by reminder_scheduler.py
+    (4, "event reminders", [
+        "ALTER TABLE events ADD COLUMN scheduled_to_send DATETIME",
+        """
+        CREATE TABLE IF NOT EXISTS event_reminders (
+            event_id INTEGER PRIMARY KEY,
+            user_id INTEGER,
+            due_at REAL NOT NULL,
+            FOREIGN KEY(event_id) REFERENCES events(id)
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_event_reminders_due ON event_reminders (due_at, event_id)",
+        # reminders for events that haven't started yet
+        """
+        INSERT OR IGNORE INTO event_reminders (event_id, user_id, due_at)
+        SELECT id, user_id, MAX(CAST(strftime('%s', start_time_utc) AS REAL) - 1800,
+                                CAST(strftime('%s', 'now') AS REAL))
+        FROM events
+        WHERE CAST(strftime('%s', start_time_utc) AS INTEGER) > CAST(strftime('%s', 'now') AS INTEGER)
+        """,
+        """
+        UPDATE events
+        SET scheduled_to_send = (
+            SELECT strftime('%Y-%m-%dT%H:%M:%S', r.due_at, 'unixepoch')
+            FROM event_reminders r WHERE r.event_id = events.id
+        )
+        WHERE id IN (SELECT event_id FROM event_reminders)
+        """,
+    ]),
+    # /events and /history filter events by user (and start time), has_file looks
+    # uploads up by event. users.username / users.email are UNIQUE, so SQLite already
+    # has indexes for the login and register lookups.
+    # test_cases/markos/test_case_query_plans.py checks the queries keep using these.
+    (5, "indexes for event and upload lookups", [
+        "CREATE INDEX IF NOT EXISTS idx_events_user_start ON events (user_id, start_time_utc)",
+        "CREATE INDEX IF NOT EXISTS idx_uploads_event ON uploads (event_id)",
+    ]),
+    # bumped on every write to a user's events / uploads; response_cache.py builds
+    # its ETags from it, so every worker process agrees on what is current
+    (6, "per-user data versions", [
+        """
+        CREATE TABLE IF NOT EXISTS user_versions (
+            user_id INTEGER PRIMARY KEY,
+            version INTEGER NOT NULL DEFAULT 0
+        )
+        """,
+    ]),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def schema_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+# tables the routes and background workers can't run without
+REQUIRED_TABLES = ("users", "events", "uploads", "email_outbox", "event_reminders", "user_versions")
+
+
+def check_schema(path=DB_PATH):
+    """What's wrong with the database at `path` for this version of the code ([] if nothing)."""
+    conn = sqlite3.connect(path)
+    try:
+        version = schema_version(conn)
+        tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    finally:
+        conn.close()
+
+    problems = []
+    if version < LATEST_VERSION:
+        problems.append(f"database is at schema version {version}, the code needs {LATEST_VERSION}")
+    elif version > LATEST_VERSION:
+        problems.append(f"database is at schema version {version}, newer than this code ({LATEST_VERSION})")
+    problems += [f"table {name} is missing" for name in REQUIRED_TABLES if name not in tables]
+    return problems
+
+
+def migrate(path=DB_PATH):
+    """Apply every migration newer than the database. Returns the versions applied."""
+    conn = sqlite3.connect(path, isolation_level=None)
+    applied = []
+    try:
+        for version, name, statements in MIGRATIONS:
+            # BEGIN IMMEDIATE so two workers starting at once don't both migrate
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                if schema_version(conn) >= version:
+                    conn.execute("COMMIT")
+                    continue
+                for statement in statements:
+                    if callable(statement):
+                        statement(conn)
+                    else:
+                        conn.execute(statement)
+                conn.execute(f"PRAGMA user_version = {version}")
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+            log.info("applied migration %s: %s", version, name)
+            applied.append(version)
+    finally:
+        conn.close()
+    return applied
+
+
+def move_blobs(path=DB_PATH, store=None, batch_size=50, vacuum=False):
+    """
+    Copy uploads.filedata into the blob store and clear the column, a batch at
+    a time. Each BLOB is read with incremental I/O so big files aren't loaded
+    whole. Safe to run again if it was interrupted.
+    """
+    from blob_store import get_blob_store
+
+    store = store or get_blob_store()
+    conn = sqlite3.connect(path)
+    moved = 0
+    try:
+        while True:
+            rows = conn.execute(
+                "SELECT id FROM uploads WHERE filedata IS NOT NULL ORDER BY id LIMIT ?",
+                (batch_size,)
+            ).fetchall()
+            if not rows:
+                break
+
+            for (upload_id,) in rows:
+                with conn.blobopen("uploads", "filedata", upload_id, readonly=True) as blob:
+                    sha256, size = store.put(blob)
+                conn.execute(
+                    "UPDATE uploads SET sha256 = ?, size = ?, filedata = NULL WHERE id = ?",
+                    (sha256, size, upload_id)
+                )
+            conn.commit()
+            moved += len(rows)
+            log.info("moved %s upload(s) to the blob store", moved)
+
+        if vacuum and moved:
+            # give the freed pages back to the file system
+            conn.execute("VACUUM")
+    finally:
+        conn.close()
+    return moved
+
+
+def gc_blobs(path=DB_PATH, store=None, grace=BLOB_GC_GRACE, now=None):
+    """
+    Delete blobs that no row in uploads refers to any more and that were
+    stored more than `grace` seconds ago.
+    """
+    from blob_store import BlobNotFound, get_blob_store
+
+    store = store or get_blob_store()
+    # listed before the rows are read: a blob stored after this is not a candidate,
+    # and one whose row commits before the SELECT below is kept
+    candidates = list(store.hashes())
+    conn = sqlite3.connect(path)
+    try:
+        used = {row[0] for row in conn.execute(
+            "SELECT DISTINCT sha256 FROM uploads WHERE sha256 IS NOT NULL")}
+    finally:
+        conn.close()
+
+    cutoff = (time.time() if now is None else now) - grace
+    removed = 0
+    for sha256 in candidates:
+        if sha256 in used:
+            continue
+        try:
+            # checked right before deleting, put() of the same content refreshes it
+            if store.stored_at(sha256) > cutoff:
+                continue
+        except BlobNotFound:
+            continue
+        store.delete(sha256)
+        removed += 1
+    log.info("removed %s unused blob(s)", removed)
+    return removed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Database migrations for Here I Am")
+    parser.add_argument("command", nargs="?", default="migrate",
+                        choices=["migrate", "move-blobs", "gc-blobs"])
+    parser.add_argument("--db", default=DB_PATH)
+    parser.add_argument("--vacuum", action="store_true",
+                        help="VACUUM after move-blobs to shrink database.db")
+    parser.add_argument("--grace", type=int, default=BLOB_GC_GRACE,
+                        help="gc-blobs keeps blobs stored less than this many seconds ago")
+    args = parser.parse_args()
+    configure_logging()
+
+    migrate(args.db)
+    if args.command == "move-blobs":
+        move_blobs(args.db, vacuum=args.vacuum)
+    elif args.command == "gc-blobs":
+        gc_blobs(args.db, grace=args.grace)
+    print(f"Database at schema version {LATEST_VERSION}")
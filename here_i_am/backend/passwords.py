@@ -0,0 +1,101 @@
+"""
+Password hashing.
+
+Passwords are stored as werkzeug hashes ("scrypt:<n>:<r>:<p>$<salt>$<hash>").
+Rows from before this still hold the plaintext password; verify_password
+accepts those once and hands back a hash for the caller to store, so they're
+upgraded the next time the user logs in. The same happens for hashes made
+with an older cost (PASSWORD_METHOD changed).
+
+scrypt is deliberately slow (~50ms at the default cost), so the hashing runs
+in a small pool of KDF_WORKERS threads (hashlib releases the GIL while it
+works). A burst of logins waits for a free worker instead of every request
+thread burning a CPU at once, which would stall /events and everything else.
+If more than KDF_MAX_WAITING logins are already waiting, PasswordBusy is
+raised and app.py answers 503 with a Retry-After.
+
+    python benchmarks/bench_passwords.py   # logins/sec for a few costs
+"""
+import hmac
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+# log2 of the scrypt cost; 15 is werkzeug's default (32MB of memory per hash)
+SCRYPT_COST = int(os.environ.get("HEREIAM_SCRYPT_COST", "15"))
+PASSWORD_METHOD = f"scrypt:{2 ** SCRYPT_COST}:8:1"
+KDF_WORKERS = int(os.environ.get("HEREIAM_KDF_WORKERS", "0")) or max(1, (os.cpu_count() or 2) // 2)
+KDF_MAX_WAITING = int(os.environ.get("HEREIAM_KDF_MAX_WAITING", "64"))
+# seconds a request may wait for a place in the queue
+KDF_QUEUE_TIMEOUT = 5
+
+HASH_PREFIXES = ("scrypt:", "pbkdf2:")
+
+
+class PasswordBusy(Exception):
+    """Too many logins are already waiting for the KDF pool."""
+
+
+class KdfPool:
+
+    def __init__(self, workers=KDF_WORKERS, max_waiting=KDF_MAX_WAITING, queue_timeout=KDF_QUEUE_TIMEOUT):
+        self.workers = workers
+        self.queue_timeout = queue_timeout
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="kdf")
+        # running + waiting
+        self._slots = threading.BoundedSemaphore(workers + max_waiting)
+
+    def run(self, func, *args):
+        if not self._slots.acquire(timeout=self.queue_timeout):
+            raise PasswordBusy()
+        try:
+            return self._executor.submit(func, *args).result()
+        finally:
+            self._slots.release()
+
+    def shutdown(self):
+        self._executor.shutdown(wait=True)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_kdf_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = KdfPool()
+        return _pool
+
+
+def is_hashed(stored):
+    return bool(stored) and stored.startswith(HASH_PREFIXES) and stored.count("$") == 2
+
+
+def hash_password(password, method=None):
+    return get_kdf_pool().run(generate_password_hash, password, method or PASSWORD_METHOD)
+
+
+def verify_password(stored, password):
+    """
+    Check `password` against what the users table holds.
+    Returns (ok, new_hash): new_hash is set when the row should be updated
+    (plaintext row, or a hash made with another method than PASSWORD_METHOD).
+    """
+    if not stored or not password:
+        return False, None
+
+    if not is_hashed(stored):
+        # legacy plaintext row
+        if not hmac.compare_digest(stored.encode("utf-8"), password.encode("utf-8")):
+            return False, None
+        return True, hash_password(password)
+
+    if not get_kdf_pool().run(check_password_hash, stored, password):
+        return False, None
+    if stored.split("$", 1)[0] != PASSWORD_METHOD:
+        return True, hash_password(password)
+    return True, None
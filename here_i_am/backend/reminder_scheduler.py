@@ -0,0 +1,302 @@
+"""
+Sends the "your event starts in 30 minutes" email (email_services.event_reminder_message).
+
+Every future event has a row in event_reminders with the time the reminder is
+due (indexed on due_at). The scheduler keeps the soonest ones in a heap and
+sleeps until the first one is due, instead of polling the events table:
+
+- create_event adds the row in its own transaction and calls notify()
+- delete_event removes the row; a heap entry left behind is simply skipped
+- on startup (and every RESYNC_INTERVAL) the heap is rebuilt from the table,
+  so nothing is lost across restarts
+
+notify() only reaches the scheduler of its own process, and under serve.py
+that runs in worker 0 only. So the scheduler also wakes every POLL_INTERVAL
+seconds and asks the index for the earliest due_at (SELECT MIN(due_at), one
+index lookup); if that is already due, the reminder came from another worker
+and is sent now, at most POLL_INTERVAL seconds late.
+
+Only up to HEAP_LIMIT reminders are held in memory; the rest are read from the
+index, in order, when the heap runs dry. A due reminder is deleted from the
+table and its email queued in email_outbox in one transaction, so even with
+several processes each reminder is sent once.
+"""
+import heapq
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timezone
+
+import email_outbox
+from db_pool import DB_PATH, get_db_connection
+from db_config import run_write
+from email_services import event_reminder_message
+
+REMINDER_LEAD = 30 * 60   # seconds before start_time_utc
+HEAP_LIMIT = int(os.environ.get("HEREIAM_REMINDER_HEAP_LIMIT", "10000"))
+RESYNC_INTERVAL = 300
+# how often the table is checked for due reminders the heap doesn't know about
+POLL_INTERVAL = float(os.environ.get("HEREIAM_REMINDER_POLL_INTERVAL", "5"))
+
+log = logging.getLogger(__name__)
+
+
+def parse_start_time(start_time_utc):
+    """'2025-01-01T10:00:00' -> unix timestamp (the column is stored in UTC)."""
+    try:
+        dt = datetime.fromisoformat(str(start_time_utc))
+    except (TypeError, ValueError):
+        return None
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.timestamp()
+
+
+def schedule_reminder(conn, event_id, user_id, start_time_utc, now=None):
+    """
+    Add the reminder for a new event on the caller's connection (no commit).
+    Returns when it's due, or None if the event has already started.
+    """
+    now = time.time() if now is None else now
+    start = parse_start_time(start_time_utc)
+    if start is None or start <= now:
+        return None
+
+    # event starts in less than 30 minutes -> remind right away
+    due_at = max(start - REMINDER_LEAD, now)
+    conn.execute(
+        "INSERT OR REPLACE INTO event_reminders (event_id, user_id, due_at) VALUES (?, ?, ?)",
+        (event_id, user_id, due_at)
+    )
+    conn.execute(
+        "UPDATE events SET scheduled_to_send = ? WHERE id = ?",
+        (datetime.fromtimestamp(due_at, timezone.utc).strftime("%Y-%m-%dT%H:%M:%S"), event_id)
+    )
+    return due_at
+
+
+def cancel_reminder(conn, event_id):
+    conn.execute("DELETE FROM event_reminders WHERE event_id = ?", (event_id,))
+
+
+class ReminderScheduler:
+
+    def __init__(self, db_path=DB_PATH, heap_limit=HEAP_LIMIT):
+        self.db_path = db_path
+        self.heap_limit = heap_limit
+        self.stats = {"sent": 0, "skipped": 0, "loaded": 0}
+        self._heap = []
+        # (due_at, event_id) of the last row loaded into the heap,
+        # None when everything in the table is already in the heap
+        self._horizon = (-1.0, -1)
+        self._cond = threading.Condition()
+        self._stop = False
+        self._thread = None
+        self._last_sync = 0.0
+
+    def _load(self):
+        """Load the next heap_limit reminders after the horizon. Call with _cond held."""
+        after_due, after_id = self._horizon
+        conn = get_db_connection(self.db_path)
+        try:
+            rows = conn.execute(
+                """
+                SELECT due_at, event_id FROM event_reminders
+                WHERE (due_at, event_id) > (?, ?)
+                ORDER BY due_at, event_id
+                LIMIT ?
+                """,
+                (after_due, after_id, self.heap_limit)
+            ).fetchall()
+        finally:
+            conn.close()
+
+        for row in rows:
+            heapq.heappush(self._heap, (row["due_at"], row["event_id"]))
+        self.stats["loaded"] += len(rows)
+        if len(rows) < self.heap_limit:
+            self._horizon = None
+        else:
+            self._horizon = (rows[-1]["due_at"], rows[-1]["event_id"])
+
+    def resync(self):
+        """Throw away the heap and rebuild it from event_reminders."""
+        with self._cond:
+            self._heap = []
+            self._horizon = (-1.0, -1)
+            self._load()
+            self._last_sync = time.time()
+            self._cond.notify()
+
+    def add(self, event_id, due_at):
+        with self._cond:
+            # past the horizon it will be read from the table when we get there
+            if self._horizon is None or (due_at, event_id) <= self._horizon:
+                heapq.heappush(self._heap, (due_at, event_id))
+                self._cond.notify()
+
+    def pending(self):
+        with self._cond:
+            return len(self._heap)
+
+    def _pop_due(self, now):
+        due = []
+        with self._cond:
+            while True:
+                if not self._heap and self._horizon is not None:
+                    self._load()
+                if not self._heap or self._heap[0][0] > now:
+                    break
+                due.append(heapq.heappop(self._heap))
+        return due
+
+    def fire_due(self, now=None):
+        """Send every reminder due by `now`. Returns how many emails were queued."""
+        now = time.time() if now is None else now
+        sent = 0
+        for due_at, event_id in self._pop_due(now):
+            if self._fire(event_id, due_at, now):
+                sent += 1
+        if sent:
+            email_outbox.wake()
+        return sent
+
+    def poll(self, now=None):
+        """
+        Send the reminders that are due but were never in the heap (added by
+        another worker process). Call after fire_due(), which has taken every
+        due reminder the heap knows about. Returns how many emails were queued.
+        """
+        now = time.time() if now is None else now
+        conn = get_db_connection(self.db_path)
+        try:
+            first = conn.execute("SELECT MIN(due_at) FROM event_reminders").fetchone()[0]
+            if first is None or first > now:
+                return 0
+            rows = conn.execute(
+                "SELECT due_at, event_id FROM event_reminders WHERE due_at <= ? ORDER BY due_at, event_id",
+                (now,)
+            ).fetchall()
+        finally:
+            conn.close()
+
+        sent = 0
+        for row in rows:
+            if self._fire(row["event_id"], row["due_at"], now):
+                sent += 1
+        if sent:
+            email_outbox.wake()
+        return sent
+
+    def _fire(self, event_id, due_at, now):
+        def work(c):
+            cur = c.execute(
+                "DELETE FROM event_reminders WHERE event_id = ? AND due_at = ?",
+                (event_id, due_at)
+            )
+            if cur.rowcount == 0:
+                # deleted event, or another worker already sent it
+                return False
+
+            row = c.execute(
+                """
+                SELECT e.title, e.description, e.start_time_utc, e.importance, u.email
+                FROM events e JOIN users u ON u.id = e.user_id
+                WHERE e.id = ?
+                """,
+                (event_id,)
+            ).fetchone()
+            if not row or not row["email"]:
+                return False
+
+            # server was down past the event start, too late for "starts in 30 minutes"
+            start = parse_start_time(row["start_time_utc"])
+            if start is not None and start < now:
+                return False
+
+            email_outbox.enqueue(c, event_reminder_message(
+                email=row["email"],
+                title=row["title"],
+                description=row["description"] or "",
+                start_time_utc=row["start_time_utc"],
+                importance=str(row["importance"]),
+            ), kind="event_reminder")
+            return True
+
+        conn = get_db_connection(self.db_path)
+        try:
+            sent = run_write(conn, work)
+        finally:
+            conn.close()
+        self.stats["sent" if sent else "skipped"] += 1
+        return sent
+
+    def run_forever(self):
+        self.resync()
+        while True:
+            with self._cond:
+                if self._stop:
+                    return
+                now = time.time()
+                if now - self._last_sync >= RESYNC_INTERVAL:
+                    wait = 0
+                elif self._heap:
+                    wait = min(self._heap[0][0] - now, POLL_INTERVAL)
+                else:
+                    wait = POLL_INTERVAL
+                if wait > 0:
+                    # sleeps until the next reminder is due, the next poll or add()/stop()
+                    self._cond.wait(wait)
+                if self._stop:
+                    return
+
+            try:
+                if time.time() - self._last_sync >= RESYNC_INTERVAL:
+                    self.resync()
+                self.fire_due()
+                self.poll()
+            except Exception:
+                log.exception("reminder scheduler error")
+                time.sleep(1)
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop = False
+            self._thread = threading.Thread(target=self.run_forever, name="event-reminders", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self, timeout=10):
+        with self._cond:
+            self._stop = True
+            self._cond.notify()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+
+_scheduler = None
+
+
+def start_scheduler(db_path=DB_PATH, **kwargs):
+    global _scheduler
+    if _scheduler is None:
+        _scheduler = ReminderScheduler(db_path, **kwargs)
+    return _scheduler.start()
+
+
+def stop_scheduler(timeout=10):
+    global _scheduler
+    if _scheduler is not None:
+        _scheduler.stop(timeout)
+        _scheduler = None
+
+
+def notify(event_id, due_at):
+    """
+    Tell the running scheduler about a reminder that was just committed (if
+    this process runs it; otherwise its poll finds the row).
+    """
+    if _scheduler is not None and due_at is not None:
+        _scheduler.add(event_id, due_at)
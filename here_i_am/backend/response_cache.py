@@ -0,0 +1,183 @@
+"""
+Cached responses for the event listings (/events?date=, /events/range, /history).
+
+Every user has a version number that create_event, delete_event and
+save_file bump after they commit. A cached response remembers the version it
+was made at and is only served while the user's version hasn't moved, so
+nothing has to be found and deleted when an event changes.
+
+The ETag is built from the version too, so a client that sends it back with
+If-None-Match gets a 304 without the route running at all.
+
+The versions are kept in the user_versions table (one primary key lookup per
+request), not in this process: with several serve.py workers a write made
+through one of them is seen by all the others at once, and they hand out the
+same ETags. The cached bodies themselves are per process.
+"""
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from flask import Response, make_response, request
+
+from auth import current_user
+from db_config import execute_write
+from db_pool import DB_PATH, get_db_connection
+
+RESPONSE_CACHE_BYTES = int(os.environ.get("HEREIAM_RESPONSE_CACHE_BYTES", str(32 * 1024 * 1024)))
+RESPONSE_CACHE_TTL = float(os.environ.get("HEREIAM_RESPONSE_CACHE_TTL", "30"))
+# query parameters that say who is asking, not what is asked for
+IDENTITY_PARAMS = {"user_id", "token", "authenticated_user_id"}
+
+
+class ResponseCache:
+    """LRU of response bodies by (user, path, params), bounded by bytes and aged out after ttl."""
+
+    def __init__(self, max_bytes=RESPONSE_CACHE_BYTES, ttl=RESPONSE_CACHE_TTL, path=DB_PATH):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.path = path
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "not_modified": 0, "evictions": 0}
+
+    def version(self, user_id):
+        conn = get_db_connection(self.path)
+        try:
+            row = conn.execute("SELECT version FROM user_versions WHERE user_id = ?", (user_id,)).fetchone()
+        finally:
+            conn.close()
+        return row[0] if row else 0
+
+    def bump(self, user_id):
+        conn = get_db_connection(self.path)
+        try:
+            execute_write(
+                conn,
+                "INSERT INTO user_versions (user_id, version) VALUES (?, 1) "
+                "ON CONFLICT (user_id) DO UPDATE SET version = version + 1",
+                (user_id,)
+            )
+        finally:
+            conn.close()
+
+    def get(self, key, version):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry_version, expires_at, body, mimetype = entry
+                if entry_version == version and expires_at >= now:
+                    self._entries.move_to_end(key)
+                    self.stats["hits"] += 1
+                    return body, mimetype
+                self._forget(key)
+            self.stats["misses"] += 1
+            return None
+
+    def put(self, key, version, body, mimetype):
+        if len(body) > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._forget(key)
+            self._entries[key] = (version, time.monotonic() + self.ttl, body, mimetype)
+            self._size += len(body)
+            while self._size > self.max_bytes:
+                self._forget(next(iter(self._entries)))
+                self.stats["evictions"] += 1
+
+    def _forget(self, key):
+        """Call with _lock held."""
+        _, _, body, _ = self._entries.pop(key)
+        self._size -= len(body)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def not_modified(self):
+        with self._lock:
+            self.stats["not_modified"] += 1
+
+    def snapshot(self):
+        """stats plus size and hit ratio (304s count as hits)."""
+        with self._lock:
+            data = dict(self.stats)
+            data["entries"] = len(self._entries)
+            data["bytes"] = self._size
+        served = data["hits"] + data["not_modified"]
+        total = served + data["misses"]
+        data["hit_ratio"] = served / total if total else 0.0
+        return data
+
+    def etag(self, user_id, version, key):
+        digest = hashlib.sha1(repr(key).encode("utf-8")).hexdigest()[:12]
+        return f"{user_id}-{version}-{digest}"
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_response_cache():
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = ResponseCache()
+        return _cache
+
+
+def bump_user(user_id):
+    """Call after a committed write that changes what the user's event listings show."""
+    get_response_cache().bump(int(user_id))
+
+
+def cache_stats():
+    """Hit/miss counters and hit ratio of the response cache (for monitoring)."""
+    return get_response_cache().snapshot()
+
+
+def cached_per_user(view):
+    """
+    Route decorator for GET listings of the current user's events.
+    Only plain 200 responses are stored; errors and streamed ones (ndjson) pass through.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        user_id, denied = current_user()
+        if denied:
+            return view(*args, **kwargs)
+
+        cache = get_response_cache()
+        version = cache.version(user_id)
+        params = tuple(sorted((k, v) for k, v in request.args.items(multi=True) if k not in IDENTITY_PARAMS))
+        # /history answers in ndjson for that Accept header
+        key = (user_id, request.path, params, request.headers.get("Accept", ""))
+        etag = cache.etag(user_id, version, key)
+
+        if request.if_none_match.contains(etag):
+            cache.not_modified()
+            response = Response(status=304)
+        else:
+            cached = cache.get(key, version)
+            if cached is not None:
+                body, mimetype = cached
+                response = Response(body, mimetype=mimetype)
+            else:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200 or response.is_streamed:
+                    return response
+                cache.put(key, version, response.get_data(), response.mimetype)
+
+        response.set_etag(etag)
+        # the browser may keep it, but has to ask (and gets a 304) every time
+        response.cache_control.private = True
+        response.cache_control.no_cache = True
+        return response
+    return wrapper
@@ -0,0 +1,349 @@
+"""
+Production server: the app in several pre-forked worker processes.
+
+    python serve.py                          # HEREIAM_WORKERS workers on HEREIAM_HOST:HEREIAM_PORT
+    python serve.py --workers 4 --port 3001
+    python serve.py --no-migrate             # only check the schema, migrations were run by hand
+
+(`python app.py` is still the single-process dev server with the debugger.)
+
+The master process only imports log_config. The migrations and the schema
+check run in a child process it forks first (nothing is served if they
+fail), then it binds the listening socket and forks the workers. Each worker
+imports the app after the fork, so the db pool connections, the SMTP client
+and the KDF pool belong to that process only, and serves the shared socket
+with a threaded Werkzeug server. The email outbox and reminder threads only
+run in worker 0; the other workers' wake() / notify() calls don't reach them,
+so both also poll their table (every HEREIAM_OUTBOX_POLL_INTERVAL /
+HEREIAM_REMINDER_POLL_INTERVAL seconds) for rows another worker added.
+
+What the workers have to agree on is kept outside of them: the response
+cache versions are in SQLite (response_cache.py), CV batch jobs in
+HEREIAM_CV_JOB_DIR (cv_batch.py), and login always reads the user from the
+database. The per-process user directory (user_directory.py) only answers
+register's duplicate check. The other in-memory caches are keyed by content
+(CV PDFs, picture ETags), so every worker keeping its own copy only costs memory.
+
+Metrics: the workers keep their own counters (metrics.py), and GET /metrics
+on the shared socket shows those of whichever worker took the connection.
+So worker i also serves GET /metrics on HEREIAM_METRICS_HOST:HEREIAM_METRICS_PORT + i
+(127.0.0.1:9300, 9301, ... by default; --metrics-port 0 turns this off).
+Scrape each of those ports as its own target. The index, and so the port, stays
+the same when a worker is replaced or reloaded (its counters start from 0 again).
+
+Signals to the master:
+  SIGTERM / SIGINT  stop: workers stop accepting, finish the requests in flight
+                    and exit; whatever is left after HEREIAM_GRACEFUL_TIMEOUT is killed
+  SIGHUP            reload: a new set of workers is started and the old ones are
+                    stopped as above. The new workers import the app and everything
+                    it uses as it is on disk now, except log_config and the
+                    HEREIAM_* settings read by this file. The socket stays open,
+                    connections arriving meanwhile wait in its backlog.
+A worker that dies is replaced. A worker that can't even import the app stops the server.
+"""
+import argparse
+import logging
+import os
+import signal
+import socket
+import sys
+import threading
+import time
+
+from log_config import configure_logging
+
+HOST = os.environ.get("HEREIAM_HOST", "0.0.0.0")
+PORT = int(os.environ.get("HEREIAM_PORT", "3001"))
+# requests mostly hold the GIL (ReportLab, JSON), so about one worker per core
+WORKERS = int(os.environ.get("HEREIAM_WORKERS", "0")) or os.cpu_count() or 2
+GRACEFUL_TIMEOUT = float(os.environ.get("HEREIAM_GRACEFUL_TIMEOUT", "30"))
+# idle keep-alive connections are closed after this, so stopping workers don't wait on them
+KEEPALIVE_TIMEOUT = float(os.environ.get("HEREIAM_KEEPALIVE_TIMEOUT", "5"))
+BACKLOG = 2048
+# worker i serves its own GET /metrics on METRICS_PORT + i (0: no metrics ports)
+METRICS_HOST = os.environ.get("HEREIAM_METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.environ.get("HEREIAM_METRICS_PORT", "9300"))
+
+# worker exit code for "could not load the app", respawning would only fail again
+WORKER_BOOT_ERROR = 3
+
+log = logging.getLogger("serve")
+
+
+def serve_metrics(index, host, port, servers, stopped):
+    """
+    Thread of worker `index`: its own GET /metrics on host:port. The worker it
+    replaces may still be finishing its requests on that port, so the bind is
+    retried until the port is free.
+    """
+    from metrics import start_metrics_server
+
+    warned = False
+    while not stopped.is_set():
+        try:
+            servers.append(start_metrics_server(host, port))
+        except OSError as e:
+            if not warned:
+                log.warning("metrics port busy, retrying", extra={"worker": index, "port": port, "error": str(e)})
+                warned = True
+            stopped.wait(0.5)
+            continue
+        log.info("serving metrics", extra={"worker": index, "port": port})
+        return
+
+
+def run_worker(index, sock, host, port, metrics_port=METRICS_PORT):
+    """Body of a forked worker process. Never returns."""
+    for signum in (signal.SIGINT, signal.SIGHUP):
+        # Ctrl+C reaches the whole process group, the master decides what happens
+        signal.signal(signum, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    if index != 0:
+        os.environ["HEREIAM_OUTBOX_WORKER"] = "0"
+        os.environ["HEREIAM_REMINDER_WORKER"] = "0"
+
+    try:
+        from werkzeug.serving import WSGIRequestHandler, make_server
+
+        import app as app_module
+
+        class RequestHandler(WSGIRequestHandler):
+            protocol_version = "HTTP/1.1"
+            timeout = KEEPALIVE_TIMEOUT
+
+        server = make_server(host, port, app_module.app, threaded=True,
+                             request_handler=RequestHandler, fd=sock.fileno())
+        # server_close() waits for the request threads instead of abandoning them
+        server.daemon_threads = False
+        server.block_on_close = True
+    except Exception:
+        log.exception("worker failed to boot", extra={"worker": index})
+        os._exit(WORKER_BOOT_ERROR)
+
+    metrics_servers = []
+    stopped = threading.Event()
+
+    def shutdown():
+        # the metrics port first, so the worker replacing this one can take it
+        for metrics_server in metrics_servers:
+            metrics_server.shutdown()
+            metrics_server.server_close()
+        server.shutdown()
+
+    def stop(signum, frame):
+        stopped.set()
+        # shutdown() waits for serve_forever() to return, so not from this (the serving) thread
+        threading.Thread(target=shutdown, daemon=True).start()
+
+    signal.signal(signal.SIGTERM, stop)
+    if metrics_port:
+        threading.Thread(target=serve_metrics, name="metrics-bind", daemon=True,
+                         args=(index, METRICS_HOST, metrics_port + index, metrics_servers, stopped)).start()
+    log.info("worker booted", extra={"worker": index, "pid": os.getpid()})
+    code = 0
+    try:
+        server.serve_forever()
+        server.server_close()
+    except Exception:
+        log.exception("worker crashed", extra={"worker": index})
+        code = 1
+    finally:
+        shutdown_app(app_module)
+        log.info("worker stopped", extra={"worker": index, "pid": os.getpid()})
+        logging.shutdown()
+        os._exit(code)
+
+
+def shutdown_app(app_module):
+    """Stop the background threads and pools of this worker (nothing new is coming in)."""
+    from cv_batch import shutdown_render_pool
+    from db_pool import get_pool
+    from passwords import get_kdf_pool
+
+    app_module.email_outbox.stop_worker()
+    app_module.reminder_scheduler.stop_scheduler()
+    shutdown_render_pool()
+    get_kdf_pool().shutdown()
+    get_pool(app_module.DB_PATH).close_all()
+
+
+class Arbiter:
+    """The master process: keeps `workers` workers running on one listening socket."""
+
+    def __init__(self, host=HOST, port=PORT, workers=WORKERS, graceful_timeout=GRACEFUL_TIMEOUT,
+                 metrics_port=METRICS_PORT):
+        self.host = host
+        self.port = port
+        self.workers = workers
+        self.graceful_timeout = graceful_timeout
+        self.metrics_port = metrics_port
+        self.sock = None
+        self.children = {}   # pid -> worker index
+        self.retiring = {}   # pid -> deadline for SIGKILL
+        self.respawn_at = {}  # worker index -> time.monotonic() it may be started again
+        self.stopping = False
+        self.reloading = False
+        self.exit_code = 0
+
+    def bind(self):
+        family = socket.AF_INET6 if ":" in self.host else socket.AF_INET
+        self.sock = socket.create_server((self.host, self.port), family=family, backlog=BACKLOG)
+        self.port = self.sock.getsockname()[1]
+        return self.sock
+
+    def spawn(self, index):
+        pid = os.fork()
+        if pid == 0:
+            run_worker(index, self.sock, self.host, self.port, self.metrics_port)
+        self.children[pid] = index
+        self.respawn_at[index] = time.monotonic() + 1
+        return pid
+
+    def retire(self, pids, sig=signal.SIGTERM):
+        deadline = time.monotonic() + self.graceful_timeout
+        for pid in pids:
+            index = self.children.pop(pid, None)
+            self.retiring.setdefault(pid, deadline)
+            self._kill(pid, sig)
+            if index is not None:
+                log.info("stopping worker", extra={"worker": index, "pid": pid})
+
+    def _kill(self, pid, sig):
+        try:
+            os.kill(pid, sig)
+        except ProcessLookupError:
+            pass
+
+    def reap(self):
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            code = os.waitstatus_to_exitcode(status)
+            if self.retiring.pop(pid, None) is not None:
+                continue
+            index = self.children.pop(pid, None)
+            if index is None:
+                continue
+            if code == WORKER_BOOT_ERROR:
+                log.error("worker could not load the app, stopping", extra={"worker": index})
+                self.exit_code = WORKER_BOOT_ERROR
+                self.stopping = True
+            else:
+                log.warning("worker died, starting a new one", extra={"worker": index, "pid": pid, "exit_code": code})
+
+    def maintain(self):
+        """Start missing workers (not more than once a second per slot, in case they keep crashing)."""
+        running = set(self.children.values())
+        now = time.monotonic()
+        for index in range(self.workers):
+            if index not in running and self.respawn_at.get(index, 0) <= now:
+                self.spawn(index)
+        self.kill_overdue()
+
+    def kill_overdue(self):
+        now = time.monotonic()
+        for pid, deadline in list(self.retiring.items()):
+            if deadline <= now:
+                log.warning("worker did not stop in time, killing it", extra={"pid": pid})
+                self._kill(pid, signal.SIGKILL)
+                self.retiring[pid] = float("inf")
+
+    def reload(self):
+        log.info("reloading workers")
+        old = list(self.children)
+        self.respawn_at = {}
+        for index in range(self.workers):
+            self.spawn(index)
+        self.retire(old)
+
+    def _on_stop(self, signum, frame):
+        self.stopping = True
+
+    def _on_reload(self, signum, frame):
+        self.reloading = True
+
+    def run(self):
+        """Serve until SIGTERM / SIGINT. Returns the exit code."""
+        signal.signal(signal.SIGTERM, self._on_stop)
+        signal.signal(signal.SIGINT, self._on_stop)
+        signal.signal(signal.SIGHUP, self._on_reload)
+        log.info("listening", extra={"host": self.host, "port": self.port, "workers": self.workers})
+
+        while not self.stopping:
+            self.reap()
+            if self.stopping:
+                break
+            if self.reloading:
+                self.reloading = False
+                self.reload()
+            self.maintain()
+            time.sleep(0.1)
+
+        self.retire(list(self.children))
+        while self.retiring:
+            self.reap()
+            self.kill_overdue()
+            time.sleep(0.1)
+        self.sock.close()
+        log.info("stopped")
+        return self.exit_code
+
+
+def prepare_database(run_migrations=True):
+    """
+    Migrate (unless told not to) and check the schema, in a forked child so the
+    master never imports db_pool / migrations (a reload must load them again).
+    Returns True if the database is fit to serve.
+    """
+    pid = os.fork()
+    if pid == 0:
+        code = 1
+        try:
+            from db_pool import DB_PATH
+            from migrations import check_schema, migrate
+
+            if run_migrations:
+                migrate(DB_PATH)
+            problems = check_schema(DB_PATH)
+            for problem in problems:
+                log.error("schema check failed: %s", problem)
+            code = 1 if problems else 0
+        except Exception:
+            log.exception("migrations failed")
+        finally:
+            logging.shutdown()
+            os._exit(code)
+    _, status = os.waitpid(pid, 0)
+    return os.waitstatus_to_exitcode(status) == 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run Here I Am with pre-forked worker processes")
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--workers", type=int, default=WORKERS)
+    parser.add_argument("--graceful-timeout", type=float, default=GRACEFUL_TIMEOUT)
+    parser.add_argument("--no-migrate", action="store_true", help="don't apply migrations, only check the schema")
+    parser.add_argument("--metrics-port", type=int, default=METRICS_PORT,
+                        help="worker i serves its own /metrics on this port + i (0: off)")
+    args = parser.parse_args(argv)
+
+    configure_logging()
+    if not hasattr(os, "fork"):
+        log.error("serve.py needs os.fork(), use python app.py on this platform")
+        return 1
+
+    if not prepare_database(run_migrations=not args.no_migrate):
+        return 1
+
+    arbiter = Arbiter(args.host, args.port, args.workers, args.graceful_timeout, args.metrics_port)
+    arbiter.bind()
+    return arbiter.run()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,157 @@
+import io
+import os
+import sqlite3
+import subprocess
+import sys
+import time
+import zipfile
+
+import pytest
+
+import cv_batch
+import cv_routes
+from cv_cache import CVCache
+
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "../.."))
+
+
+def cv(name, surname="Jordan", **extra):
+    data = {
+        "name": name, "surname": surname, "birthdate": "25/12/1990",
+        "degree": "BSc Computer Science", "job_count": "3", "phone": "+35799123456",
+        "email": "george.jordan@example.com", "skill_count": "5",
+        "portfolio": "https://github.com/georgejordan", "english_level": "B2",
+    }
+    data.update(extra)
+    return data
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    monkeypatch.setattr(cv_batch, "CV_WORKERS", 2)
+    monkeypatch.setattr(cv_routes, "get_cv_cache", lambda: CVCache())
+    yield
+    cv_batch.shutdown_render_pool()
+
+
+def read_zip(data):
+    with zipfile.ZipFile(io.BytesIO(data)) as zf:
+        return {name: zf.read(name) for name in zf.namelist()}
+
+
+def test_batch_returns_zip_of_pdfs(client, pool):
+    res = client.post("/generate-cv/batch", json={"cvs": [cv("George"), cv("Maria", "Papa"), cv("Nikos")]})
+
+    assert res.status_code == 200
+    assert res.mimetype == "application/zip"
+    files = read_zip(res.data)
+    assert sorted(files) == ["001-George_Jordan.pdf", "002-Maria_Papa.pdf", "003-Nikos_Jordan.pdf"]
+    assert all(pdf.startswith(b"%PDF") for pdf in files.values())
+
+
+def test_invalid_cv_is_reported_per_index(client, pool):
+    res = client.post("/generate-cv/batch", json={"cvs": [cv("George"), cv("G3orge", email="nope")]})
+
+    assert res.status_code == 400
+    errors = res.get_json()["errors"]
+    assert list(errors) == ["1"]
+    assert set(errors["1"]) == {"name", "email"}
+
+
+@pytest.mark.parametrize("body", [{"cvs": []}, {"cvs": "George"}, [], ["not a cv"]])
+def test_bad_batches(client, pool, body):
+    assert client.post("/generate-cv/batch", json=body).status_code == 400
+
+
+def test_batch_size_limit(client, pool, monkeypatch):
+    monkeypatch.setattr(cv_batch, "MAX_BATCH_SIZE", 2)
+    res = client.post("/generate-cv/batch", json=[cv("George")] * 3)
+    assert res.status_code == 400
+
+
+def test_job_mode(client, pool):
+    res = client.post("/generate-cv/batch?mode=job", json=[cv("George"), cv("Maria")])
+    assert res.status_code == 202
+    job_id = res.get_json()["job_id"]
+
+    deadline = time.time() + 60
+    status = client.get(f"/generate-cv/batch/{job_id}").get_json()
+    while status["status"] == "running" and time.time() < deadline:
+        time.sleep(0.05)
+        status = client.get(f"/generate-cv/batch/{job_id}").get_json()
+
+    assert status == {"job_id": job_id, "status": "done", "total": 2, "done": 2, "error": None}
+    files = read_zip(client.get(f"/generate-cv/batch/{job_id}/zip").data)
+    assert sorted(files) == ["001-George_Jordan.pdf", "002-Maria_Jordan.pdf"]
+
+
+def test_unknown_job(client):
+    assert client.get("/generate-cv/batch/nope").status_code == 404
+    assert client.get("/generate-cv/batch/nope/zip").status_code == 404
+
+
+def test_stream_zip_is_a_valid_archive():
+    data = b"".join(cv_batch.stream_zip([("a.pdf", b"%PDF a"), ("b.pdf", b"%PDF b")]))
+    assert read_zip(data) == {"a.pdf": b"%PDF a", "b.pdf": b"%PDF b"}
+
+
+def wait_for_job(client, job_id):
+    deadline = time.time() + 60
+    status = client.get(f"/generate-cv/batch/{job_id}").get_json()
+    while status["status"] == "running" and time.time() < deadline:
+        time.sleep(0.05)
+        status = client.get(f"/generate-cv/batch/{job_id}").get_json()
+    return status
+
+
+def test_jobs_live_in_the_job_dir(client, pool):
+    job_id = client.post("/generate-cv/batch?mode=job", json=[cv("George")]).get_json()["job_id"]
+    assert wait_for_job(client, job_id)["status"] == "done"
+
+    # what any other worker process would find
+    assert {f"{job_id}.json", f"{job_id}.zip"} <= set(os.listdir(cv_batch.JOB_DIR))
+    assert cv_batch.BatchJob.load(cv_batch.JOB_DIR, job_id).to_dict()["done"] == 1
+    os.remove(os.path.join(cv_batch.JOB_DIR, f"{job_id}.json"))
+    assert client.get(f"/generate-cv/batch/{job_id}").status_code == 404
+
+
+def test_too_many_running_jobs_is_a_429(client, pool, monkeypatch):
+    monkeypatch.setattr(cv_batch, "MAX_RUNNING_JOBS", 0)
+    res = client.post("/generate-cv/batch?mode=job", json=[cv("George")])
+    assert res.status_code == 429
+    assert "Retry-After" in res.headers
+
+
+def test_old_and_oversized_jobs_are_pruned(tmp_path, monkeypatch):
+    def job(job_id, size, age):
+        for name, data in ((f"{job_id}.json", b"{}"), (f"{job_id}.zip", b"x" * size)):
+            path = tmp_path / name
+            path.write_bytes(data)
+            os.utime(path, (time.time() - age, time.time() - age))
+
+    monkeypatch.setattr(cv_batch, "JOB_DIR_BYTES", 250)
+    job("a" * 32, 100, cv_batch.JOB_TTL + 10)   # expired
+    job("b" * 32, 100, 30)                      # oldest of the rest, over the size limit
+    job("c" * 32, 100, 20)
+    job("d" * 32, 100, 10)
+
+    cv_batch.prune_jobs(str(tmp_path))
+    assert sorted(p.name[0] for p in tmp_path.iterdir()) == ["c", "c", "d", "d"]
+
+
+def test_job_ids_are_checked(client):
+    assert client.get("/generate-cv/batch/..%2F..%2Fdb%2Fdatabase").status_code == 404
+    assert cv_batch.get_job("../" + "a" * 29) is None
+
+
+def test_app_loaded_by_a_render_process_starts_nothing(tmp_path):
+    # a spawned render process imports `python app.py`'s main module again as __mp_main__
+    script = ("import runpy, threading; runpy.run_path('app.py', run_name='__mp_main__'); "
+              "print(sorted(t.name for t in threading.enumerate()))")
+    db_path = tmp_path / "database.db"
+    out = subprocess.run([sys.executable, "-c", script], cwd=BACKEND_DIR, capture_output=True, text=True,
+                         timeout=60, env=dict(os.environ, HEREIAM_DB_PATH=str(db_path),
+                                              HEREIAM_OUTBOX_WORKER="1", HEREIAM_REMINDER_WORKER="1"))
+    assert out.stdout.split() == ["['MainThread']"], out.stderr
+    # not migrated either
+    assert not db_path.exists() or sqlite3.connect(db_path).execute("PRAGMA user_version").fetchone()[0] == 0
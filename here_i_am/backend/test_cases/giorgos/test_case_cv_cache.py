@@ -0,0 +1,118 @@
+import os
+
+import pytest
+from PIL import Image
+
+import cv_cache
+import cv_routes
+from cv_cache import CVCache, cv_cache_key
+
+
+@pytest.fixture
+def cv_data():
+    return {
+        "name": "George", "surname": "Jordan", "birthdate": "25/12/1990",
+        "degree": "BSc Computer Science", "job_count": "3", "phone": "+35799123456",
+        "email": "george.jordan@example.com", "skill_count": "5",
+        "portfolio": "https://github.com/georgejordan", "english_level": "B2",
+        "picture_path": "",
+    }
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    cache = CVCache(max_bytes=10 * 1024 * 1024)
+    monkeypatch.setattr(cv_routes, "get_cv_cache", lambda: cache)
+    return cache
+
+
+@pytest.fixture
+def renders(monkeypatch):
+    calls = []
+    render = cv_routes.render_cv
+
+    def counting_render(data):
+        calls.append(data)
+        return render(data)
+
+    monkeypatch.setattr(cv_routes, "render_cv", counting_render)
+    return calls
+
+
+def test_same_form_is_rendered_once(client, cache, renders, cv_data):
+    first = client.post("/generate-cv", json=cv_data)
+    second = client.post("/generate-cv", json=dict(cv_data, degree="  BSc Computer Science "))
+
+    assert first.status_code == second.status_code == 200
+    assert first.data.startswith(b"%PDF")
+    assert second.data == first.data
+    assert len(renders) == 1
+    assert cache.stats["hits"] == 1
+    assert first.headers["ETag"] == second.headers["ETag"]
+
+
+def test_changed_field_renders_again(client, cache, renders, cv_data):
+    first = client.post("/generate-cv", json=cv_data)
+    second = client.post("/generate-cv", json=dict(cv_data, english_level="C1"))
+
+    assert len(renders) == 2
+    assert first.headers["ETag"] != second.headers["ETag"]
+
+
+def test_matching_etag_gets_304(client, cache, renders, cv_data):
+    etag = client.post("/generate-cv", json=cv_data).headers["ETag"]
+
+    res = client.post("/generate-cv", json=cv_data, headers={"If-None-Match": etag})
+
+    assert res.status_code == 304
+    assert res.data == b""
+    assert len(renders) == 1
+
+
+def test_new_picture_under_same_name_changes_key(tmp_path, cv_data):
+    picture = tmp_path / "avatar.png"
+    Image.new("RGB", (4, 4), "black").save(picture, "PNG")
+    data = dict(cv_data, picture_path=str(picture))
+    before = cv_cache_key(data)
+
+    Image.new("RGB", (8, 8), "white").save(picture, "PNG")
+    os.utime(picture, ns=(1, 1))
+
+    assert cv_cache_key(data) != before
+
+
+def test_render_version_is_part_of_the_key(monkeypatch, cv_data):
+    before = cv_cache_key(cv_data)
+
+    monkeypatch.setattr(cv_cache, "RENDER_VERSION", cv_cache.RENDER_VERSION + 1)
+
+    assert cv_cache_key(cv_data) != before
+
+
+def test_lru_evicts_oldest_past_size_limit():
+    cache = CVCache(max_bytes=10)
+    cache.put("a", b"12345")
+    cache.put("b", b"12345")
+    cache.get("a")
+    cache.put("c", b"12345")
+
+    assert cache.get("b") is None
+    assert cache.get("a") == b"12345"
+    assert cache.size == 10
+    assert cache.stats["evictions"] == 1
+
+
+def test_disk_level_survives_restart(tmp_path):
+    CVCache(disk_dir=str(tmp_path)).put("k", b"%PDF-1.4")
+
+    restarted = CVCache(disk_dir=str(tmp_path))
+    assert restarted.get("k") == b"%PDF-1.4"
+    assert restarted.stats["disk_hits"] == 1
+
+
+def test_disk_level_is_trimmed(tmp_path):
+    cache = CVCache(disk_dir=str(tmp_path), disk_max_bytes=10)
+    for key in "abc":
+        cache.put(key, b"12345")
+
+    assert sorted(os.listdir(tmp_path)) == ["b.pdf", "c.pdf"]
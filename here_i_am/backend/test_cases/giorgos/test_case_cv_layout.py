@@ -0,0 +1,120 @@
+import pytest
+from PIL import Image
+from reportlab.pdfgen import canvas
+
+import cv_layout
+from benchmarks.bench_cv_render import SAMPLE_CV, legacy_render_cv
+from cv_layout import DEFAULT_TEMPLATE, compile_template
+from cv_routes import render_cv
+
+
+class RecordingCanvas(canvas.Canvas):
+    """Canvas that remembers what was drawn where (and in which colour)."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.drawn = []
+
+    def _record(self, *what):
+        fill = self._fillColorObj
+        rgb = fill.rgb() if hasattr(fill, "rgb") else fill
+        self.drawn.append(what + (tuple(round(v, 3) for v in rgb),))
+
+    def drawString(self, x, y, text, *args, **kwargs):
+        self._record("string", round(x, 3), round(y, 3), text, self._fontname, self._fontsize)
+        return super().drawString(x, y, text, *args, **kwargs)
+
+    def drawCentredString(self, x, y, text, *args, **kwargs):
+        self._record("centred", round(x, 3), round(y, 3), text, self._fontname, self._fontsize)
+        return super().drawCentredString(x, y, text, *args, **kwargs)
+
+    def drawText(self, text):
+        self._record("text", text.getCode())
+        return super().drawText(text)
+
+    def line(self, *coords):
+        self._record("line", *(round(v, 3) for v in coords))
+        return super().line(*coords)
+
+    def circle(self, x, y, r, stroke=1, fill=0):
+        self._record("circle", round(x, 3), round(y, 3), r, stroke, fill)
+        return super().circle(x, y, r, stroke=stroke, fill=fill)
+
+    def drawImage(self, image, x, y, width=None, height=None, **kwargs):
+        self._record("image", round(x, 3), round(y, 3), round(width, 3), round(height, 3))
+        return super().drawImage(image, x, y, width=width, height=height, **kwargs)
+
+
+@pytest.fixture
+def recorded(monkeypatch):
+    canvases = []
+
+    def make(*args, **kwargs):
+        c = RecordingCanvas(*args, **kwargs)
+        canvases.append(c)
+        return c
+
+    monkeypatch.setattr(canvas, "Canvas", make)
+
+    def draw(render, data):
+        render(data)
+        return canvases[-1].drawn
+    return draw
+
+
+@pytest.fixture
+def picture(tmp_path):
+    path = tmp_path / "avatar.png"
+    Image.new("RGB", (30, 60), "red").save(path, "PNG")
+    return str(path)
+
+
+@pytest.mark.parametrize("data", [
+    SAMPLE_CV,
+    {},
+    {"name": "Ash"},
+    dict(SAMPLE_CV, degree="   ", job_history="", skill_history="  "),
+    dict(SAMPLE_CV, name="Maximiliano Alexandros Konstantinopoulos", surname="Papadopoulos-Georgiou"),
+    dict(SAMPLE_CV, email="a.very.long.email.address.that.needs.wrapping@some-long-domain.example.com"),
+    dict(SAMPLE_CV, picture_path="/no/such/picture.png"),
+])
+def test_same_drawing_as_hand_positioned_layout(recorded, data):
+    assert recorded(render_cv, data) == recorded(legacy_render_cv, data)
+
+
+def test_same_drawing_with_picture(recorded, picture):
+    data = dict(SAMPLE_CV, picture_path=picture)
+    drawn = recorded(render_cv, data)
+
+    assert drawn == recorded(legacy_render_cv, data)
+    assert any(what[0] == "image" for what in drawn)
+
+
+def test_plan_is_compiled_once(monkeypatch):
+    monkeypatch.setattr(cv_layout, "_plans", {})
+    compiled = []
+    real_compile = cv_layout.compile_template
+    monkeypatch.setattr(cv_layout, "compile_template", lambda t: compiled.append(t) or real_compile(t))
+
+    render_cv(SAMPLE_CV)
+    render_cv(SAMPLE_CV)
+
+    assert compiled == [DEFAULT_TEMPLATE]
+
+
+def test_new_block_is_one_template_entry(recorded, monkeypatch):
+    template = dict(DEFAULT_TEMPLATE)
+    main = dict(template["columns"]["main"])
+    main["blocks"] = main["blocks"] + [{"type": "labeled", "field": "hobbies", "label": "Hobbies:"}]
+    template["columns"] = dict(template["columns"], main=main)
+    monkeypatch.setitem(cv_layout.TEMPLATES, "hobbies", template)
+
+    drawn = recorded(lambda data: render_cv(data, template="hobbies"), dict(SAMPLE_CV, hobbies="Pokemon battles"))
+
+    assert any(what[:2] == ("string", 50) and what[3] == "Hobbies:" for what in drawn)
+
+
+def test_unknown_block_type():
+    template = {**DEFAULT_TEMPLATE, "columns": {"main": {"x": 50, "right": 0.5, "blocks": [{"type": "chart"}]}}}
+    with pytest.raises(ValueError):
+        compile_template(template)
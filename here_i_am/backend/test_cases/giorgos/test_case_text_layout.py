@@ -0,0 +1,58 @@
+import random
+from io import BytesIO
+
+import pytest
+from reportlab.pdfgen import canvas
+
+from benchmarks.bench_text_wrap import MAX_WIDTH, canvas_wrap_text_by_width, make_inputs
+from text_layout import string_width, wrap_text_by_width
+
+
+@pytest.fixture(scope="module")
+def c():
+    return canvas.Canvas(BytesIO())
+
+
+FONTS = [("Helvetica", 10), ("Helvetica-Bold", 24), ("Helvetica", 14), ("No-Such-Font", 10)]
+
+
+@pytest.mark.parametrize("text", [
+    "", "   ", None, 42, "short", "a\n\nb\n", "tabs\tand  double  spaces",
+    "supercalifragilisticexpialidocious " * 8,
+    "x" * 400,
+    "george.jordan.with.a.very.long.address@some-really-long-domain.example.com",
+    "emoji 🎉 and Ελληνικά and 中文 mixed",
+])
+@pytest.mark.parametrize("font, size", FONTS)
+def test_same_breaks_as_canvas_version(c, text, font, size):
+    for max_width in (0, 5, 60, 150, MAX_WIDTH):
+        assert wrap_text_by_width(text, font, size, max_width) == \
+            canvas_wrap_text_by_width(c, text, font, size, max_width)
+
+
+def test_same_breaks_on_benchmark_inputs(c):
+    for text in make_inputs(3000).values():
+        assert wrap_text_by_width(text, "Helvetica", 10, MAX_WIDTH) == \
+            canvas_wrap_text_by_width(c, text, "Helvetica", 10, MAX_WIDTH)
+
+
+def test_same_breaks_on_random_text(c):
+    rnd = random.Random(7)
+    alphabet = "abcdefghij KLMNOP,.-@/\n\tάέήí✓🎉"
+    for _ in range(200):
+        text = "".join(rnd.choice(alphabet) for _ in range(rnd.randint(0, 300)))
+        max_width = rnd.uniform(1, 300)
+        font, size = rnd.choice(FONTS)
+        assert wrap_text_by_width(text, font, size, max_width) == \
+            canvas_wrap_text_by_width(c, text, font, size, max_width)
+
+
+def test_width_matches_canvas_exactly(c):
+    # lines that exactly fill max_width must not wrap differently
+    for text in ("Job history: Team Rocket", "iiiiWWWW", "Καλημέρα ✓"):
+        c.setFont("Helvetica", 10)
+        width = c.stringWidth(text)
+        assert string_width(text, "Helvetica", 10) == width
+        for max_width in (width, c.stringWidth(text + " "), c.stringWidth("Job history: ")):
+            assert wrap_text_by_width(text, "Helvetica", 10, max_width) == \
+                canvas_wrap_text_by_width(c, text, "Helvetica", 10, max_width)
@@ -0,0 +1,92 @@
+import pytest
+
+import cv_routes
+from cv_cache import CVCache
+from cv_routes import VALIDATORS
+
+
+@pytest.fixture
+def form():
+    return {
+        "name": "George", "surname": "Jordan", "birthdate": "25/12/1990",
+        "degree": "  BSc Computer Science ", "job_count": "3", "phone": "+35799123456",
+        "email": "george.jordan@example.com", "skill_count": "5",
+        "portfolio": "https://github.com/georgejordan", "english_level": "B2",
+        "job_history": "", "skill_history": "",
+    }
+
+
+def test_whole_form_in_one_request(client, form):
+    res = client.post("/validate/batch", json={"values": form})
+    body = res.get_json()
+
+    assert res.status_code == 200
+    assert body["ok"] is True
+    assert set(body["results"]) == set(VALIDATORS)
+    assert body["results"]["degree"] == {"ok": True, "value": "BSc Computer Science"}
+
+
+def test_results_match_single_field_validate(client, form):
+    form.update(email="not-an-email", phone="12ab")
+    batch = client.post("/validate/batch", json={"values": form}).get_json()
+
+    assert batch["ok"] is False
+    for field, value in form.items():
+        single = client.post("/validate", json={"field": field, "value": value}).get_json()
+        assert batch["results"][field] == single
+
+
+def test_missing_fields_are_checked_as_empty(client):
+    body = client.post("/validate/batch", json={"values": {"name": "George"}}).get_json()
+
+    assert body["ok"] is False
+    assert body["results"]["name"]["ok"] is True
+    assert body["results"]["email"]["ok"] is False
+
+
+def test_only_changed_checks_just_the_sent_fields(client):
+    body = client.post("/validate/batch", json={
+        "values": {"email": "george.jordan@example.com", "colour": "red"}, "only_changed": True,
+    }).get_json()
+
+    assert set(body["results"]) == {"email", "colour"}
+    assert body["results"]["email"]["ok"] is True
+    assert body["results"]["colour"] == {"ok": False, "error": "unknown field: colour"}
+
+
+@pytest.mark.parametrize("payload", [None, [], {"values": "name=George"}])
+def test_bad_payload(client, payload):
+    assert client.post("/validate/batch", json=payload).status_code == 400
+
+
+def test_generate_cv_validates_first(client, form, monkeypatch):
+    rendered = []
+    monkeypatch.setattr(cv_routes, "get_cv_cache", CVCache)
+    monkeypatch.setattr(cv_routes, "render_cv", lambda data: rendered.append(data) or b"%PDF-")
+
+    res = client.post("/generate-cv", json=dict(form, email="nope"))
+    assert res.status_code == 400
+    assert set(res.get_json()["errors"]) == {"email"}
+    assert rendered == []
+
+    assert client.post("/generate-cv", json=form).status_code == 200
+    # rendered from the cleaned values
+    assert rendered[0]["degree"] == "BSc Computer Science"
+
+
+def test_every_route_validates_through_validate_many(client, form, monkeypatch):
+    calls = []
+    validate_many = cv_routes.validate_many
+
+    def recording(records, fields=None):
+        calls.append(fields)
+        return validate_many(records, fields)
+    monkeypatch.setattr(cv_routes, "validate_many", recording)
+    monkeypatch.setattr(cv_routes, "render_cv", lambda data: b"%PDF-")
+    monkeypatch.setattr(cv_routes, "get_cv_cache", CVCache)
+
+    client.post("/validate", json={"field": "email", "value": "nope"})
+    client.post("/validate/batch", json={"values": form})
+    client.post("/generate-cv", json=form)
+
+    assert calls == [["email"], list(VALIDATORS), None]
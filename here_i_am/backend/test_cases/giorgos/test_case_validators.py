@@ -0,0 +1,41 @@
+from datetime import date
+
+import pytest
+
+from benchmarks.bench_validators import LEGACY_VALIDATORS, legacy_validate_many, make_records
+from cvprogram import VALIDATORS, validate_birthdate, validate_many
+
+
+TRICKY = [
+    "", " ", "\n", "\t  ", "George", " George ", "Mary  Ann", "Ελένη", "中文", "R2D2", "O'Neil", "x²", "Jo\n",
+    "25/12/1990", " 1/2/2000", "01/02/2000 ", "1/ 2/2000", "31/04/1999", "29/02/2000", "29/02/2001",
+    "30/2/1990", "01/01/0000", "01/13/1990", "00/01/1990", "1/1/20000", "1/1/99", "2000-01-01", "01/01/2999",
+    "١/١/٢٠٠٠", "3", "10", "11", "20", "21", "-1", "007", "+35799123456", "+", "++35799123456",
+    "99 123 456", "george.jordan@example.com", "a@b.c", "a@b.co\n", "ΑΒ@example.com", "https://x", "http://",
+    "ftp://x", "HTTPS://X", "b2", "C2 ", "UPPER-INTERMEDIATE", "native speaker", "abcd", "abcde",
+]
+
+
+@pytest.mark.parametrize("field", sorted(VALIDATORS))
+def test_same_results_as_the_old_validators(field):
+    for value in TRICKY:
+        assert VALIDATORS[field](value) == LEGACY_VALIDATORS[field](value), (field, value)
+
+
+def test_validate_many_matches_field_by_field():
+    records = make_records(2000, seed=3)
+    # missing and None values count as ""
+    records.append({"name": None, "job_count": 3})
+    assert list(validate_many(records)) == list(legacy_validate_many(records))
+
+
+def test_validate_many_only_some_fields():
+    [(clean, errors)] = validate_many([{"email": " a@b.co ", "name": "R2D2"}], fields=["email", "phone"])
+    assert clean == {"email": "a@b.co"}
+    assert errors == {"phone": "error: phone number can't be empty"}
+
+
+def test_future_birthdate_against_today():
+    assert validate_birthdate("02/01/2020", today=date(2020, 1, 1)) == "error: birthday cannot be in the future"
+    assert validate_birthdate("01/01/2020", today=date(2020, 1, 1)) == "01/01/2020"
+
@@ -0,0 +1,141 @@
+import sys
+import os
+import hashlib
+import io
+import sqlite3
+import time
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../../")))
+
+import pytest
+from werkzeug.datastructures import FileStorage
+
+import upload_services
+from blob_store import BlobNotFound, FileBlobStore
+from db_pool import get_pool
+from migrations import LATEST_VERSION, migrate, move_blobs, gc_blobs
+
+
+@pytest.fixture
+def store(tmp_path):
+    return FileBlobStore(tmp_path / "blobs", chunk_size=4)
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    path = str(tmp_path / "uploads.db")
+    migrate(path)
+    monkeypatch.setattr(upload_services, "DB_PATH", path)
+    yield path
+    get_pool(path).close_all()
+
+
+def test_put_streams_and_hashes(store):
+    data = b"Here I Am attachment"
+    sha256, size = store.put(io.BytesIO(data))
+
+    assert sha256 == hashlib.sha256(data).hexdigest()
+    assert size == len(data)
+    with store.open(sha256) as f:
+        assert f.read() == data
+    # stored under <root>/ab/cd/<hash>
+    assert store.path(sha256).endswith(os.path.join(sha256[:2], sha256[2:4], sha256))
+
+
+def test_identical_files_are_stored_once(store):
+    first, _ = store.put(io.BytesIO(b"same bytes"))
+    second, _ = store.put(io.BytesIO(b"same bytes"))
+
+    assert first == second
+    assert list(store.hashes()) == [first]
+    assert os.listdir(store.tmp_dir) == []
+
+
+def test_missing_blob(store):
+    with pytest.raises(BlobNotFound):
+        store.open("0" * 64)
+    with pytest.raises(BlobNotFound):
+        store.open("../../etc/passwd")
+
+
+def test_migrate_sets_user_version(db):
+    conn = sqlite3.connect(db)
+    assert conn.execute("PRAGMA user_version").fetchone()[0] == LATEST_VERSION
+    conn.close()
+    # running it again does nothing
+    assert migrate(db) == []
+
+
+def test_save_file_keeps_only_metadata(db, store):
+    upload = FileStorage(stream=io.BytesIO(b"%PDF-1.4 notes"), filename="notes.pdf",
+                         content_type="application/pdf")
+
+    upload_services.save_file(upload, 1, 7, store=store)
+
+    conn = sqlite3.connect(db)
+    row = conn.execute(
+        "SELECT filename, filedata, event_id, sha256, size, content_type FROM uploads").fetchone()
+    conn.close()
+    assert row[0] == "notes.pdf"
+    assert row[1] is None
+    assert row[2] == 7
+    assert row[3] == hashlib.sha256(b"%PDF-1.4 notes").hexdigest()
+    assert row[4] == 14
+    assert row[5] == "application/pdf"
+    assert store.exists(row[3])
+
+
+def test_move_blobs_moves_old_rows(db, store):
+    conn = sqlite3.connect(db)
+    conn.executemany(
+        "INSERT INTO uploads (filename, filedata, user_id, event_id) VALUES (?, ?, 1, ?)",
+        [("a.txt", b"first file", 1), ("b.txt", b"second file", 2), ("c.txt", b"first file", 3)]
+    )
+    conn.commit()
+    conn.close()
+
+    assert move_blobs(db, store=store, batch_size=2) == 3
+
+    conn = sqlite3.connect(db)
+    rows = conn.execute("SELECT filedata, sha256, size FROM uploads ORDER BY id").fetchall()
+    conn.close()
+    assert all(row[0] is None for row in rows)
+    assert rows[0][1] == rows[2][1] == hashlib.sha256(b"first file").hexdigest()
+    assert rows[1][2] == len(b"second file")
+    assert len(list(store.hashes())) == 2
+
+    # nothing left to move the second time
+    assert move_blobs(db, store=store) == 0
+
+
+def stored_hours_ago(store, sha256, hours):
+    then = time.time() - hours * 3600
+    os.utime(store.path(sha256), (then, then))
+
+
+def test_gc_removes_unreferenced_blobs(db, store):
+    kept, _ = store.put(io.BytesIO(b"still used"))
+    deleted, _ = store.put(io.BytesIO(b"event was deleted"))
+    stored_hours_ago(store, kept, 2)
+    stored_hours_ago(store, deleted, 2)
+    conn = sqlite3.connect(db)
+    conn.execute("INSERT INTO uploads (filename, sha256) VALUES ('kept.txt', ?)", (kept,))
+    conn.commit()
+    conn.close()
+
+    assert gc_blobs(db, store=store) == 1
+    assert list(store.hashes()) == [kept]
+
+
+def test_gc_keeps_blobs_of_uploads_in_progress(db, store):
+    # stored, uploads row not committed yet
+    new, _ = store.put(io.BytesIO(b"upload in progress"))
+    # old and unused, but just uploaded again
+    again, _ = store.put(io.BytesIO(b"uploaded again"))
+    stored_hours_ago(store, again, 2)
+    store.put(io.BytesIO(b"uploaded again"))
+
+    assert gc_blobs(db, store=store, grace=3600) == 0
+    assert sorted(store.hashes()) == sorted([new, again])
+
+    assert gc_blobs(db, store=store, grace=3600, now=time.time() + 7200) == 2
+    assert list(store.hashes()) == []
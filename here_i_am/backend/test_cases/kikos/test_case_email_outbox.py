@@ -0,0 +1,176 @@
+import socket
+import smtplib
+import time
+
+import pytest
+import yagmail
+
+controller_module = pytest.importorskip("aiosmtpd.controller")
+
+import email_outbox
+from db_pool import get_db_connection
+from email_services import SENDER, SMTPSession
+from email_outbox import OutboxWorker
+
+
+class RecordingHandler:
+    """Local stand-in for Gmail: keeps every message and counts connections."""
+
+    def __init__(self):
+        self.messages = []
+        self.connections = 0
+
+    async def handle_EHLO(self, server, session, envelope, hostname, responses):
+        self.connections += 1
+        session.host_name = hostname
+        return responses
+
+    async def handle_DATA(self, server, session, envelope):
+        self.messages.append((envelope.rcpt_tos, envelope.content.decode("utf8", "replace")))
+        return "250 Message accepted for delivery"
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+@pytest.fixture
+def smtp_server():
+    handler = RecordingHandler()
+    controller = controller_module.Controller(handler, hostname="127.0.0.1", port=free_port())
+    controller.start()
+    yield handler, controller.port
+    controller.stop()
+
+
+@pytest.fixture
+def worker(app_module, smtp_server):
+    handler, port = smtp_server
+
+    def local_session():
+        return SMTPSession(yagmail.SMTP(SENDER, host="127.0.0.1", port=port, smtp_ssl=False,
+                                        smtp_starttls=False, smtp_skip_login=True))
+
+    return OutboxWorker(app_module.DB_PATH, session_factory=local_session, batch_size=10)
+
+
+def outbox_rows():
+    conn = get_db_connection()
+    rows = conn.execute("SELECT * FROM email_outbox ORDER BY id").fetchall()
+    conn.close()
+    return rows
+
+
+def register(client, n):
+    return client.post("/register", json={
+        "name": "Ash", "surname": "Ketchum", "username": f"ash{n}",
+        "email": f"ash{n}@pallet.town", "password": "pikachu",
+    })
+
+
+def test_register_queues_email_instead_of_sending(client, smtp_server):
+    handler, _ = smtp_server
+
+    res = register(client, 1)
+
+    assert res.status_code == 201
+    rows = outbox_rows()
+    assert len(rows) == 1
+    assert rows[0]["kind"] == "sign_up"
+    assert rows[0]["to_email"] == "ash1@pallet.town"
+    assert rows[0]["status"] == "pending"
+    assert handler.messages == []
+
+
+def test_create_event_queues_email(client, user_id):
+    res = client.post("/events", json={"title": "Battle", "date": "2025-01-01"})
+
+    assert res.status_code == 201
+    rows = outbox_rows()
+    assert [r["kind"] for r in rows] == ["event_creation"]
+    assert "Battle" in rows[0]["subject"]
+
+
+def test_batch_is_sent_over_one_connection(client, worker, smtp_server):
+    handler, _ = smtp_server
+    for n in range(5):
+        register(client, n)
+
+    assert worker.run_once() == 5
+
+    assert len(handler.messages) == 5
+    assert handler.connections == 1
+    assert {r["status"] for r in outbox_rows()} == {"sent"}
+    assert worker.stats["sent"] == 5
+
+
+class BrokenSession:
+    def __enter__(self):
+        raise smtplib.SMTPConnectError(421, "try again later")
+
+    def __exit__(self, *exc):
+        return False
+
+
+def test_failed_email_is_retried_with_backoff(client, app_module):
+    register(client, 1)
+    worker = OutboxWorker(app_module.DB_PATH, session_factory=BrokenSession, max_attempts=3)
+    now = time.time()
+
+    worker.run_once(now)
+    row = outbox_rows()[0]
+    assert row["status"] == "pending"
+    assert row["attempts"] == 1
+    assert row["next_attempt_at"] == pytest.approx(now + email_outbox.BACKOFF)
+    assert "try again later" in row["last_error"]
+
+    # not due yet
+    assert worker.run_once(now + 1) == 0
+
+    worker.run_once(now + email_outbox.BACKOFF + 1)
+    row = outbox_rows()[0]
+    assert row["attempts"] == 2
+    assert row["next_attempt_at"] == pytest.approx(now + email_outbox.BACKOFF + 1 + 2 * email_outbox.BACKOFF)
+
+    worker.run_once(now + 10 * email_outbox.BACKOFF)
+    assert outbox_rows()[0]["status"] == "dead"
+    assert worker.stats["dead"] == 1
+
+
+def test_refused_address_goes_straight_to_dead_letters(client, app_module):
+    class RefusingSession:
+        def __enter__(self):
+            return self
+
+        def send(self, to, subject, contents):
+            raise smtplib.SMTPRecipientsRefused({to: (550, b"no such user")})
+
+        def __exit__(self, *exc):
+            return False
+
+    register(client, 1)
+    OutboxWorker(app_module.DB_PATH, session_factory=RefusingSession).run_once()
+
+    row = outbox_rows()[0]
+    assert row["status"] == "dead"
+    assert row["attempts"] == 1
+
+
+def test_background_worker_drains_outbox(client, worker, smtp_server):
+    handler, _ = smtp_server
+    worker.poll_interval = 0.05
+    worker.start()
+    try:
+        register(client, 1)
+        worker.wake()
+        deadline = time.time() + 5
+        while not handler.messages and time.time() < deadline:
+            time.sleep(0.02)
+    finally:
+        worker.stop()
+
+    assert len(handler.messages) == 1
+    assert handler.messages[0][0] == ["ash1@pallet.town"]
+    assert outbox_rows()[0]["status"] == "sent"
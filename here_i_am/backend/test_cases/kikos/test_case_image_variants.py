@@ -0,0 +1,114 @@
+import io
+import os
+import time
+
+import pytest
+from PIL import Image
+
+import cv_routes
+import image_variants
+from image_variants import best_variant, make_variants, variants
+
+
+def picture_bytes(size=(1200, 800), mode="RGB", fmt="JPEG"):
+    buf = io.BytesIO()
+    Image.new(mode, size, "blue").save(buf, fmt)
+    return buf.getvalue()
+
+
+@pytest.fixture
+def photo(tmp_path):
+    path = tmp_path / "photo.jpg"
+    path.write_bytes(picture_bytes())
+    return str(path)
+
+
+def test_variants_have_requested_shorter_side(photo):
+    made = make_variants(photo, (64, 256))
+
+    assert sorted(made) == [64, 256]
+    with Image.open(made[256]) as img:
+        assert img.size == (384, 256)
+    with Image.open(made[64]) as img:
+        assert img.size == (96, 64)
+    assert os.path.getsize(made[256]) < os.path.getsize(photo)
+
+
+def test_small_picture_is_not_upscaled(tmp_path):
+    path = tmp_path / "tiny.png"
+    path.write_bytes(picture_bytes((100, 50), fmt="PNG"))
+
+    assert make_variants(str(path), (64, 256)) == {}
+    assert best_variant(str(path), 256) == str(path)
+
+
+def test_transparent_picture_stays_png(tmp_path):
+    path = tmp_path / "logo.png"
+    path.write_bytes(picture_bytes((600, 600), mode="RGBA", fmt="PNG"))
+
+    made = make_variants(str(path), (160,))
+    assert made[160].endswith(".png")
+
+
+def test_best_variant_picks_smallest_big_enough(photo):
+    made = make_variants(photo, (64, 256))
+
+    assert best_variant(photo, 50) == made[64]
+    assert best_variant(photo, 64) == made[64]
+    assert best_variant(photo, 65) == made[256]
+    assert best_variant(photo, 1000) == photo
+
+
+def test_replaced_picture_ignores_old_variants(photo):
+    make_variants(photo, (64,))
+    later = time.time() + 10
+    os.utime(photo, (later, later))
+
+    assert variants(photo) == {}
+    assert best_variant(photo, 64) == photo
+
+
+def test_profile_upload_makes_variants(client, app_module, user_id, tmp_path, monkeypatch):
+    monkeypatch.setattr(app_module, "PICTURES_FOLDER", str(tmp_path))
+
+    res = client.post(f"/users/{user_id}/profile-picture", data={
+        "profile_picture": (io.BytesIO(picture_bytes()), "me.jpg"),
+    }, content_type="multipart/form-data")
+
+    assert res.status_code == 200
+    url = res.get_json()["profile_picture"]
+    assert url.endswith("?size=256")
+    name = url.rsplit("/", 1)[1].split("?")[0]
+
+    small = client.get(f"/pictures/{name}?size=64")
+    with Image.open(io.BytesIO(small.data)) as img:
+        assert min(img.size) == 64
+    original = client.get(f"/pictures/{name}")
+    assert len(original.data) > len(small.data)
+
+
+def test_picture_size_for_missing_file(client):
+    assert client.get("/pictures/nobody.jpg?size=64").status_code == 404
+    assert client.get("/pictures/..%2Fapp.py?size=64").status_code == 404
+
+
+def test_cv_upload_makes_avatar_variant(client, tmp_path, monkeypatch):
+    monkeypatch.setattr(cv_routes, "UPLOAD_FOLDER", str(tmp_path))
+
+    res = client.post("/upload-picture", data={"file": (io.BytesIO(picture_bytes()), "wallpaper.jpg")},
+                      content_type="multipart/form-data")
+
+    path = res.get_json()["path"]
+    assert best_variant(path, 160) != path
+
+
+def test_cv_embeds_small_variant(client, tmp_path):
+    big = tmp_path / "wallpaper.jpg"
+    Image.effect_noise((2400, 1600), 80).convert("RGB").save(big, "JPEG", quality=95)
+    data = {"name": "George", "surname": "Jordan", "picture_path": str(big)}
+
+    full = cv_routes.render_cv(data)
+    make_variants(str(big), image_variants.CV_SIZES)
+    small = cv_routes.render_cv(data)
+
+    assert len(small) * 10 < len(full)
@@ -0,0 +1,114 @@
+import hashlib
+import io
+import os
+
+import pytest
+from PIL import Image
+
+import upload_services
+from upload_services import PictureCache
+
+
+def jpeg(color="blue", size=(800, 600)):
+    buf = io.BytesIO()
+    Image.new("RGB", size, color).save(buf, "JPEG")
+    return buf.getvalue()
+
+
+@pytest.fixture
+def pictures(app_module, tmp_path, monkeypatch):
+    monkeypatch.setattr(app_module, "PICTURES_FOLDER", str(tmp_path))
+    monkeypatch.setattr(upload_services, "picture_cache", PictureCache())
+    return tmp_path
+
+
+def upload(client, user_id, data, name="me.jpg"):
+    res = client.post(f"/users/{user_id}/profile-picture", data={
+        "profile_picture": (io.BytesIO(data), name),
+    }, content_type="multipart/form-data")
+    assert res.status_code == 200
+    return res.get_json()["profile_picture"].split("/pictures/", 1)[1]
+
+
+def test_picture_name_is_content_hashed(client, user_id, pictures):
+    data = jpeg()
+    path = upload(client, user_id, data)
+
+    name = path.split("?")[0]
+    assert name == f"user_{user_id}-{hashlib.sha256(data).hexdigest()[:16]}.jpg"
+    assert client.get(f"/users/{user_id}").get_json()["profile_picture"] \
+        .endswith(path)
+
+
+def test_new_picture_gets_new_url_and_old_one_is_removed(client, user_id, pictures):
+    first = upload(client, user_id, jpeg("blue")).split("?")[0]
+    second = upload(client, user_id, jpeg("red")).split("?")[0]
+
+    assert first != second
+    assert sorted(os.listdir(pictures)) == [second]
+    assert client.get(f"/pictures/{first}").status_code == 404
+
+
+def test_hashed_picture_is_immutable(client, user_id, pictures):
+    path = upload(client, user_id, jpeg())
+
+    res = client.get(f"/pictures/{path}")
+
+    assert res.status_code == 200
+    assert res.cache_control.immutable
+    assert res.cache_control.public
+    assert res.cache_control.max_age == upload_services.PICTURE_MAX_AGE
+    etag, weak = res.get_etag()
+    assert etag and not weak
+    assert client.get(f"/pictures/{path}", headers={"If-None-Match": f'"{etag}"'}).status_code == 304
+
+
+def test_old_style_name_is_revalidated(client, pictures):
+    (pictures / "user_1.jpg").write_bytes(jpeg())
+
+    res = client.get("/pictures/user_1.jpg")
+
+    assert res.cache_control.no_cache
+    assert not res.cache_control.immutable
+    etag, _ = res.get_etag()
+    assert etag == hashlib.sha256(jpeg()).hexdigest()
+    assert client.get("/pictures/user_1.jpg", headers={"If-None-Match": f'"{etag}"'}).status_code == 304
+
+
+def test_small_pictures_served_from_memory(client, user_id, pictures):
+    path = upload(client, user_id, jpeg(size=(2000, 1500)))
+
+    first = client.get(f"/pictures/{path}")
+    second = client.get(f"/pictures/{path}")
+
+    assert first.data == second.data
+    assert upload_services.picture_cache.stats == {"hits": 1, "misses": 1}
+
+
+def test_cache_notices_changed_file(tmp_path):
+    cache = PictureCache()
+    path = tmp_path / "p.jpg"
+    path.write_bytes(b"one")
+    assert cache.lookup(str(path))[1] == b"one"
+
+    path.write_bytes(b"other")
+    assert cache.lookup(str(path))[1] == b"other"
+
+
+def test_big_files_only_keep_etag(tmp_path):
+    cache = PictureCache(max_item=4)
+    path = tmp_path / "big.jpg"
+    path.write_bytes(b"0123456789")
+
+    etag, data = cache.lookup(str(path))
+    assert data is None
+    assert etag == hashlib.sha256(b"0123456789").hexdigest()
+
+
+def test_cache_evicts_past_byte_limit(tmp_path):
+    cache = PictureCache(max_bytes=10)
+    for name in "abc":
+        (tmp_path / name).write_bytes(b"12345")
+        cache.lookup(str(tmp_path / name))
+
+    assert list(cache._entries) == [str(tmp_path / "b"), str(tmp_path / "c")]
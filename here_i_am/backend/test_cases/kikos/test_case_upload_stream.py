@@ -0,0 +1,129 @@
+import hashlib
+import io
+import os
+import sqlite3
+
+import pytest
+from werkzeug.datastructures import FileStorage
+
+import upload_services
+import upload_stream
+from blob_store import FileBlobStore
+from db_pool import get_pool
+from migrations import migrate
+from upload_stream import UploadSpool, sniff_type
+
+PNG = b"\x89PNG\r\n\x1a\n" + b"\x00" * 24
+
+
+@pytest.fixture
+def store(tmp_path):
+    return FileBlobStore(tmp_path / "blobs", chunk_size=4)
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    path = str(tmp_path / "uploads.db")
+    migrate(path)
+    monkeypatch.setattr(upload_services, "DB_PATH", path)
+    yield path
+    get_pool(path).close_all()
+
+
+def fill(spool, data, piece=7):
+    for i in range(0, len(data), piece):
+        spool.write(data[i:i + piece])
+    spool.seek(0)
+
+
+def test_small_upload_stays_in_memory(tmp_path):
+    spool = UploadSpool(threshold=100, spool_dir=str(tmp_path))
+    fill(spool, PNG)
+
+    assert not spool.on_disk
+    assert spool.take_file() is None
+    assert spool.read() == PNG
+    assert spool.sha256 == hashlib.sha256(PNG).hexdigest()
+    assert spool.sniffed_type == "image/png"
+    assert os.listdir(tmp_path) == []
+
+
+def test_big_upload_rolls_over_to_disk(tmp_path):
+    data = os.urandom(1000)
+    spool = UploadSpool(threshold=100, spool_dir=str(tmp_path))
+    fill(spool, data)
+
+    assert spool.on_disk
+    assert spool.size == len(data)
+    assert spool.sha256 == hashlib.sha256(data).hexdigest()
+    assert spool.read() == data
+
+    # closing without handing the file over cleans it up
+    spool.close()
+    assert os.listdir(tmp_path) == []
+
+
+def test_sniff_type():
+    assert sniff_type(b"\xff\xd8\xff\xe0rest") == "image/jpeg"
+    assert sniff_type(b"%PDF-1.7") == "application/pdf"
+    assert sniff_type(b"RIFF\x00\x00\x00\x00WEBPVP8 ") == "image/webp"
+    assert sniff_type(b"just some text") is None
+
+
+def test_spooled_file_is_renamed_into_the_store(db, store, tmp_path):
+    data = os.urandom(1000)
+    # same file system as the store, like SPOOL_DIR next to the blob tmp dir
+    spool = UploadSpool(threshold=100, spool_dir=store.tmp_dir)
+    fill(spool, b"%PDF-" + data)
+    spooled_inode = os.stat(spool.path).st_ino
+
+    upload = FileStorage(stream=spool, filename="report.pdf", content_type="application/octet-stream")
+    upload_services.save_file(upload, 1, 7, store=store)
+
+    sha256 = hashlib.sha256(b"%PDF-" + data).hexdigest()
+    assert os.stat(store.path(sha256)).st_ino == spooled_inode
+    assert os.listdir(store.tmp_dir) == []
+    row = sqlite3.connect(db).execute("SELECT sha256, size, content_type FROM uploads").fetchone()
+    assert row == (sha256, len(data) + 5, "application/pdf")
+
+
+def test_duplicate_spooled_file_is_dropped(store):
+    data = os.urandom(300)
+    first, _ = store.put(io.BytesIO(data))
+
+    spool = UploadSpool(threshold=100, spool_dir=store.tmp_dir)
+    fill(spool, data)
+    assert store.put_file(spool.take_file(), spool.sha256, spool.size) == (first, len(data))
+    assert os.listdir(store.tmp_dir) == []
+
+
+def test_oversized_event_upload_is_refused(client, user_id):
+    # refused from the Content-Length alone, the body is never read
+    limit = upload_stream.EVENT_FILE_LIMIT
+    res = client.post("/events", data=b"x", content_type="multipart/form-data; boundary=xyz",
+                      environ_overrides={"CONTENT_LENGTH": str(limit + 1)})
+    assert res.status_code == 413
+    assert res.get_json()["ok"] is False
+
+
+def test_oversized_picture_is_refused(client, user_id):
+    big = PNG + b"\x00" * upload_stream.PICTURE_LIMIT
+    res = client.post(f"/users/{user_id}/profile-picture", data={
+        "profile_picture": (io.BytesIO(big), "me.png"),
+    }, content_type="multipart/form-data")
+    assert res.status_code == 413
+
+    res = client.post("/upload-picture", data={"file": (io.BytesIO(big), "me.png")},
+                      content_type="multipart/form-data")
+    assert res.status_code == 413
+
+
+def test_picture_must_really_be_an_image(client, user_id):
+    res = client.post(f"/users/{user_id}/profile-picture", data={
+        "profile_picture": (io.BytesIO(b"<script>alert(1)</script>"), "me.png"),
+    }, content_type="multipart/form-data")
+    assert res.status_code == 400
+
+    res = client.post("/upload-picture", data={"file": (io.BytesIO(b"MZ\x90\x00"), "me.jpg")},
+                      content_type="multipart/form-data")
+    assert res.status_code == 400
@@ -0,0 +1,95 @@
+import io
+import os
+import subprocess
+import sys
+
+import pytest
+
+import auth
+
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+
+
+@pytest.fixture
+def token(client, user_id):
+    res = client.post("/login", json={"credential": "TR_Meowth", "password": "JessieJamesMeowth"})
+    return res.get_json()["token"]
+
+
+@pytest.fixture
+def anonymous(app_module):
+    """A client that sends no token (the `client` fixture is logged in as user_id)."""
+    return app_module.app.test_client()
+
+
+def bearer(token):
+    return {"Authorization": f"Bearer {token}"}
+
+
+def test_login_token_is_enough(anonymous, user_id, token):
+    res = anonymous.get(f"/users/{user_id}", headers=bearer(token))
+    assert res.status_code == 200
+    assert res.get_json()["username"] == "TR_Meowth"
+
+    res = anonymous.post("/events", json={"title": "Heist", "date": "2025-01-01", "time": "10:00"},
+                         headers=bearer(token))
+    assert res.status_code == 201
+    assert res.get_json()["user_id"] == user_id
+    assert [e["title"] for e in anonymous.get("/history", headers=bearer(token)).get_json()] == ["Heist"]
+
+
+def test_token_only_opens_its_own_user(client, user_id, token):
+    assert client.get(f"/users/{user_id + 1}", headers=bearer(token)).status_code == 403
+    # naming someone else next to the token doesn't work either
+    assert client.get(f"/history?user_id={user_id + 1}", headers=bearer(token)).status_code == 403
+
+
+@pytest.mark.parametrize("bad", ["nonsense", "eyJ1aWQiOjF9.AAAA.BBBB"])
+def test_bad_token_is_refused(client, user_id, bad):
+    # even when the old parameter would have let the request in
+    res = client.get(f"/users/{user_id}?authenticated_user_id={user_id}", headers=bearer(bad))
+    assert res.status_code == 401
+
+
+def test_expired_token(client, user_id, token, monkeypatch):
+    monkeypatch.setattr(auth, "TOKEN_MAX_AGE", -1)
+    res = client.get(f"/users/{user_id}", headers=bearer(token))
+    assert res.status_code == 401
+    assert "expired" in res.get_json()["error"]
+
+
+def test_the_id_alone_is_not_enough(anonymous, user_id, token):
+    assert auth.LEGACY_AUTH is False
+    assert anonymous.get(f"/history?user_id={user_id}").status_code == 401
+    assert anonymous.get(f"/users/{user_id}?authenticated_user_id={user_id}").status_code == 401
+    assert anonymous.get(f"/history?user_id={user_id}", headers=bearer(token)).status_code == 200
+
+
+def test_legacy_auth_believes_the_id(anonymous, user_id, legacy_auth):
+    assert anonymous.get(f"/history?user_id={user_id}").status_code == 200
+    assert anonymous.get(f"/users/{user_id}?authenticated_user_id={user_id}").status_code == 200
+
+
+def test_legacy_auth_is_off_by_default():
+    script = "import auth; print(auth.LEGACY_AUTH)"
+    env = {k: v for k, v in os.environ.items() if k != "HEREIAM_LEGACY_AUTH"}
+    out = subprocess.run([sys.executable, "-c", script], cwd=BACKEND_DIR, env=env,
+                         capture_output=True, text=True, timeout=60)
+    assert out.stdout.strip() == "False"
+
+
+def test_token_in_query_for_download_links(anonymous, user_id, token):
+    res = anonymous.post("/events", data={
+        "title": "Plan", "date": "2025-01-01",
+        "file": (io.BytesIO(b"meowth"), "plan.txt"),
+    }, content_type="multipart/form-data", headers=bearer(token))
+    event_id = res.get_json()["id"]
+
+    res = anonymous.get(f"/events/{event_id}/file?token={token}")
+    assert res.status_code == 200
+    assert res.data == b"meowth"
+
+
+def test_token_in_query_only_on_download_links(anonymous, user_id, token):
+    assert anonymous.get(f"/history?token={token}").status_code == 401
+    assert anonymous.get(f"/users/{user_id}?token={token}").status_code == 401
@@ -0,0 +1,65 @@
+import pytest
+import yagmail
+
+from benchmarks.bench_api import SCENARIOS, compare, flask_sender, percentile, run_scenario, seed, start_smtp_stub
+from db_pool import get_db_connection
+from email_services import SENDER, SMTPSession
+
+
+@pytest.fixture
+def seeded(app_module):
+    return seed(app_module.DB_PATH, users=3, events=5, uploads=4, upload_size=1024)
+
+
+def count(table):
+    conn = get_db_connection()
+    n = conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+    conn.close()
+    return n
+
+
+def test_seed_fills_every_table(seeded):
+    assert [username for _, username, _ in seeded] == ["bench0", "bench1", "bench2"]
+    assert (count("users"), count("events"), count("uploads")) == (3, 15, 4)
+
+
+@pytest.mark.parametrize("name", sorted(SCENARIOS))
+def test_every_scenario_runs_without_errors(app_module, seeded, name):
+    stats = run_scenario(SCENARIOS[name], lambda: flask_sender(app_module.app), seeded, clients=2, requests=3)
+
+    assert stats["requests"] == 6
+    assert stats["errors"] == 0
+    assert 0 < stats["p50_ms"] <= stats["p95_ms"] <= stats["p99_ms"]
+
+
+def test_smtp_stub_accepts_mail():
+    smtp, server = start_smtp_stub()
+    try:
+        client = yagmail.SMTP(SENDER, host="127.0.0.1", port=server.port, smtp_ssl=False,
+                              smtp_starttls=False, smtp_skip_login=True)
+        with SMTPSession(client) as session:
+            session.send("ash@pallet.town", "hi", "one")
+            session.send("misty@cerulean.city", "hi", "two")
+    finally:
+        server.stop()
+    assert smtp.messages == 2
+
+
+def test_percentile_is_nearest_rank():
+    times = [i / 100 for i in range(1, 101)]
+    assert percentile(times, 50) == 0.5
+    assert percentile(times, 99) == 0.99
+    assert percentile([0.2], 95) == 0.2
+    assert percentile([], 95) == 0.0
+
+
+def test_compare_flags_regressions():
+    old = {"scenarios": {"history": {"p95_ms": 10.0, "rps": 1000.0}, "login": {"p95_ms": 600.0, "rps": 6.0}}}
+    new = {"scenarios": {"history": {"p95_ms": 10.5, "rps": 980.0}, "login": {"p95_ms": 900.0, "rps": 6.0},
+                         "generate_cv": {"p95_ms": 30.0, "rps": 200.0}}}
+
+    lines, regressed = compare(old, new, max_regression=0.2)
+    assert regressed
+    assert "REGRESSED" in lines[1] and "REGRESSED" not in lines[0]
+    assert "not in baseline" in lines[2]
+    assert compare(old, old)[1] is False
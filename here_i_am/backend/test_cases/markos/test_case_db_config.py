@@ -0,0 +1,71 @@
+import sys
+import os
+import sqlite3
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../../")))
+
+import pytest
+
+import db_config
+from db_config import execute_write, run_write
+from db_pool import ConnectionPool
+
+
+@pytest.fixture
+def conn(tmp_path, monkeypatch):
+    monkeypatch.setattr(db_config, "WRITE_BACKOFF", 0.001)
+    pool = ConnectionPool(tmp_path / "config.db", max_size=1)
+    conn = pool.connection()
+    conn.execute("CREATE TABLE items (id INTEGER PRIMARY KEY, name TEXT)")
+    conn.commit()
+    yield conn
+    conn.close()
+    pool.close_all()
+
+
+def test_pragmas_are_applied_on_connect(conn):
+    assert conn.execute("PRAGMA journal_mode").fetchone()[0].lower() == "wal"
+    assert conn.execute("PRAGMA busy_timeout").fetchone()[0] == db_config.PRAGMAS["busy_timeout"]
+    # NORMAL == 1
+    assert conn.execute("PRAGMA synchronous").fetchone()[0] == 1
+
+
+def test_execute_write_commits(conn):
+    cur = execute_write(conn, "INSERT INTO items (name) VALUES (?)", ("Ash",))
+    assert cur.lastrowid == 1
+    assert not conn.in_transaction
+
+
+def test_locked_write_is_retried(conn):
+    calls = []
+
+    def flaky(c):
+        calls.append(1)
+        c.execute("INSERT INTO items (name) VALUES ('Misty')")
+        if len(calls) < 3:
+            raise sqlite3.OperationalError("database is locked")
+
+    run_write(conn, flaky)
+
+    assert len(calls) == 3
+    # the failed attempts were rolled back, only the last insert is kept
+    assert conn.execute("SELECT COUNT(*) FROM items").fetchone()[0] == 1
+
+
+def test_retries_are_bounded(conn):
+    def always_locked(c):
+        raise sqlite3.OperationalError("database is locked")
+
+    with pytest.raises(sqlite3.OperationalError):
+        run_write(conn, always_locked, attempts=2)
+
+
+def test_other_errors_are_not_retried(conn):
+    calls = []
+
+    def broken(c):
+        calls.append(1)
+        c.execute("INSERT INTO missing_table VALUES (1)")
+
+    with pytest.raises(sqlite3.OperationalError):
+        run_write(conn, broken)
+    assert len(calls) == 1
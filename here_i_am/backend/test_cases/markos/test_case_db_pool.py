@@ -0,0 +1,103 @@
+import sys
+import os
+import threading
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../../")))
+
+import pytest
+
+from db_pool import ConnectionPool, PoolTimeout, get_pool
+
+
+@pytest.fixture
+def pool(tmp_path):
+    pool = ConnectionPool(tmp_path / "pool.db", max_size=2, timeout=0.2)
+    conn = pool.connection()
+    conn.execute("CREATE TABLE items (id INTEGER PRIMARY KEY, name TEXT)")
+    conn.commit()
+    conn.close()
+    yield pool
+    pool.close_all()
+
+
+def test_connection_is_reused_after_close(pool):
+    first = pool.connection()
+    raw = first._conn
+    first.close()
+
+    second = pool.connection()
+    assert second._conn is raw
+    second.close()
+
+    stats = pool.stats()
+    assert stats["created"] == 1
+    assert stats["in_use"] == 0
+
+
+def test_same_thread_gets_same_connection(pool):
+    outer = pool.connection()
+    inner = pool.connection()
+    assert inner._conn is outer._conn
+
+    inner.close()
+    # outer still holds it, so it must not be back in the idle list yet
+    assert pool.stats()["in_use"] == 1
+    outer.close()
+    assert pool.stats()["in_use"] == 0
+    assert pool.stats()["reused_in_thread"] == 1
+
+
+def test_rows_behave_like_sqlite_rows(pool):
+    conn = pool.connection()
+    conn.execute("INSERT INTO items (name) VALUES ('Pikachu')")
+    conn.commit()
+    row = conn.execute("SELECT * FROM items").fetchone()
+    conn.close()
+    assert row["name"] == "Pikachu"
+
+
+def test_uncommitted_work_is_rolled_back_on_close(pool):
+    conn = pool.connection()
+    conn.execute("INSERT INTO items (name) VALUES ('Meowth')")
+    conn.close()
+
+    conn = pool.connection()
+    count = conn.execute("SELECT COUNT(*) FROM items").fetchone()[0]
+    conn.close()
+    assert count == 0
+
+
+def test_pool_size_limit_makes_threads_wait(pool):
+    held = []
+    ready = threading.Event()
+    release = threading.Event()
+
+    def hold_connection():
+        conn = pool.connection()
+        held.append(conn)
+        if len(held) == 2:
+            ready.set()
+        release.wait()
+        conn.close()
+
+    workers = [threading.Thread(target=hold_connection) for _ in range(2)]
+    for w in workers:
+        w.start()
+    ready.wait(2)
+
+    with pytest.raises(PoolTimeout):
+        pool.connection()
+
+    release.set()
+    for w in workers:
+        w.join()
+
+    stats = pool.stats()
+    assert stats["idle"] == 2
+    assert stats["waits"] == 1
+    assert stats["timeouts"] == 1
+    assert stats["created"] == 2
+
+
+def test_get_pool_is_keyed_on_absolute_path(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    assert get_pool("shared.db") is get_pool(str(tmp_path / "shared.db"))
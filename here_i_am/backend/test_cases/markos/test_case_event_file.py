@@ -0,0 +1,93 @@
+import io
+import sqlite3
+
+import pytest
+
+import auth
+from db_pool import get_db_connection
+
+DATA = bytes(range(256)) * 40  # 10KB
+
+
+@pytest.fixture
+def event_with_file(client, user_id):
+    res = client.post("/events", data={
+        "title": "Battle Plan",
+        "description": "Steal Pikachu",
+        "date": "2025-01-01",
+        "time": "10:00",
+        "file": (io.BytesIO(DATA), "plan.bin", "application/octet-stream"),
+    }, content_type="multipart/form-data")
+    assert res.status_code == 201
+    return res.get_json()["id"]
+
+
+def test_download_whole_file(client, user_id, event_with_file):
+    res = client.get(f"/events/{event_with_file}/file")
+
+    assert res.status_code == 200
+    assert res.data == DATA
+    assert res.headers["Content-Length"] == str(len(DATA))
+    assert res.headers["Accept-Ranges"] == "bytes"
+    assert "plan.bin" in res.headers["Content-Disposition"]
+    assert res.headers["ETag"]
+
+
+def test_range_request(client, user_id, event_with_file):
+    res = client.get(f"/events/{event_with_file}/file",
+                     headers={"Range": "bytes=100-199"})
+
+    assert res.status_code == 206
+    assert res.data == DATA[100:200]
+    assert res.headers["Content-Range"] == f"bytes 100-199/{len(DATA)}"
+    assert res.headers["Content-Length"] == "100"
+
+
+def test_unsatisfiable_range(client, user_id, event_with_file):
+    res = client.get(f"/events/{event_with_file}/file",
+                     headers={"Range": f"bytes={len(DATA) + 10}-"})
+    assert res.status_code == 416
+
+
+def test_if_none_match_returns_304(client, user_id, event_with_file):
+    url = f"/events/{event_with_file}/file"
+    etag = client.get(url).headers["ETag"]
+
+    res = client.get(url, headers={"If-None-Match": etag})
+    assert res.status_code == 304
+    assert res.data == b""
+
+
+def test_other_user_is_forbidden(client, user_id, event_with_file):
+    res = client.get(f"/events/{event_with_file}/file",
+                     headers={"Authorization": f"Bearer {auth.issue_token(user_id + 1)}"})
+    assert res.status_code == 403
+
+
+def test_event_without_file(client, user_id):
+    res = client.post("/events", json={"title": "No file", "date": "2025-01-02"})
+    event_id = res.get_json()["id"]
+
+    res = client.get(f"/events/{event_id}/file")
+    assert res.status_code == 404
+
+
+def test_legacy_blob_row_is_streamed_from_sqlite(client, user_id):
+    conn = get_db_connection()
+    event_id = conn.execute(
+        "INSERT INTO events (user_id, title, description, start_time_utc, end_time_utc) "
+        "VALUES (?, 'Old', '', '2024-01-01T00:00:00', '2024-01-01T00:00:00')",
+        (user_id,)
+    ).lastrowid
+    conn.execute(
+        "INSERT INTO uploads (filename, filedata, user_id, event_id) VALUES ('old.txt', ?, ?, ?)",
+        (sqlite3.Binary(DATA), user_id, event_id)
+    )
+    conn.commit()
+    conn.close()
+
+    res = client.get(f"/events/{event_id}/file", headers={"Range": "bytes=-16"})
+
+    assert res.status_code == 206
+    assert res.data == DATA[-16:]
+    assert res.headers["Content-Type"].startswith("text/plain")
@@ -0,0 +1,73 @@
+import pytest
+
+import auth
+
+
+@pytest.fixture
+def month(client, user_id):
+    for date, time, title in [
+        ("2025-01-03", "09:00", "Gym"),
+        ("2025-01-03", "18:30", "Battle"),
+        ("2025-01-15", "12:00", "Lunch"),
+        ("2025-02-01", "10:00", "Next month"),
+    ]:
+        client.post("/events", json={"title": title, "date": date, "time": time})
+    return user_id
+
+
+def get_range(client, user_id, **params):
+    query = "&".join(f"{k}={v}" for k, v in params.items())
+    return client.get(f"/events/range?{query}", headers={"Authorization": f"Bearer {auth.issue_token(user_id)}"})
+
+
+def test_events_grouped_by_day(client, month):
+    res = get_range(client, month, **{"from": "2025-01-01", "to": "2025-01-31"})
+
+    assert res.status_code == 200
+    body = res.get_json()
+    assert list(body["days"]) == ["2025-01-03", "2025-01-15"]
+    assert [e["title"] for e in body["days"]["2025-01-03"]] == ["Gym", "Battle"]
+    # same shape as /events?date=
+    assert body["days"]["2025-01-15"][0]["has_file"] == 0
+    assert body["days"]["2025-01-15"][0]["start_time_utc"] == "2025-01-15T12:00:00"
+
+
+def test_matches_per_day_endpoint(client, month):
+    per_day = client.get("/events?date=2025-01-03").get_json()
+    ranged = get_range(client, month, **{"from": "2025-01-03", "to": "2025-01-03"}).get_json()
+
+    assert ranged["days"]["2025-01-03"] == per_day
+
+
+def test_fields_projection(client, month):
+    res = get_range(client, month, **{"from": "2025-01-01", "to": "2025-01-31", "fields": "id,title"})
+
+    events = res.get_json()["days"]["2025-01-03"]
+    assert all(set(e) == {"id", "title"} for e in events)
+
+
+def test_unknown_field_is_rejected(client, month):
+    res = get_range(client, month, **{"from": "2025-01-01", "to": "2025-01-31", "fields": "password"})
+    assert res.status_code == 400
+
+
+def test_counts_mode(client, month):
+    res = get_range(client, month, **{"from": "2025-01-01", "to": "2025-02-28", "mode": "counts"})
+
+    assert res.get_json()["counts"] == {"2025-01-03": 2, "2025-01-15": 1, "2025-02-01": 1}
+
+
+def test_other_users_events_are_not_included(client, month):
+    res = get_range(client, month + 1, **{"from": "2025-01-01", "to": "2025-01-31"})
+    assert res.get_json()["days"] == {}
+
+
+@pytest.mark.parametrize("params", [
+    {"from": "2025-01-31", "to": "2025-01-01"},
+    {"from": "01/01/2025", "to": "2025-01-31"},
+    {"from": "2025-01-01"},
+    {"from": "2025-01-01", "to": "2026-01-01"},
+    {"from": "2025-01-01", "to": "2025-01-31", "mode": "weekly"},
+])
+def test_bad_ranges(client, month, params):
+    assert get_range(client, month, **params).status_code == 400
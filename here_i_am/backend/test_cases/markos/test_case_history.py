@@ -0,0 +1,77 @@
+import json
+
+import pytest
+
+
+@pytest.fixture
+def events(client, user_id):
+    ids = []
+    # two events at the same time so the id part of the cursor matters
+    for date, time, title in [
+        ("2025-01-05", "10:00", "E"), ("2025-01-01", "09:00", "A"), ("2025-01-02", "12:00", "B"),
+        ("2025-01-02", "12:00", "C"), ("2025-01-03", "08:00", "D"),
+    ]:
+        res = client.post("/events", json={"title": title, "date": date, "time": time})
+        ids.append(res.get_json()["id"])
+    return ids
+
+
+def titles(events):
+    return [e["title"] for e in events]
+
+
+def test_without_limit_returns_full_list(client, user_id, events):
+    res = client.get("/history")
+
+    assert res.status_code == 200
+    assert titles(res.get_json()) == ["A", "B", "C", "D", "E"]
+
+
+def test_pages_follow_cursor(client, user_id, events):
+    seen = []
+    url = "/history?limit=2"
+    pages = 0
+    while url:
+        body = client.get(url).get_json()
+        seen += titles(body["events"])
+        pages += 1
+        cursor = body["next_cursor"]
+        url = f"/history?limit=2&cursor={cursor}" if cursor else None
+
+    assert seen == ["A", "B", "C", "D", "E"]
+    assert pages == 3
+
+
+def test_exact_last_page_has_no_cursor(client, user_id, events):
+    body = client.get("/history?limit=5").get_json()
+    assert len(body["events"]) == 5
+    assert body["next_cursor"] is None
+
+
+def test_fields_projection(client, user_id, events):
+    body = client.get("/history?limit=10&fields=id,title").get_json()
+    assert all(set(e) == {"id", "title"} for e in body["events"])
+
+
+def test_ndjson_stream(client, user_id, events):
+    res = client.get("/history?format=ndjson&fields=title,importance")
+
+    assert res.mimetype == "application/x-ndjson"
+    lines = res.get_data(as_text=True).splitlines()
+    assert [json.loads(line) for line in lines] == [
+        {"title": t, "importance": 0} for t in "ABCDE"
+    ]
+
+
+def test_ndjson_from_accept_header(client, user_id, events):
+    res = client.get("/history", headers={"Accept": "application/x-ndjson"})
+    assert len(res.get_data(as_text=True).splitlines()) == 5
+
+
+@pytest.mark.parametrize("query", ["limit=0", "limit=abc", "limit=100000", "cursor=nope", "fields=password"])
+def test_bad_parameters(client, user_id, events, query):
+    assert client.get(f"/history?{query}").status_code == 400
+
+
+def test_missing_user_id(client):
+    assert client.get("/history").status_code == 401
@@ -0,0 +1,140 @@
+import json
+import logging
+import urllib.error
+import urllib.request
+
+import pytest
+
+import cv_routes
+import metrics
+from cv_cache import CVCache
+from email_outbox import OutboxWorker
+from log_config import StructuredFormatter
+from metrics import CV_RENDERS, EMAILS, REQUEST_LATENCY, SLOW_QUERIES, Counter, Histogram, Registry
+
+
+def scrape(client):
+    res = client.get("/metrics")
+    assert res.status_code == 200
+    assert res.mimetype == "text/plain"
+    return res.get_data(as_text=True)
+
+
+def test_requests_are_timed_per_route(client, user_id):
+    before = REQUEST_LATENCY.count(route="/events/<int:event_id>", method="DELETE", status=404)
+    client.delete("/events/424242")
+    client.delete("/events/434343")
+
+    assert REQUEST_LATENCY.count(route="/events/<int:event_id>", method="DELETE", status=404) == before + 2
+    text = scrape(client)
+    assert 'hereiam_http_request_duration_seconds_count{route="/events/<int:event_id>",method="DELETE",status="404"}' in text
+    # the id is not a label
+    assert "424242" not in text
+
+
+def test_slow_queries_are_logged_with_their_sql(client, user_id, monkeypatch, caplog):
+    monkeypatch.setattr(metrics, "SLOW_QUERY_SECONDS", 0)
+    before = SLOW_QUERIES.value(statement="SELECT")
+
+    with caplog.at_level(logging.WARNING, logger="metrics"):
+        client.get("/history")
+
+    slow = [r for r in caplog.records if r.getMessage() == "slow query"]
+    assert any("FROM events" in r.sql for r in slow)
+    assert SLOW_QUERIES.value(statement="SELECT") > before
+    assert metrics.RECENT_SLOW_QUERIES
+
+
+def test_email_and_cv_render_counters(client, app_module, monkeypatch):
+    class OkSession:
+        def __enter__(self):
+            return self
+
+        def send(self, to, subject, contents):
+            return {}
+
+        def __exit__(self, *exc):
+            return False
+
+    sent = EMAILS.value(via="outbox", result="sent")
+    client.post("/register", json={
+        "name": "Jessie", "surname": "Rocket", "username": "TR_Jessie",
+        "email": "jessie@teamrocket.com", "password": "prepare4trouble",
+    })
+    OutboxWorker(app_module.DB_PATH, session_factory=OkSession).run_once()
+    assert EMAILS.value(via="outbox", result="sent") == sent + 1
+
+    monkeypatch.setattr(cv_routes, "get_cv_cache", CVCache)
+    monkeypatch.setattr(cv_routes, "render_cv", lambda data: b"%PDF-")
+    renders = CV_RENDERS.value(mode="single")
+    client.post("/generate-cv", json={
+        "name": "George", "surname": "Jordan", "birthdate": "25/12/1990", "degree": "BSc",
+        "job_count": "3", "phone": "+35799123456", "email": "george.jordan@example.com", "skill_count": "5",
+    })
+    assert CV_RENDERS.value(mode="single") == renders + 1
+    assert 'hereiam_cv_renders_total{mode="single"}' in scrape(client)
+
+
+def test_existing_stats_are_exported(client, user_id):
+    client.post("/login", json={"credential": "TR_Meowth", "password": "JessieJamesMeowth"})
+    text = scrape(client)
+    assert "# TYPE hereiam_db_pool_checkouts gauge" in text
+    assert "hereiam_user_directory_hits" in text
+    assert "hereiam_response_cache_hit_ratio" in text
+
+
+def test_prometheus_text_format():
+    registry = Registry()
+    latency = Histogram("t_seconds", "test", labels=("route",), buckets=(0.25, 1), registry=registry)
+    errors = Counter("t_errors_total", "test", labels=("kind",), registry=registry)
+    latency.observe(0.25, route="/a")
+    latency.observe(0.5, route="/a")
+    latency.observe(3, route="/a")
+    errors.inc(kind='say "hi"\n')
+    registry.add_stats("t_pool", lambda: {"/db": {"open": 2, "name": "x"}}, label="db")
+
+    assert registry.render().splitlines() == [
+        "# HELP t_seconds test",
+        "# TYPE t_seconds histogram",
+        't_seconds_bucket{route="/a",le="0.25"} 1',
+        't_seconds_bucket{route="/a",le="1"} 2',
+        't_seconds_bucket{route="/a",le="+Inf"} 3',
+        't_seconds_sum{route="/a"} 3.75',
+        't_seconds_count{route="/a"} 3',
+        "# HELP t_errors_total test",
+        "# TYPE t_errors_total counter",
+        't_errors_total{kind="say \\"hi\\"\\n"} 1',
+        "# HELP t_pool_open t_pool (open)",
+        "# TYPE t_pool_open gauge",
+        't_pool_open{db="/db"} 2',
+    ]
+
+
+def test_metrics_server_of_a_process(client):
+    server = metrics.start_metrics_server("127.0.0.1", 0)
+    port = server.server_address[1]
+    try:
+        with urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics", timeout=5) as res:
+            assert res.headers["Content-Type"].startswith("text/plain")
+            assert "hereiam_http_request_duration_seconds" in res.read().decode()
+        with pytest.raises(urllib.error.HTTPError) as e:
+            urllib.request.urlopen(f"http://127.0.0.1:{port}/events", timeout=5)
+        assert e.value.code == 404
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+@pytest.mark.parametrize("as_json", [False, True])
+def test_log_lines_carry_the_extra_fields(as_json):
+    record = logging.LogRecord("app", logging.WARNING, __file__, 1, "slow query", (), None)
+    record.duration_ms = 412.5
+    line = StructuredFormatter(as_json=as_json).format(record)
+
+    if as_json:
+        data = json.loads(line)
+        assert data["level"] == "WARNING"
+        assert data["message"] == "slow query"
+        assert data["duration_ms"] == 412.5
+    else:
+        assert line.endswith("WARNING app: slow query duration_ms=412.5")
@@ -0,0 +1,184 @@
+import threading
+
+import pytest
+
+import passwords
+from db_pool import get_db_connection
+from passwords import KdfPool, PasswordBusy, is_hashed
+
+
+def stored_password(user_id):
+    conn = get_db_connection()
+    try:
+        return conn.execute("SELECT password FROM users WHERE id = ?", (user_id,)).fetchone()["password"]
+    finally:
+        conn.close()
+
+
+def login(client, password, credential="TR_Meowth"):
+    return client.post("/login", json={"credential": credential, "password": password})
+
+
+def test_register_stores_a_hash(client):
+    res = client.post("/register", json={
+        "name": "Jessie", "surname": "Rocket", "username": "TR_Jessie",
+        "email": "jessie@teamrocket.com", "password": "prepare4trouble",
+    })
+    assert res.status_code == 201
+
+    user_id = login(client, "prepare4trouble", "TR_Jessie").get_json()["user_id"]
+    stored = stored_password(user_id)
+    assert stored.startswith(passwords.PASSWORD_METHOD + "$")
+    assert "prepare4trouble" not in stored
+    assert login(client, "makeitdouble", "TR_Jessie").status_code == 401
+
+
+def test_plaintext_row_is_hashed_on_login(client, user_id):
+    assert not is_hashed(stored_password(user_id))
+    assert login(client, "wrong").status_code == 401
+    assert not is_hashed(stored_password(user_id))
+
+    assert login(client, "JessieJamesMeowth").get_json()["success"] is True
+    assert is_hashed(stored_password(user_id))
+    # and the hash works from now on
+    assert login(client, "JessieJamesMeowth").status_code == 200
+
+
+def test_hash_with_old_cost_is_upgraded(client, user_id):
+    old = passwords.generate_password_hash("JessieJamesMeowth", "pbkdf2:sha256:1000")
+    conn = get_db_connection()
+    conn.execute("UPDATE users SET password = ? WHERE id = ?", (old, user_id))
+    conn.commit()
+    conn.close()
+
+    res = client.post(f"/users/{user_id}/check-password",
+                      json={"password": "JessieJamesMeowth"})
+    assert res.get_json() == {"valid": True}
+    assert stored_password(user_id).startswith(passwords.PASSWORD_METHOD + "$")
+
+
+def test_update_and_reset_store_hashes(client, user_id):
+    res = client.put(f"/users/{user_id}/update-password",
+                     json={"newPassword": "meowthatsright"})
+    assert res.get_json() == {"success": True}
+    assert is_hashed(stored_password(user_id))
+    assert login(client, "meowthatsright").status_code == 200
+
+    client.post("/forgot", json={"email": "meowth@teamrocket.com"})
+    assert is_hashed(stored_password(user_id))
+    # conftest's generate_password always hands out this one
+    assert login(client, "newpass123").status_code == 200
+
+
+def outbox(kind):
+    conn = get_db_connection()
+    try:
+        return conn.execute("SELECT to_email, contents FROM email_outbox WHERE kind = ?", (kind,)).fetchall()
+    finally:
+        conn.close()
+
+
+def test_reset_password_is_emailed_after_it_is_stored(client, user_id):
+    client.post("/forgot", json={"email": "meowth@teamrocket.com"})
+
+    [email] = outbox("forgot_password")
+    assert email["to_email"] == "meowth@teamrocket.com"
+    assert "newpass123" in email["contents"]
+    assert login(client, "newpass123").status_code == 200
+
+
+def test_busy_pool_sends_no_reset_password(app_module, client, user_id, monkeypatch):
+    def busy(*args):
+        raise PasswordBusy()
+    monkeypatch.setattr(app_module, "hash_password", busy)
+
+    res = client.post("/forgot", json={"email": "meowth@teamrocket.com"})
+    assert res.status_code == 503
+    assert outbox("forgot_password") == []
+    assert stored_password(user_id) == "JessieJamesMeowth"
+
+
+def test_pool_refuses_when_queue_is_full():
+    pool = KdfPool(workers=1, max_waiting=0, queue_timeout=0.01)
+    started, release = threading.Event(), threading.Event()
+
+    def slow():
+        started.set()
+        release.wait(5)
+
+    t = threading.Thread(target=pool.run, args=(slow,))
+    t.start()
+    started.wait(5)
+    try:
+        with pytest.raises(PasswordBusy):
+            pool.run(lambda: None)
+    finally:
+        release.set()
+        t.join()
+    assert pool.run(lambda: 42) == 42
+    pool.shutdown()
+
+
+def test_busy_pool_is_a_503(app_module, client, user_id, monkeypatch):
+    def busy(*args):
+        raise PasswordBusy()
+    monkeypatch.setattr(app_module, "verify_password", busy)
+
+    res = login(client, "JessieJamesMeowth")
+    assert res.status_code == 503
+    assert res.headers["Retry-After"] == "1"
+
+
+def test_no_connection_is_held_while_hashing(app_module, client, user_id, monkeypatch):
+    from db_pool import get_pool
+
+    in_use = []
+
+    def counting(func):
+        def wrapper(*args, **kwargs):
+            in_use.append(get_pool(app_module.DB_PATH).stats()["in_use"])
+            return func(*args, **kwargs)
+        return wrapper
+    monkeypatch.setattr(app_module, "verify_password", counting(app_module.verify_password))
+    monkeypatch.setattr(app_module, "hash_password", counting(app_module.hash_password))
+
+    assert login(client, "JessieJamesMeowth").status_code == 200
+    client.post(f"/users/{user_id}/check-password",
+                json={"password": "JessieJamesMeowth"})
+    client.post("/forgot", json={"email": "meowth@teamrocket.com"})
+    client.post("/register", json={
+        "name": "James", "surname": "Rocket", "username": "TR_James",
+        "email": "james@teamrocket.com", "password": "makeitdouble",
+    })
+    assert len(in_use) == 4
+    assert in_use == [0, 0, 0, 0]
+
+
+def test_register_race_on_the_insert_is_a_409(app_module, client, monkeypatch):
+    # someone else registers the same username while the password is being hashed
+    def hash_and_race(password):
+        conn = get_db_connection()
+        conn.execute("INSERT INTO users (name, surname, username, email, password) "
+                     "VALUES ('J', 'R', 'TR_James', 'other@teamrocket.com', 'x')")
+        conn.commit()
+        conn.close()
+        return "scrypt:1:1:1$salt$hash"
+    monkeypatch.setattr(app_module, "hash_password", hash_and_race)
+
+    res = client.post("/register", json={
+        "name": "James", "surname": "Rocket", "username": "TR_James",
+        "email": "james@teamrocket.com", "password": "makeitdouble",
+    })
+    assert res.status_code == 409
+
+
+def test_pool_timeout_is_a_503(app_module, client, monkeypatch):
+    from db_pool import PoolTimeout
+
+    def exhausted(*args, **kwargs):
+        raise PoolTimeout("no free database connection after 0.5s")
+    monkeypatch.setattr(app_module, "find_user", exhausted)
+
+    res = login(client, "JessieJamesMeowth")
+    assert res.status_code == 503
+    assert res.headers["Retry-After"] == "1"
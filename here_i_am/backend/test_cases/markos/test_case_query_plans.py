@@ -0,0 +1,128 @@
+"""
+Runs the hot routes with SQL tracing on and checks EXPLAIN QUERY PLAN for every
+statement they send, so a query change that brings back a full table scan
+(or drops one of the migration 5 indexes) fails here.
+"""
+import io
+
+import pytest
+
+import db_pool
+from db_pool import get_db_connection, get_pool
+
+
+@pytest.fixture
+def traced(app_module, monkeypatch):
+    statements = []
+    connect = db_pool.ConnectionPool._connect
+
+    def traced_connect(pool):
+        conn = connect(pool)
+        conn.set_trace_callback(statements.append)
+        return conn
+
+    # new pooled connections report every statement they run
+    get_pool(app_module.DB_PATH).close_all()
+    monkeypatch.setattr(db_pool.ConnectionPool, "_connect", traced_connect)
+    yield statements
+    get_pool(app_module.DB_PATH).close_all()
+
+
+def query_plan(sql):
+    conn = get_db_connection()
+    try:
+        return [row["detail"] for row in conn.execute("EXPLAIN QUERY PLAN " + sql)]
+    finally:
+        conn.close()
+
+
+def plans_for(statements, table):
+    """EXPLAIN QUERY PLAN for every traced statement that touches `table`."""
+    plans = {}
+    for sql in statements:
+        first_word = sql.strip().split()[0].upper()
+        if first_word in ("SELECT", "UPDATE", "DELETE") and table in sql:
+            plans[sql] = query_plan(sql)
+    assert plans, f"no statements on {table} were traced"
+    return plans
+
+
+def assert_no_full_scans(plans):
+    for sql, details in plans.items():
+        scans = [d for d in details if d.startswith("SCAN")]
+        assert not scans, f"full scan in:\n{sql}\nplan: {details}"
+
+
+@pytest.fixture
+def event_with_file(client, user_id):
+    res = client.post("/events", data={
+        "title": "Battle Plan", "date": "2025-01-01", "time": "10:00",
+        "file": (io.BytesIO(b"plan"), "plan.txt"),
+    }, content_type="multipart/form-data")
+    return res.get_json()["id"]
+
+
+def test_events_for_day_uses_user_start_index(client, user_id, event_with_file, traced):
+    client.get("/events?date=2025-01-01")
+
+    plans = plans_for(traced, "events e")
+    assert_no_full_scans(plans)
+    details = " ".join(next(iter(plans.values())))
+    assert "idx_events_user_start (user_id=? AND start_time_utc>? AND start_time_utc<?)" in details
+    # has_file EXISTS subquery
+    assert "idx_uploads_event (event_id=?)" in details
+
+
+def test_history_uses_user_index(client, user_id, event_with_file, traced):
+    client.get("/history")
+
+    plans = plans_for(traced, "events")
+    assert_no_full_scans(plans)
+    assert any("idx_events_user_start (user_id=?)" in d for details in plans.values() for d in details)
+
+
+def test_login_and_register_use_unique_user_indexes(client, user_id, traced):
+    client.post("/login", json={"credential": "TR_Meowth", "password": "JessieJamesMeowth"})
+    client.post("/register", json={
+        "name": "Jessie", "surname": "Rocket", "username": "TR_Jessie",
+        "email": "jessie@teamrocket.com", "password": "prepare4trouble",
+    })
+
+    plans = plans_for(traced, "users")
+    assert_no_full_scans(plans)
+    for sql, details in plans.items():
+        if "username = " in sql:
+            # the OR is answered from the two UNIQUE indexes
+            assert "MULTI-INDEX OR" in details
+
+
+def test_event_file_and_delete_use_indexes(client, user_id, event_with_file, traced):
+    client.get(f"/events/{event_with_file}/file")
+    client.delete(f"/events/{event_with_file}")
+
+    plans = plans_for(traced, "uploads")
+    assert_no_full_scans(plans)
+    assert all(any("idx_uploads_event" in d for d in details) for details in plans.values())
+
+
+def test_range_and_counts_use_user_start_index(client, user_id, event_with_file, traced):
+    client.get("/events/range?from=2025-01-01&to=2025-01-31")
+    client.get("/events/range?from=2025-01-01&to=2025-01-31&mode=counts")
+
+    plans = plans_for(traced, "BETWEEN")
+    assert len(plans) == 2
+    assert_no_full_scans(plans)
+    for details in plans.values():
+        assert any("idx_events_user_start (user_id=? AND start_time_utc>? AND start_time_utc<?)" in d
+                   for d in details)
+
+
+def test_history_pages_seek_into_user_index(client, app_module, user_id, event_with_file, traced):
+    cursor = app_module.encode_cursor("2025-01-01T00:00:00", 0)
+    client.get(f"/history?limit=1&fields=id&cursor={cursor}")
+
+    plans = plans_for(traced, "LIMIT")
+    assert_no_full_scans(plans)
+    details = [d for plan in plans.values() for d in plan]
+    assert not any("TEMP B-TREE" in d for d in details)
+    assert any("idx_events_user_start (user_id=? AND start_time_utc>?)" in d for d in details)
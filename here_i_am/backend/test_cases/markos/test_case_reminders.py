@@ -0,0 +1,188 @@
+import time
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import reminder_scheduler
+from db_pool import get_db_connection
+from reminder_scheduler import REMINDER_LEAD, ReminderScheduler, parse_start_time
+
+
+def in_hours(hours):
+    start = datetime.now(timezone.utc) + timedelta(hours=hours)
+    return start.strftime("%Y-%m-%d"), start.strftime("%H:%M")
+
+
+def create_event(client, user_id, hours, title="Battle"):
+    date, hhmm = in_hours(hours)
+    res = client.post("/events", json={"title": title, "date": date, "time": hhmm})
+    assert res.status_code == 201
+    return res.get_json()
+
+
+def query(sql, params=()):
+    conn = get_db_connection()
+    rows = conn.execute(sql, params).fetchall()
+    conn.close()
+    return rows
+
+
+def reminder_emails():
+    return query("SELECT * FROM email_outbox WHERE kind = 'event_reminder'")
+
+
+@pytest.fixture
+def scheduler(app_module):
+    return ReminderScheduler(app_module.DB_PATH, heap_limit=50)
+
+
+def test_future_event_gets_a_reminder(client, user_id):
+    event = create_event(client, user_id, hours=3)
+
+    rows = query("SELECT * FROM event_reminders")
+    assert len(rows) == 1
+    assert rows[0]["event_id"] == event["id"]
+    assert rows[0]["due_at"] == parse_start_time(event["start_time_utc"]) - REMINDER_LEAD
+
+    scheduled = query("SELECT scheduled_to_send FROM events WHERE id = ?", (event["id"],))[0][0]
+    assert scheduled is not None
+
+
+def test_past_event_has_no_reminder(client, user_id):
+    create_event(client, user_id, hours=-3)
+    assert query("SELECT * FROM event_reminders") == []
+
+
+def test_delete_event_cancels_reminder(client, user_id):
+    event = create_event(client, user_id, hours=3)
+    client.delete(f"/events/{event['id']}")
+    assert query("SELECT * FROM event_reminders") == []
+
+
+def test_reminder_fires_once_when_due(client, user_id, scheduler):
+    event = create_event(client, user_id, hours=3, title="Steal Pikachu")
+    due_at = query("SELECT due_at FROM event_reminders")[0][0]
+    scheduler.resync()
+
+    assert scheduler.fire_due(now=due_at - 60) == 0
+    assert scheduler.fire_due(now=due_at + 1) == 1
+
+    emails = reminder_emails()
+    assert len(emails) == 1
+    assert "Steal Pikachu" in emails[0]["subject"]
+    assert query("SELECT * FROM event_reminders") == []
+
+    # a second scheduler (another worker / after a restart) doesn't send it again
+    other = ReminderScheduler(scheduler.db_path)
+    other.add(event["id"], due_at)
+    assert other.fire_due(now=due_at + 2) == 0
+    assert len(reminder_emails()) == 1
+
+
+def test_deleted_event_left_in_heap_is_skipped(client, user_id, scheduler):
+    event = create_event(client, user_id, hours=3)
+    scheduler.resync()
+    client.delete(f"/events/{event['id']}")
+
+    assert scheduler.fire_due(now=time.time() + 5 * 3600) == 0
+    assert scheduler.stats["skipped"] == 1
+
+
+def test_reminders_survive_restart(client, user_id, scheduler):
+    create_event(client, user_id, hours=3)
+
+    restarted = ReminderScheduler(scheduler.db_path)
+    restarted.resync()
+    assert restarted.pending() == 1
+    due_at = query("SELECT due_at FROM event_reminders")[0][0]
+    assert restarted.fire_due(now=due_at + 1) == 1
+
+
+def test_no_reminder_after_event_started(client, user_id, scheduler):
+    create_event(client, user_id, hours=3)
+    scheduler.resync()
+
+    # e.g. the server was down until after the event began
+    assert scheduler.fire_due(now=time.time() + 5 * 3600) == 0
+    assert reminder_emails() == []
+
+
+def test_only_heap_limit_reminders_held_in_memory(app_module, user_id, scheduler):
+    start = time.time() + 3600
+    conn = get_db_connection()
+    conn.executemany(
+        "INSERT INTO event_reminders (event_id, user_id, due_at) VALUES (?, ?, ?)",
+        [(1000 + i, user_id, start + i) for i in range(1000)]
+    )
+    conn.commit()
+    conn.close()
+
+    scheduler.resync()
+    assert scheduler.pending() == 50
+
+    # rows without events are skipped, but every one is popped in due order exactly once
+    fired = []
+    scheduler._fire = lambda event_id, due_at, now: fired.append(event_id) or False
+    scheduler.fire_due(now=start + 2000)
+
+    assert fired == [1000 + i for i in range(1000)]
+
+
+def test_load_query_uses_due_index(app_module):
+    plan = query(
+        "EXPLAIN QUERY PLAN SELECT due_at, event_id FROM event_reminders "
+        "WHERE (due_at, event_id) > (?, ?) ORDER BY due_at, event_id LIMIT 10",
+        (0, 0)
+    )
+    details = " ".join(row["detail"] for row in plan)
+    assert "idx_event_reminders_due" in details
+    assert "TEMP B-TREE" not in details
+
+
+def test_background_thread_wakes_for_new_reminder(client, user_id, app_module):
+    reminder_scheduler.start_scheduler(app_module.DB_PATH)
+    try:
+        # starts in 10 minutes -> reminder is due right away
+        create_event(client, user_id, hours=10 / 60)
+        deadline = time.time() + 5
+        while not reminder_emails() and time.time() < deadline:
+            time.sleep(0.02)
+    finally:
+        reminder_scheduler.stop_scheduler()
+
+    assert len(reminder_emails()) == 1
+
+
+def test_reminder_added_by_another_worker_is_polled(client, user_id, scheduler):
+    scheduler.resync()
+    # created through another serve.py worker: this scheduler's heap never heard of it
+    create_event(client, user_id, hours=10 / 60)
+
+    assert scheduler.pending() == 0
+    assert scheduler.fire_due() == 0
+    assert scheduler.poll() == 1
+    assert len(reminder_emails()) == 1
+    assert scheduler.poll() == 0
+
+
+def test_poll_query_uses_due_index(app_module):
+    plan = query("EXPLAIN QUERY PLAN SELECT MIN(due_at) FROM event_reminders")
+    assert "idx_event_reminders_due" in " ".join(row["detail"] for row in plan)
+
+
+def test_background_thread_polls_for_other_workers_reminders(client, user_id, app_module, monkeypatch):
+    monkeypatch.setattr(reminder_scheduler, "POLL_INTERVAL", 0.05)
+    scheduler = reminder_scheduler.start_scheduler(app_module.DB_PATH)
+    try:
+        while not scheduler._last_sync:
+            time.sleep(0.01)
+        # notify() only reaches the scheduler of the worker that created the event
+        monkeypatch.setattr(reminder_scheduler, "notify", lambda event_id, due_at: None)
+        create_event(client, user_id, hours=10 / 60)
+        deadline = time.time() + 5
+        while not reminder_emails() and time.time() < deadline:
+            time.sleep(0.02)
+    finally:
+        reminder_scheduler.stop_scheduler()
+
+    assert len(reminder_emails()) == 1
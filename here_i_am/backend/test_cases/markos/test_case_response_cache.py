@@ -0,0 +1,123 @@
+import io
+
+import pytest
+
+import auth
+import response_cache
+from response_cache import ResponseCache, cache_stats, get_response_cache
+
+
+@pytest.fixture
+def event(client, user_id):
+    res = client.post("/events", json={"title": "Heist", "date": "2025-01-01", "time": "10:00"})
+    return res.get_json()["id"]
+
+
+def day(client, user_id, **headers):
+    return client.get("/events?date=2025-01-01", headers=headers)
+
+
+def test_second_read_comes_from_the_cache(client, user_id, event):
+    before = cache_stats()
+    first = day(client, user_id)
+    second = day(client, user_id)
+
+    assert first.status_code == second.status_code == 200
+    assert second.get_json() == first.get_json()
+    assert second.headers["ETag"] == first.headers["ETag"]
+    after = cache_stats()
+    assert after["misses"] == before["misses"] + 1
+    assert after["hits"] == before["hits"] + 1
+    assert 0 < after["hit_ratio"] <= 1
+
+
+def test_etag_gives_304_until_events_change(client, user_id, event):
+    etag = day(client, user_id).headers["ETag"]
+
+    res = day(client, user_id, **{"If-None-Match": etag})
+    assert res.status_code == 304
+    assert res.data == b""
+
+    client.post("/events", json={"title": "Escape", "date": "2025-01-01", "time": "11:00"})
+    res = day(client, user_id, **{"If-None-Match": etag})
+    assert res.status_code == 200
+    assert [e["title"] for e in res.get_json()] == ["Heist", "Escape"]
+
+
+def test_delete_and_attachment_bump_the_version(client, user_id, event):
+    cache = get_response_cache()
+    version = cache.version(user_id)
+    # the event itself and then its file
+    client.post("/events", data={
+        "title": "Plan", "date": "2025-01-01",
+        "file": (io.BytesIO(b"meowth"), "plan.txt"),
+    }, content_type="multipart/form-data")
+    assert cache.version(user_id) == version + 2
+
+    history = client.get("/history").get_json()
+    client.delete(f"/events/{event}")
+    assert cache.version(user_id) == version + 3
+    assert len(client.get("/history").get_json()) == len(history) - 1
+
+
+def test_users_and_params_are_kept_apart(client, user_id, event):
+    mine = client.get("/events/range?from=2025-01-01&to=2025-01-31").get_json()
+    theirs = client.get("/events/range?from=2025-01-01&to=2025-01-31",
+                        headers={"Authorization": f"Bearer {auth.issue_token(user_id + 1)}"}).get_json()
+    counts = client.get("/events/range?from=2025-01-01&to=2025-01-31&mode=counts").get_json()
+
+    assert mine["days"] and not theirs["days"]
+    assert counts["counts"] == {"2025-01-01": 1}
+
+
+def test_streamed_history_is_not_cached(client, user_id, event):
+    before = get_response_cache().snapshot()["entries"]
+    res = client.get("/history?format=ndjson")
+    assert res.mimetype == "application/x-ndjson"
+    assert get_response_cache().snapshot()["entries"] == before
+
+
+def test_errors_are_not_cached(client, user_id):
+    assert client.get("/history?limit=0").status_code == 400
+    assert get_response_cache().snapshot()["entries"] == 0
+
+
+def test_entries_expire_and_are_evicted(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(response_cache.time, "monotonic", lambda: now[0])
+    cache = ResponseCache(max_bytes=10, ttl=5)
+    cache.put("a", 0, b"12345", "application/json")
+    cache.put("b", 0, b"12345", "application/json")
+    cache.put("c", 0, b"12345", "application/json")
+
+    assert cache.get("a", 0) is None
+    assert cache.get("b", 0) == (b"12345", "application/json")
+    assert cache.get("b", 1) is None   # the user's version moved on
+    now[0] += 6
+    assert cache.get("c", 0) is None
+    assert cache.snapshot()["evictions"] == 1
+
+
+def test_workers_share_versions(app_module, client, user_id, event):
+    # two caches on the same database, like two serve.py worker processes
+    worker_a, worker_b = ResponseCache(), ResponseCache()
+    key = (user_id, "/events", (("date", "2025-01-01"),), "")
+    version = worker_a.version(user_id)
+    worker_a.put(key, version, b"[]", "application/json")
+    etag = worker_a.etag(user_id, version, key)
+    assert worker_b.etag(user_id, worker_b.version(user_id), key) == etag
+
+    worker_b.bump(user_id)   # a write handled by the other worker
+    assert worker_a.version(user_id) == version + 1
+    assert worker_a.get(key, worker_a.version(user_id)) is None
+    assert worker_a.etag(user_id, worker_a.version(user_id), key) != etag
+
+
+def test_stale_etag_after_a_write_elsewhere_is_a_200(monkeypatch, client, user_id, event):
+    etag = day(client, user_id).headers["ETag"]
+    # another worker adds an event: only the shared version moves, this process's cache is untouched
+    ResponseCache().bump(user_id)
+
+    res = day(client, user_id, **{"If-None-Match": etag})
+    assert res.status_code == 200
+    assert res.headers["ETag"] != etag
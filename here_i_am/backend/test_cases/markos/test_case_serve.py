@@ -0,0 +1,196 @@
+import json
+import os
+import signal
+import socket
+import sqlite3
+import subprocess
+import sys
+import threading
+import time
+import urllib.request
+
+import pytest
+
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+
+pytestmark = pytest.mark.skipif(not hasattr(os, "fork"), reason="serve.py needs os.fork()")
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+class Server:
+    """python serve.py in a subprocess, its JSON log lines collected as they come."""
+
+    def __init__(self, tmp_path, *args, db_path=None):
+        self.port = free_port()
+        env = dict(os.environ,
+                   HEREIAM_DB_PATH=str(db_path or tmp_path / "database.db"),
+                   HEREIAM_BLOB_DIR=str(tmp_path / "blobs"),
+                   HEREIAM_VARIANT_DIR=str(tmp_path / "image_cache"),
+                   HEREIAM_LOG_FORMAT="json",
+                   # no per-worker metrics ports unless a test asks for them
+                   HEREIAM_METRICS_PORT="0")
+        self.proc = subprocess.Popen(
+            [sys.executable, "serve.py", "--host", "127.0.0.1", "--port", str(self.port), *args],
+            cwd=BACKEND_DIR, env=env, stderr=subprocess.PIPE, text=True,
+        )
+        self.logs = []
+        threading.Thread(target=self._read, daemon=True).start()
+
+    def _read(self):
+        for line in self.proc.stderr:
+            try:
+                self.logs.append(json.loads(line))
+            except ValueError:
+                pass
+
+    def booted(self):
+        return [entry["pid"] for entry in self.logs if entry.get("message") == "worker booted"]
+
+    def wait_for(self, condition, timeout=20):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if condition():
+                return
+            time.sleep(0.05)
+        raise AssertionError(f"timed out, logs: {[e.get('message') for e in self.logs]}")
+
+    def get(self, path):
+        with urllib.request.urlopen(f"http://127.0.0.1:{self.port}{path}", timeout=5) as res:
+            return res.status
+
+    def logged(self, message):
+        return [entry for entry in self.logs if entry.get("message") == message]
+
+    def stop(self):
+        if self.proc.poll() is None:
+            self.proc.send_signal(signal.SIGTERM)
+        return self.proc.wait(30)
+
+
+@pytest.fixture
+def server(tmp_path):
+    started = []
+
+    def start(*args, **kwargs):
+        started.append(Server(tmp_path, *args, **kwargs))
+        return started[-1]
+
+    yield start
+    for s in started:
+        if s.proc.poll() is None:
+            s.proc.kill()
+            s.proc.wait()
+
+
+def test_workers_serve_and_reload(server):
+    s = server("--workers", "2")
+    s.wait_for(lambda: len(s.booted()) == 2)
+    first = set(s.booted())
+    assert s.get("/metrics") == 200
+
+    s.proc.send_signal(signal.SIGHUP)
+    s.wait_for(lambda: len(s.booted()) == 4)
+    stopped = lambda: {e["pid"] for e in s.logs if e.get("message") == "worker stopped"}  # noqa: E731
+    s.wait_for(lambda: stopped() == first)
+    assert s.get("/metrics") == 200
+
+    assert s.stop() == 0
+    assert s.logs[-1]["message"] == "stopped"
+
+
+def free_ports(count):
+    """First of `count` consecutive free ports."""
+    while True:
+        base = free_port()
+        try:
+            for port in range(base, base + count):
+                with socket.socket() as s:
+                    s.bind(("127.0.0.1", port))
+            return base
+        except OSError:
+            continue
+
+
+def metrics_count(port, route):
+    with urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics", timeout=5) as res:
+        text = res.read().decode()
+    prefix = f'hereiam_http_request_duration_seconds_count{{route="{route}",'
+    return sum(int(line.rsplit(" ", 1)[1]) for line in text.splitlines() if line.startswith(prefix))
+
+
+def test_every_worker_has_its_own_metrics_port(server):
+    base = free_ports(2)
+    s = server("--workers", "2", "--metrics-port", str(base))
+    s.wait_for(lambda: len(s.logged("serving metrics")) == 2)
+    assert sorted(e["port"] for e in s.logged("serving metrics")) == [base, base + 1]
+
+    for _ in range(20):
+        assert s.get("/metrics") == 200
+    # the shared socket's /metrics is one worker's share, the ports add up to all of it
+    assert metrics_count(base, "/metrics") + metrics_count(base + 1, "/metrics") == 20
+
+    # the new workers take over the ports once the old ones let go of them
+    s.proc.send_signal(signal.SIGHUP)
+    s.wait_for(lambda: len(s.logged("serving metrics")) == 4)
+    assert metrics_count(base, "/metrics") + metrics_count(base + 1, "/metrics") == 0
+    assert s.stop() == 0
+
+
+def test_dead_worker_is_replaced(server):
+    s = server("--workers", "1")
+    s.wait_for(lambda: len(s.booted()) == 1)
+    os.kill(s.booted()[0], signal.SIGKILL)
+
+    s.wait_for(lambda: len(s.booted()) == 2)
+    assert s.get("/metrics") == 200
+    assert s.stop() == 0
+
+
+def test_request_in_flight_finishes_on_stop(server):
+    s = server("--workers", "1")
+    s.wait_for(lambda: len(s.booted()) == 1)
+
+    body = json.dumps({"credential": "nobody", "password": "x"}).encode()
+    conn = socket.create_connection(("127.0.0.1", s.port))
+    conn.sendall(b"POST /login HTTP/1.1\r\nHost: x\r\nContent-Type: application/json\r\n"
+                 b"Connection: close\r\nContent-Length: %d\r\n\r\n" % len(body) + body[:10])
+    time.sleep(0.3)   # the worker is now waiting for the rest of the body
+    s.proc.send_signal(signal.SIGTERM)
+    time.sleep(0.3)
+    conn.sendall(body[10:])
+
+    response = b""
+    while chunk := conn.recv(4096):
+        response += chunk
+    conn.close()
+    assert response.startswith(b"HTTP/1.1 404")
+    assert s.proc.wait(30) == 0
+
+
+def test_refuses_to_start_on_a_newer_schema(server, tmp_path):
+    db_path = tmp_path / "newer.db"
+    conn = sqlite3.connect(db_path)
+    conn.execute("PRAGMA user_version = 999")
+    conn.close()
+
+    s = server("--workers", "1", db_path=db_path)
+    assert s.proc.wait(30) == 1
+    s.wait_for(lambda: any(e["message"].startswith("schema check failed") for e in s.logs))
+    assert s.booted() == []
+
+
+def test_master_only_imports_log_config(tmp_path):
+    # modules the master imported would be inherited, stale, by the workers of a reload
+    script = ("import sys, serve; ok = serve.prepare_database(); "
+              "print(ok, sorted(m for m in ('app', 'db_pool', 'db_config', 'metrics', 'migrations') if m in sys.modules))")
+    out = subprocess.run([sys.executable, "-c", script], cwd=BACKEND_DIR, capture_output=True, text=True, timeout=60,
+                         env=dict(os.environ, HEREIAM_DB_PATH=str(tmp_path / "database.db")))
+    assert out.stdout.split() == ["True", "[]"]
+    conn = sqlite3.connect(tmp_path / "database.db")
+    assert conn.execute("PRAGMA user_version").fetchone()[0] > 0
+    conn.close()
@@ -0,0 +1,146 @@
+import pytest
+
+import auth
+import user_directory
+from db_pool import get_db_connection
+from user_directory import UserDirectory, get_user_directory
+
+
+@pytest.fixture
+def directory(app_module):
+    directory = get_user_directory()
+    directory.clear()
+    return directory
+
+
+@pytest.fixture
+def queries(app_module, monkeypatch):
+    """SQL sent by the directory (not by the rest of the route)."""
+    sent = []
+
+    class Recording:
+        def __init__(self, conn):
+            self.conn = conn
+
+        def execute(self, sql, params=()):
+            sent.append(sql)
+            return self.conn.execute(sql, params)
+
+    taken = UserDirectory.taken
+    monkeypatch.setattr(UserDirectory, "taken", lambda self, conn, *a: taken(self, Recording(conn), *a))
+    return sent
+
+
+def login(client, password="JessieJamesMeowth", credential="TR_Meowth"):
+    return client.post("/login", json={"credential": credential, "password": password})
+
+
+def register(client, username="TR_Jessie", email="jessie@teamrocket.com"):
+    return client.post("/register", json={
+        "name": "Jessie", "surname": "Rocket", "username": username,
+        "email": email, "password": "prepare4trouble",
+    })
+
+
+def test_login_reads_the_database_not_the_directory(client, user_id, directory, queries):
+    assert register(client).status_code == 201
+    before = directory.stats()
+    assert login(client, "prepare4trouble", "TR_Jessie").status_code == 200
+    assert login(client, "prepare4trouble", "jessie@teamrocket.com").status_code == 200
+
+    # only register's check, login asked the database both times
+    assert len(queries) == 1
+    assert directory.stats() == before
+
+
+def test_register_duplicate_check_is_served_from_the_directory(client, user_id, directory, queries):
+    assert register(client).status_code == 201
+    # username and email both known now, no query for either
+    del queries[:]
+    hits = directory.stats()["hits"]
+    assert register(client).status_code == 409
+    assert register(client, username="someone_else").status_code == 409
+    assert queries == []
+    # a hit is an answer without a query
+    assert directory.stats()["hits"] == hits + 2
+
+
+def test_unknown_users_always_ask_the_database(client, user_id, directory, queries):
+    misses = directory.stats()["misses"]
+    assert register(client, username="TR_James", email="meowth@teamrocket.com").status_code == 409
+    assert register(client, username="TR_James", email="james@teamrocket.com").status_code == 201
+    assert len(queries) == 2
+    assert directory.stats()["misses"] == misses + 2
+
+
+def test_passwords_are_not_cached(client, directory):
+    assert register(client).status_code == 201
+    assert set(directory.get("TR_Jessie")) == {"id", "username", "email"}
+
+
+def test_password_change_invalidates(client, user_id, directory):
+    login(client)
+    client.put(f"/users/{user_id}/update-password",
+               json={"newPassword": "meowthatsright"})
+
+    assert login(client).status_code == 401
+    assert login(client, "meowthatsright").status_code == 200
+
+
+def test_email_change_invalidates(client, user_id, directory):
+    register(client, username="TR_Jessie", email="jessie@teamrocket.com")
+    jessie = directory.get("TR_Jessie")["id"]
+    client.put(f"/users/{jessie}", json={"email": "jessie@rocket.org"},
+               headers={"Authorization": f"Bearer {auth.issue_token(jessie)}"})
+
+    assert directory.get("jessie@teamrocket.com") is None
+    assert register(client, username="TR_James", email="jessie@teamrocket.com").status_code == 201
+
+
+def test_password_changed_by_another_process(client, user_id, directory):
+    login(client)
+    # not through the app, so nothing invalidated the entry
+    conn = get_db_connection()
+    conn.execute("UPDATE users SET password = 'changed_elsewhere' WHERE id = ?", (user_id,))
+    conn.commit()
+    conn.close()
+
+    assert login(client, "changed_elsewhere").status_code == 200
+
+
+def test_old_password_stops_working_after_a_change_elsewhere(client, user_id, directory):
+    assert login(client).status_code == 200
+    # reset through another worker: this process's entry still has the old password
+    conn = get_db_connection()
+    conn.execute("UPDATE users SET password = 'reset_elsewhere' WHERE id = ?", (user_id,))
+    conn.commit()
+    conn.close()
+
+    assert login(client).status_code == 401
+    assert login(client, "reset_elsewhere").status_code == 200
+
+
+def test_email_moved_to_another_user_elsewhere(client, user_id, directory):
+    assert login(client, credential="meowth@teamrocket.com").status_code == 200
+    conn = get_db_connection()
+    conn.execute("UPDATE users SET email = 'meowth@rocket.org' WHERE id = ?", (user_id,))
+    conn.commit()
+    conn.close()
+
+    assert login(client, credential="meowth@teamrocket.com").status_code == 404
+
+
+def test_entries_expire_and_are_evicted(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(user_directory.time, "monotonic", lambda: now[0])
+    directory = UserDirectory(max_users=2, ttl=10)
+    for i in range(3):
+        directory.put({"id": i, "username": f"u{i}", "email": f"e{i}"})
+
+    assert directory.get("u0") is None
+    assert directory.get("e1")["id"] == 1
+    assert directory.stats()["evictions"] == 1
+
+    now[0] += 11
+    assert directory.get("u2") is None
+    assert directory.stats()["users"] == 1
@@ -0,0 +1,147 @@
+"""
+Line wrapping for the CV renderer, without a canvas.
+
+Gives exactly the same line breaks as the old wrap_text_by_width in
+generate_cv, but measures each character once per font (the widths are kept
+in a table shared by all requests) and adds widths up as the line grows,
+instead of calling canvas.stringWidth on the whole line for every word and
+on the whole chunk for every character of a long word.
+
+Widths are kept in the font's 1/1000 em units and converted the same way
+reportlab does (units * 0.001 * size), so the <= max_width comparisons come
+out identical, not just close.
+"""
+import threading
+
+from reportlab.lib.rl_accel import unicode2T1
+from reportlab.pdfbase import pdfmetrics
+
+# Per font, no more characters than this are remembered (emoji spam etc.)
+GLYPH_TABLE_LIMIT = 4096
+
+_glyph_tables = {}
+_tables_lock = threading.Lock()
+
+
+class FontMetrics:
+    """Character widths of one font, in 1/1000 em, filled in as characters are seen."""
+
+    def __init__(self, font_name):
+        try:
+            self.font = pdfmetrics.getFont(font_name)
+        except KeyError:
+            # what canvas.setFont falling back to Helvetica did
+            self.font = pdfmetrics.getFont("Helvetica")
+        self.name = self.font.fontName
+        # standard Type 1 fonts have integer widths per glyph -> exact sums
+        self._type1 = hasattr(self.font, "substitutionFonts")
+        self._widths = {}
+
+    def char_units(self, ch):
+        units = self._widths.get(ch)
+        if units is None:
+            if self._type1:
+                fonts = [self.font] + self.font.substitutionFonts
+                units = sum(sum(map(f.widths.__getitem__, s)) for f, s in unicode2T1(ch, fonts))
+            else:
+                units = self.font.stringWidth(ch, 1000)
+            if len(self._widths) < GLYPH_TABLE_LIMIT:
+                self._widths[ch] = units
+        return units
+
+    def units(self, text):
+        try:
+            return sum(map(self._widths.__getitem__, text))
+        except KeyError:
+            # first time one of these characters is seen
+            return sum(map(self.char_units, text))
+
+
+def font_metrics(font_name):
+    metrics = _glyph_tables.get(font_name)
+    if metrics is None:
+        with _tables_lock:
+            metrics = _glyph_tables.get(font_name)
+            if metrics is None:
+                metrics = _glyph_tables[font_name] = FontMetrics(font_name)
+    return metrics
+
+
+def string_width(text, font_name, font_size):
+    """Same number as canvas.stringWidth with that font set."""
+    return font_metrics(font_name).units(text) * 0.001 * font_size
+
+
+def wrap_text_by_width(text, font_name, font_size, max_width):
+    """Wrap text based on actual rendered width, breaking long words if needed"""
+    if not text or not str(text).strip():
+        return ""
+
+    if max_width <= 0:
+        return str(text)
+
+    text = str(text)
+    metrics = font_metrics(font_name)
+    char_units = metrics.char_units
+
+    def fits(units):
+        # same order of operations as reportlab, (units * 0.001) * size
+        return units * 0.001 * font_size <= max_width
+
+    space = char_units(" ")
+    all_lines = []
+
+    # Split by newlines first, then process each line
+    for para in text.split("\n"):
+        if not para.strip():
+            all_lines.append("")
+            continue
+
+        lines = []
+        current_line = ""
+        current_units = 0
+
+        for word in para.split():
+            word_units = metrics.units(word)
+
+            if not fits(word_units):
+                # Break the long word, one character at a time
+                if current_line:
+                    lines.append(current_line.strip())
+                    current_line = ""
+                    current_units = 0
+                chunk = ""
+                chunk_units = 0
+                for ch in word:
+                    ch_units = char_units(ch)
+                    if fits(chunk_units + ch_units):
+                        chunk += ch
+                        chunk_units += ch_units
+                    else:
+                        if chunk:
+                            lines.append(chunk)
+                        chunk = ch
+                        chunk_units = ch_units
+                if chunk:
+                    current_line = chunk + " "
+                    current_units = chunk_units + space
+                continue
+
+            # Test if adding this word (and its trailing space) fits
+            test_units = current_units + word_units + space
+            if fits(test_units):
+                current_line += word + " "
+                current_units = test_units
+            else:
+                # Current line is full
+                if current_line:
+                    lines.append(current_line.strip())
+                current_line = word + " "
+                current_units = word_units + space
+
+        if current_line:
+            lines.append(current_line.strip())
+
+        all_lines.extend(lines)
+
+    return "\n".join(all_lines) if all_lines else text
@@ -1,22 +1,240 @@
+import hashlib
+import logging
+import mimetypes
+import os
+import re
 import sqlite3
+import tempfile
+import threading
+import unicodedata
+from collections import OrderedDict
+from urllib.parse import quote
 
+from flask import Response, request
+from werkzeug.wsgi import wrap_file
 
-def save_file(file_storage, user_id, event_id):
+from db_pool import DB_PATH, get_db_connection
+from db_config import execute_write
+from blob_store import CHUNK_SIZE, get_blob_store
+from upload_stream import UploadSpool, sniffed_type_of
+from response_cache import bump_user
+
+log = logging.getLogger(__name__)
+
+
+def save_file(file_storage, user_id, event_id, store=None):
     """
     file_storage = request.files["file"]
+
+    The bytes are streamed into the blob store (content addressed by sha256),
+    the uploads row only keeps the metadata and the hash. Uploads that
+    upload_stream spooled to disk are renamed into the store, not copied.
     """
+    store = store or get_blob_store()
     filename = file_storage.filename
-    file_data = file_storage.read()
-
-    # Save to database
-    conn = sqlite3.connect("./db/database.db")
-    cursor = conn.cursor()
-    cursor.execute(
-        "INSERT INTO uploads (filename, filedata, user_id, event_id) VALUES (?, ?, ?, ?)",
-        (filename, file_data, user_id, event_id)
-    )
-    conn.commit()
-    conn.close()
-
-    print(f"File saved successfully: {filename}")
+    stream = file_storage.stream
+    spooled = stream.take_file() if isinstance(stream, UploadSpool) else None
+    if spooled:
+        # big upload already on disk and hashed while it arrived
+        sha256, size = store.put_file(spooled, stream.sha256, stream.size)
+    else:
+        sha256, size = store.put(stream)
+
+    content_type = file_storage.mimetype
+    if not content_type or content_type == "application/octet-stream":
+        content_type = sniffed_type_of(file_storage) or content_type or None
+
+    # Save to database (same pooled connection as the request that called us)
+    conn = get_db_connection(DB_PATH)
+    try:
+        execute_write(
+            conn,
+            """
+            INSERT INTO uploads (filename, user_id, event_id, sha256, size, content_type)
+            VALUES (?, ?, ?, ?, ?, ?)
+            """,
+            (filename, user_id, event_id, sha256, size, content_type)
+        )
+    finally:
+        conn.close()
+    # has_file changed in the user's event listings
+    bump_user(user_id)
+
+    log.info("file saved", extra={"upload_name": filename, "event_id": event_id, "size": size})
     return filename
+
+
+def _open_legacy_blob(upload_id):
+    """
+    Rows saved before the blob store still have their bytes in uploads.filedata.
+    Read them with incremental BLOB I/O on a private connection that lives as
+    long as the response (pooled connections go back to the pool when the view returns).
+    """
+    conn = sqlite3.connect(DB_PATH, check_same_thread=False)
+    try:
+        blob = conn.blobopen("uploads", "filedata", upload_id, readonly=True)
+    except Exception:
+        conn.close()
+        raise
+
+    def close():
+        blob.close()
+        conn.close()
+
+    return blob, len(blob), close
+
+
+def send_upload(upload, store=None):
+    """
+    Stream one uploads row back to the client, in CHUNK_SIZE pieces.
+    Handles Range (206 / 416), If-None-Match (304) and Content-Length.
+
+    `upload` needs id, filename, sha256, size and content_type.
+    """
+    if upload["sha256"]:
+        store = store or get_blob_store()
+        file = store.open(upload["sha256"])
+        size = upload["size"]
+        etag = upload["sha256"]
+        on_close = file.close
+    else:
+        file, size, on_close = _open_legacy_blob(upload["id"])
+        # uploads rows never change, id + size is enough to tell versions apart
+        etag = f"upload-{upload['id']}-{size}"
+
+    filename = upload["filename"] or f"upload-{upload['id']}"
+    mimetype = (upload["content_type"]
+                or mimetypes.guess_type(filename)[0]
+                or "application/octet-stream")
+
+    rv = Response(wrap_file(request.environ, file, CHUNK_SIZE),
+                  mimetype=mimetype, direct_passthrough=True)
+    rv.call_on_close(on_close)
+    rv.content_length = size
+    rv.set_etag(etag)
+    try:
+        filename.encode("ascii")
+        names = {"filename": filename}
+    except UnicodeEncodeError:
+        # same fallback Flask's send_file uses for non-ascii names
+        simple = unicodedata.normalize("NFKD", filename).encode("ascii", "ignore").decode("ascii")
+        names = {"filename": simple, "filename*": "UTF-8''" + quote(filename, safe="!#$&+-.^_`|~")}
+    rv.headers.set("Content-Disposition", "attachment", **names)
+    # attachments are per user; the browser keeps them and revalidates with the ETag
+    rv.cache_control.private = True
+    rv.cache_control.no_cache = True
+
+    return rv.make_conditional(request, accept_ranges=True, complete_length=size)
+
+
+# Profile pictures are saved as user_<id>-<first 16 hex of sha256>.<ext>: a new
+# picture gets a new URL, so whatever was stored under a name can be cached forever.
+HASHED_PICTURE = re.compile(r"^user_\d+-[0-9a-f]{16}\.[a-z]+$")
+PICTURE_MAX_AGE = 365 * 24 * 3600
+# small pictures (the avatar variants) are kept in memory
+PICTURE_CACHE_BYTES = int(os.environ.get("HEREIAM_PICTURE_CACHE_BYTES", str(16 * 1024 * 1024)))
+PICTURE_CACHE_ITEM_MAX = 512 * 1024
+
+
+def save_profile_picture(file_storage, folder, user_id, ext):
+    """Write the upload under its content-hashed name and return that name."""
+    digest = hashlib.sha256()
+    fd, tmp_path = tempfile.mkstemp(dir=folder, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as out:
+            for chunk in iter(lambda: file_storage.stream.read(CHUNK_SIZE), b""):
+                digest.update(chunk)
+                out.write(chunk)
+        filename = f"user_{user_id}-{digest.hexdigest()[:16]}.{ext}"
+        os.replace(tmp_path, os.path.join(folder, filename))
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+    return filename
+
+
+class PictureCache:
+    """
+    ETag (sha256 of the content) and, for files up to max_item bytes, the bytes
+    themselves, per picture path. Entries are dropped when the file's mtime or
+    size changes; the bytes are evicted least recently used past max_bytes.
+    """
+
+    def __init__(self, max_bytes=PICTURE_CACHE_BYTES, max_item=PICTURE_CACHE_ITEM_MAX, max_entries=4096):
+        self.max_bytes = max_bytes
+        self.max_item = max_item
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0}
+
+    def lookup(self, path):
+        """(etag, bytes or None for big files). Raises OSError if the file is gone."""
+        st = os.stat(path)
+        stamp = (st.st_mtime_ns, st.st_size)
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is not None and entry[0] == stamp:
+                self._entries.move_to_end(path)
+                self.stats["hits"] += 1
+                return entry[1], entry[2]
+
+        data = None
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            if st.st_size <= self.max_item:
+                data = f.read()
+                digest.update(data)
+            else:
+                for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+                    digest.update(chunk)
+        etag = digest.hexdigest()
+
+        with self._lock:
+            self.stats["misses"] += 1
+            old = self._entries.pop(path, None)
+            if old is not None and old[2] is not None:
+                self._size -= len(old[2])
+            self._entries[path] = (stamp, etag, data)
+            if data is not None:
+                self._size += len(data)
+            while self._size > self.max_bytes or len(self._entries) > self.max_entries:
+                _, (_, _, evicted) = self._entries.popitem(last=False)
+                if evicted is not None:
+                    self._size -= len(evicted)
+        return etag, data
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+
+picture_cache = PictureCache()
+
+
+def send_picture(path, immutable=False):
+    """
+    Serve a picture (or one of its image_variants) with a strong ETag.
+    immutable=True for content-hashed names: browsers keep it for a year without asking.
+    Otherwise they revalidate, which is a 304 as long as the file is the same.
+    """
+    etag, data = picture_cache.lookup(path)
+    mimetype = mimetypes.guess_type(path)[0] or "application/octet-stream"
+
+    if data is not None:
+        rv = Response(data, mimetype=mimetype)
+    else:
+        rv = Response(wrap_file(request.environ, open(path, "rb"), CHUNK_SIZE),
+                      mimetype=mimetype, direct_passthrough=True)
+        rv.content_length = os.path.getsize(path)
+    rv.set_etag(etag)
+
+    if immutable:
+        rv.cache_control.public = True
+        rv.cache_control.max_age = PICTURE_MAX_AGE
+        rv.cache_control.immutable = True
+    else:
+        rv.cache_control.no_cache = True
+    return rv.make_conditional(request)
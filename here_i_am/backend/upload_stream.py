@@ -0,0 +1,184 @@
+"""
+How multipart uploads are received.
+
+Werkzeug writes each uploaded file into whatever stream the request's
+_get_file_stream returns. UploadRequest hands it an UploadSpool, which:
+
+- keeps small files in memory and moves anything over SPOOL_THRESHOLD to a
+  temp file (in the blob store's tmp dir, so save_file can rename it into
+  the store instead of copying it)
+- computes the sha256 and size while the bytes arrive
+- keeps the first bytes to sniff the real file type from
+
+Size limits are checked before the body is read: MAX_UPLOAD for every
+request (MAX_CONTENT_LENGTH) and a smaller one per route with
+@upload_limit(...). Too big -> 413 without parsing anything.
+"""
+import hashlib
+import io
+import os
+import tempfile
+from functools import wraps
+
+from flask import Request, jsonify, request
+
+from blob_store import BLOB_DIR
+
+MB = 1024 * 1024
+MAX_UPLOAD = int(os.environ.get("HEREIAM_MAX_UPLOAD", str(250 * MB)))
+EVENT_FILE_LIMIT = int(os.environ.get("HEREIAM_EVENT_FILE_LIMIT", str(200 * MB)))
+PICTURE_LIMIT = int(os.environ.get("HEREIAM_PICTURE_LIMIT", str(10 * MB)))
+# files up to this size stay in memory while the request is handled
+SPOOL_THRESHOLD = 1 * MB
+SPOOL_DIR = os.environ.get("HEREIAM_SPOOL_DIR") or os.path.join(BLOB_DIR, "tmp")
+SNIFF_BYTES = 16
+
+# first bytes -> content type, for the formats people actually upload here
+MAGIC_NUMBERS = [
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+    (b"%PDF-", "application/pdf"),
+    (b"PK\x03\x04", "application/zip"),  # also docx/xlsx/pptx
+    (b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1", "application/msword"),  # old office files
+]
+IMAGE_TYPES = {"image/png", "image/jpeg", "image/gif"}
+
+
+def sniff_type(head):
+    for magic, content_type in MAGIC_NUMBERS:
+        if head.startswith(magic):
+            return content_type
+    if head[8:12] == b"WEBP" and head.startswith(b"RIFF"):
+        return "image/webp"
+    return None
+
+
+class UploadSpool(io.RawIOBase):
+    """File-like object werkzeug writes one uploaded file into (see module docstring)."""
+
+    def __init__(self, threshold=SPOOL_THRESHOLD, spool_dir=SPOOL_DIR):
+        self.threshold = threshold
+        self.spool_dir = spool_dir
+        self.size = 0
+        self.path = None
+        self._hash = hashlib.sha256()
+        self._head = b""
+        self._file = io.BytesIO()
+
+    @property
+    def sha256(self):
+        return self._hash.hexdigest()
+
+    @property
+    def sniffed_type(self):
+        return sniff_type(self._head)
+
+    @property
+    def on_disk(self):
+        return self.path is not None
+
+    def writable(self):
+        return True
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def write(self, data):
+        self._hash.update(data)
+        if len(self._head) < SNIFF_BYTES:
+            self._head += bytes(data[:SNIFF_BYTES - len(self._head)])
+        self.size += len(data)
+        if self.path is None and self.size > self.threshold:
+            self._roll_over()
+        return self._file.write(data)
+
+    def _roll_over(self):
+        os.makedirs(self.spool_dir, exist_ok=True)
+        fd, self.path = tempfile.mkstemp(dir=self.spool_dir, suffix=".upload")
+        disk = os.fdopen(fd, "w+b")
+        disk.write(self._file.getbuffer())
+        self._file = disk
+
+    def read(self, size=-1):
+        return self._file.read(size)
+
+    def readinto(self, buffer):
+        return self._file.readinto(buffer)
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        return self._file.seek(offset, whence)
+
+    def tell(self):
+        return self._file.tell()
+
+    def flush(self):
+        self._file.flush()
+
+    def take_file(self):
+        """
+        Hand the spooled temp file over to the caller (who moves or deletes it).
+        Returns its path, or None if the upload is small enough to still be in memory.
+        """
+        if self.path is None:
+            return None
+        self._file.flush()
+        self._file.close()
+        path, self.path = self.path, None
+        self._file = io.BytesIO()
+        return path
+
+    def close(self):
+        if not self.closed:
+            super().close()
+            self._file.close()
+            if self.path is not None:
+                try:
+                    os.remove(self.path)
+                except OSError:
+                    pass
+                self.path = None
+
+
+def sniffed_type_of(file_storage):
+    """Content type from the file's first bytes (None if it isn't one we know)."""
+    stream = file_storage.stream
+    if isinstance(stream, UploadSpool):
+        return stream.sniffed_type
+    pos = stream.tell()
+    head = stream.read(SNIFF_BYTES)
+    stream.seek(pos)
+    return sniff_type(head)
+
+
+class UploadRequest(Request):
+    """Flask request that spools uploaded files into UploadSpool objects."""
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return UploadSpool()
+
+
+def upload_limit(max_bytes):
+    """
+    Route decorator: refuse request bodies over max_bytes with a 413.
+    Bodies that say how big they are are refused before anything is read;
+    chunked ones are cut off by werkzeug once they pass the limit.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            request.max_content_length = max_bytes
+            if request.content_length is not None and request.content_length > max_bytes:
+                return too_large(max_bytes)
+            return view(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def too_large(max_bytes=None):
+    limit = max_bytes or request.max_content_length
+    return jsonify({"ok": False, "error": f"File too large (limit is {limit} bytes)"}), 413
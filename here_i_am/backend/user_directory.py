@@ -0,0 +1,134 @@
+"""
+In-process index of users by username and by email, for register's duplicate check.
+
+Users that register or were checked recently are kept here under both keys,
+so "is this username or email taken" is a dict lookup instead of a query.
+Routes that change a user's username or email drop the entry right after
+their write commits. Counters are in stats(): a hit is an answer given
+without a query.
+
+Login does not use it: the cache is per process, so a password changed or
+an email moved through another serve.py worker would still be believed here.
+/login runs the indexed username / email query instead. For taken() a stale
+entry costs at most a 409 for an email that was changed elsewhere less than
+USER_CACHE_TTL seconds ago, and passwords are not cached at all.
+
+Only users that exist are cached: "no such user" always asks the database,
+so a user registered through another worker process is never missed.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+
+USER_CACHE_SIZE = int(os.environ.get("HEREIAM_USER_CACHE_SIZE", "10000"))
+USER_CACHE_TTL = float(os.environ.get("HEREIAM_USER_CACHE_TTL", "60"))
+
+USER_COLUMNS = "id, username, email"
+
+
+class UserDirectory:
+
+    def __init__(self, max_users=USER_CACHE_SIZE, ttl=USER_CACHE_TTL):
+        self.max_users = max_users
+        self.ttl = ttl
+        # user id -> (expires_at, row), oldest first
+        self._users = OrderedDict()
+        self._by_username = {}
+        self._by_email = {}
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "invalidations": 0, "evictions": 0}
+
+    def _cached(self, user_id, now):
+        entry = self._users.get(user_id)
+        if entry is None:
+            return None
+        expires_at, row = entry
+        if expires_at < now:
+            self._drop(user_id)
+            return None
+        self._users.move_to_end(user_id)
+        return row
+
+    def _drop(self, user_id):
+        _, row = self._users.pop(user_id)
+        if self._by_username.get(row["username"]) == user_id:
+            del self._by_username[row["username"]]
+        if self._by_email.get(row["email"]) == user_id:
+            del self._by_email[row["email"]]
+
+    def put(self, row):
+        row = {key: row[key] for key in ("id", "username", "email")}
+        with self._lock:
+            if row["id"] in self._users:
+                self._drop(row["id"])
+            self._users[row["id"]] = (time.monotonic() + self.ttl, row)
+            self._by_username[row["username"]] = row["id"]
+            self._by_email[row["email"]] = row["id"]
+            while len(self._users) > self.max_users:
+                self._drop(next(iter(self._users)))
+                self._stats["evictions"] += 1
+        return row
+
+    def _find(self, credential, now):
+        user_id = self._by_username.get(credential)
+        if user_id is None:
+            user_id = self._by_email.get(credential)
+        return self._cached(user_id, now) if user_id is not None else None
+
+    def get(self, credential):
+        """Cached row for a username or email (None when it isn't cached)."""
+        with self._lock:
+            return self._find(credential, time.monotonic())
+
+    def taken(self, conn, username, email):
+        """True if a user already has this username or this email (register's duplicate check)."""
+        now = time.monotonic()
+        with self._lock:
+            cached = self._find(username, now) or self._find(email, now)
+            self._stats["hits" if cached else "misses"] += 1
+        if cached:
+            return True
+        row = conn.execute(
+            f"SELECT {USER_COLUMNS} FROM users WHERE username = ? OR email = ?", (username, email)
+        ).fetchone()
+        if row:
+            self.put(row)
+        return row is not None
+
+    def invalidate(self, user_id=None, email=None):
+        with self._lock:
+            if user_id is None and email is not None:
+                user_id = self._by_email.get(email)
+            if user_id in self._users:
+                self._drop(user_id)
+                self._stats["invalidations"] += 1
+
+    def clear(self):
+        with self._lock:
+            self._users.clear()
+            self._by_username.clear()
+            self._by_email.clear()
+
+    def stats(self):
+        with self._lock:
+            data = dict(self._stats)
+            data["users"] = len(self._users)
+        return data
+
+
+_directory = None
+_directory_lock = threading.Lock()
+
+
+def get_user_directory():
+    global _directory
+    with _directory_lock:
+        if _directory is None:
+            _directory = UserDirectory()
+        return _directory
+
+
+def directory_stats():
+    """Hit/miss counters of the user directory (for monitoring)."""
+    return get_user_directory().stats()
@@ -110,9 +110,9 @@ function EventList({
                         </span>
                       )}
                       {e.hasFile && (
-                        <span className="meta file-meta">
+                        <a className="meta file-meta" href={e.fileUrl} title="Download file">
                           <FiFile size={14} />
-                        </span>
+                        </a>
                       )}
                     </div>
                     {e.note && <div className="event-note">{e.note}</div>}
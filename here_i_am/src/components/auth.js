@@ -0,0 +1,10 @@
+// Token from /login (see backend/auth.py), sent with every request to the backend
+export function authToken() {
+  const user = JSON.parse(localStorage.getItem("user") || "{}");
+  return user.token || "";
+}
+
+export function authHeaders(headers = {}) {
+  const token = authToken();
+  return token ? { ...headers, Authorization: `Bearer ${token}` } : headers;
+}
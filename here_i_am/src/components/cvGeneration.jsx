@@ -148,23 +148,25 @@ const CvGeneration = () => {
         "skill_history",
       ];
 
-      for (const field of fieldsToCheck) {
-        const res = await fetch("http://localhost:3001/validate", {
-          method: "POST",
-          headers: {
-            "Content-Type": "application/json",
-          },
-          body: JSON.stringify({
-            field,
-            value: form[field],
-          }),
-        });
+      // every field in one request instead of one /validate call per field
+      const res = await fetch("http://localhost:3001/validate/batch", {
+        method: "POST",
+        headers: {
+          "Content-Type": "application/json",
+        },
+        body: JSON.stringify({
+          values: Object.fromEntries(fieldsToCheck.map((field) => [field, form[field]])),
+        }),
+      });
 
-        const data = await res.json();
+      const data = await res.json();
+
+      for (const field of fieldsToCheck) {
+        const result = data.results?.[field];
 
-        if (!data.ok) {
+        if (!result || !result.ok) {
           const errorObj = {
-            [field]: data.error || "Invalid value",
+            [field]: result?.error || "Invalid value",
           };
           setErrors(errorObj);
           setLoading(false);
@@ -178,7 +180,7 @@ const CvGeneration = () => {
           return;
         }
 
-        validated[field] = data.value;
+        validated[field] = result.value;
       }
 
       if (file) {
@@ -1,5 +1,6 @@
 import React, { useState, useEffect } from "react";
 import "../css/history.css";
+import { authHeaders } from "./auth";
 
 const History = () => {
     const [events, setEvents] = useState([]);
@@ -37,15 +38,23 @@ const History = () => {
             alert("Missing user id. Please log in again.");
             return;
         }
-        const res = await fetch(`http://localhost:3001/history?user_id=${userId}`);
-        if (!res.ok) {
-            console.error("Failed fetching events:", await res.text());
-            return;
-        }
+        // fetch in pages so the first events show up before the whole history is loaded
+        const base = `http://localhost:3001/history?limit=200&fields=id,title,importance,start_time_utc`;
+        let cursor = null;
+        let loaded = [];
+        do {
+            const res = await fetch(cursor ? `${base}&cursor=${encodeURIComponent(cursor)}` : base,
+                { headers: authHeaders() });
+            if (!res.ok) {
+                console.error("Failed fetching events:", await res.text());
+                return;
+            }
 
-        const data = await res.json();
-        console.log(data)
-        setEvents(data);
+            const data = await res.json();
+            loaded = loaded.concat(data.events);
+            setEvents(loaded);
+            cursor = data.next_cursor;
+        } while (cursor);
         } catch (err) {
             console.error(err);
         }
@@ -39,7 +39,7 @@ function Login() {
         }
         // success — store user info from Flask response
         if (body.user_id && body.username) {
-          localStorage.setItem('user', JSON.stringify({ user_id: body.user_id, username: body.username, email: body.email }));
+          localStorage.setItem('user', JSON.stringify({ user_id: body.user_id, username: body.username, email: body.email, token: body.token }));
           localStorage.setItem('auth', 'true');
         }
         
@@ -1,6 +1,7 @@
 import React, { useState } from "react";
 import axios from "axios";
 import { useNavigate } from "react-router-dom";
+import { authHeaders } from "./auth";
 import "../css/openPasswordWindow.css"; // Ensure the styles are updated
 
 const ChangePasswordPopup = ({ onClose }) => {
@@ -21,8 +22,7 @@ const ChangePasswordPopup = ({ onClose }) => {
     try {
       const res = await axios.post(`${apiBase}/check-password`, { 
         password: oldPass,
-        authenticated_user_id: userId 
-      });
+      }, { headers: authHeaders() });
       if (res.data.valid) {
         alert("✅ Old password is correct!");
         setIsVerified(true);
@@ -49,8 +49,7 @@ const ChangePasswordPopup = ({ onClose }) => {
     try {
       const res = await axios.put(`${apiBase}/update-password`, { 
         newPassword: newPass,
-        authenticated_user_id: userId 
-      });
+      }, { headers: authHeaders() });
       if (res.status === 200) {
         alert("✅ Password updated successfully!");
         onClose(); // Close the modal when password is updated
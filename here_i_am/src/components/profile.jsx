@@ -4,6 +4,7 @@ import axios from "axios";
 import Navbar from "./navbar";
 import { FiEdit2 } from "react-icons/fi"; // Feather pencil icon
 import ChangePasswordPopup from "./openPasswordWindow"; // ChangePasswordModal component
+import { authHeaders } from "./auth";
 import "../css/profile.css";
 
 const Profile = () => {
@@ -37,8 +38,7 @@ const Profile = () => {
         name: profile.name,
         surname: profile.surname,
         email: profile.email,
-        authenticated_user_id: userId,
-      })
+      }, { headers: authHeaders() })
       .then((res) => console.log("Profile updated:", res.data))
       .catch((err) => {
         console.error(err);
@@ -68,13 +68,12 @@ const Profile = () => {
 
     const formData = new FormData();
     formData.append("profile_picture", file);
-    formData.append("authenticated_user_id", userId);
 
     axios
       .post(`http://localhost:3001/users/${userId}/profile-picture`, formData, {
-        headers: {
+        headers: authHeaders({
           "Content-Type": "multipart/form-data",
-        },
+        }),
       })
       .then((res) => {
         // Use URL from backend so it works after refresh
@@ -97,7 +96,7 @@ const Profile = () => {
   useEffect(() => {
     if (!userId) return;
     axios
-      .get(`${apiBase}?authenticated_user_id=${userId}`)
+      .get(apiBase, { headers: authHeaders() })
       .then((res) => {
         setProfile(res.data);
       })
@@ -3,6 +3,7 @@ import React, { useState, useEffect } from "react";
 import Calendar from "./Calendar";
 import EventList from "./EventList";
 import AddEvent from "./addEvent";
+import { authHeaders, authToken } from "./auth";
 
 
 
@@ -82,7 +83,8 @@ function Schedule() {
 
         try {
           const res = await fetch(
-            `http://localhost:3001/events?date=${selectedDate}&user_id=${userId}`
+            `http://localhost:3001/events?date=${selectedDate}`,
+            { headers: authHeaders() }
           );
 
           if (!res.ok) {
@@ -100,6 +102,8 @@ function Schedule() {
             note: e.description,
             importance: e.importance,
             hasFile: e.has_file === 1,    // 👈 THIS IS REQUIRED
+            // plain link, so the token goes in the query string
+            fileUrl: `http://localhost:3001/events/${e.id}/file?token=${encodeURIComponent(authToken())}`,
           }));
 
           setEvents(mapped);
@@ -147,7 +151,6 @@ function Schedule() {
     formData.append("time", data.time);        // 👈 use data.time from AddEvent
     formData.append("date", selectedDate);     // 👈 send the selected date
     formData.append("importance", data.importance);
-    formData.append("user_id", userId);        // 👈 use userId from localStorage
 
     if (data.file) {
       formData.append("file", data.file);      // name must be "file" for request.files["file"]
@@ -157,6 +160,7 @@ function Schedule() {
   try {
       const res = await fetch("http://localhost:3001/events", {
         method: "POST",
+        headers: authHeaders(),
         body: formData, 
       });
 
@@ -219,8 +223,8 @@ const handleDeleteEvent = async (eventId) => {
 
   try {
     const res = await fetch(
-      `http://localhost:3001/events/${eventId}?user_id=${userId}`,
-      { method: "DELETE" }
+      `http://localhost:3001/events/${eventId}`,
+      { method: "DELETE", headers: authHeaders() }
     );
 
     if (!res.ok) {